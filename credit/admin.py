@@ -1,6 +1,81 @@
 from django.contrib import admin
-from .models import Customer, Loan
+from . import conditional, eligibility_cache
+from .models import (
+    CreditScoreSnapshot, Customer, CustomerCreditProfile, IngestionRun, IngestionSource, Loan, LoanHistory,
+    PortfolioScoringRun,
+)
+from .profiles import refresh_profiles
 
-admin.site.register(Customer)
-admin.site.register(Loan)
 
+class CustomerAdmin(admin.ModelAdmin):
+    # Maintained by credit.profiles, credit.archival and credit.conditional
+    readonly_fields = (
+        'current_debt', 'current_emi', 'debt_valid_until', 'archived_loans', 'archived_loan_volume',
+        'version', 'updated_at',
+    )
+
+    # Salary and approved limit feed the eligibility decision, so drop cached decisions.
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        conditional.touch_customers([obj.id])
+        eligibility_cache.invalidate_customer(obj.id)
+
+
+class LoanAdmin(admin.ModelAdmin):
+    # A customer dropdown would load every customer row on each change form.
+    raw_id_fields = ('customer',)
+    # ETag stamps, see credit.conditional
+    readonly_fields = ('version', 'updated_at')
+
+    # Admin edits bypass the incremental profile updates, so recompute the
+    # profiles of every customer the loan belonged to.
+    def save_model(self, request, obj, form, change):
+        previous_owner = Loan.objects.filter(id=obj.id).values_list('customer_id', flat=True).first() if change else None
+        super().save_model(request, obj, form, change)
+        conditional.touch_loans([obj.id])
+        self.loans_changed({obj.customer_id, previous_owner} - {None})
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        self.loans_changed([obj.customer_id])
+
+    def delete_queryset(self, request, queryset):
+        customer_ids = set(queryset.values_list('customer_id', flat=True))
+        super().delete_queryset(request, queryset)
+        self.loans_changed(customer_ids)
+
+    def loans_changed(self, customer_ids):
+        refresh_profiles(customer_ids)
+        conditional.touch_customers(customer_ids)
+        for customer_id in customer_ids:
+            eligibility_cache.invalidate_customer(customer_id)
+
+
+class LoanHistoryAdmin(admin.ModelAdmin):
+    # Written only by credit.archival; the customer's archived totals depend on these rows.
+    raw_id_fields = ('customer',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+class CreditScoreSnapshotAdmin(admin.ModelAdmin):
+    # Millions of rows: no customer/run dropdowns and no joins in the list.
+    list_display = ('customer_id', 'scored_at', 'credit_score', 'emi_burden', 'num_loans')
+    raw_id_fields = ('run', 'customer')
+
+
+admin.site.register(Customer, CustomerAdmin)
+admin.site.register(Loan, LoanAdmin)
+admin.site.register(LoanHistory, LoanHistoryAdmin)
+admin.site.register(CustomerCreditProfile)
+admin.site.register(IngestionRun)
+admin.site.register(IngestionSource)
+admin.site.register(PortfolioScoringRun)
+admin.site.register(CreditScoreSnapshot, CreditScoreSnapshotAdmin)
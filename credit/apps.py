@@ -1,6 +1,17 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class CreditConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'credit'
+
+    def ready(self):
+        from .policy import active_policy
+        # Compile the credit policy at startup so a broken file fails fast.
+        active_policy()
+        if settings.CREDIT_METRICS_ENABLED:
+            from django.db.backends.signals import connection_created
+
+            from .instrumentation import install_query_timer
+            connection_created.connect(install_query_timer, dispatch_uid='credit_query_timer')
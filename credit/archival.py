@@ -0,0 +1,68 @@
+"""Archival of closed loans from ``Loan`` into ``LoanHistory``.
+
+A loan that is fully repaid, has ended and started before the current year
+can no longer change any credit-score input: it stays one loan, paid on
+time, with its amount in the approved volume, and is never current nor this
+year's activity again. ``archive_closed_loans`` moves such loans to
+``LoanHistory`` and adds them to the customer's ``archived_loans`` and
+``archived_loan_volume`` in the same transaction, so
+``credit_input_annotations`` yields the same inputs while the scoring
+aggregates, the nightly roll-over and view-loans only read the active rows
+left in ``Loan``.
+
+This is the active/closed split done as two tables rather than Postgres
+declarative partitioning: a partitioned ``Loan`` would need the partition key
+in its primary key, which Django's single-column keys and the foreign key
+from ``LoanRequest`` do not allow, and it behaves the same on SQLite.
+"""
+from datetime import date, datetime
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import Customer, Loan, LoanHistory
+from .profiles import refresh_profiles
+
+ARCHIVE_BATCH_SIZE = 5000
+HISTORY_FIELDS = [field.attname for field in LoanHistory._meta.concrete_fields if field.name != 'archived_at']
+
+
+def closed_loans(today):
+    """Loans whose contribution to the credit-score inputs is fixed from ``today`` on."""
+    return Loan.objects.filter(
+        emis_paid_on_time__gte=F('tenure'), end_date__lt=today, start_date__lt=date(today.year, 1, 1)
+    )
+
+
+def archive_closed_loans(today=None, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move every closed loan to ``LoanHistory``, one transaction per ``batch_size`` loans; returns how many moved."""
+    today = today or datetime.now().date()
+    moved = 0
+    while True:
+        with transaction.atomic():
+            loan_ids = list(closed_loans(today).order_by('id').values_list('id', flat=True)[:batch_size])
+            if not loan_ids:
+                return moved
+            moved += _archive_batch(loan_ids, today)
+
+
+def _archive_batch(loan_ids, today):
+    # Re-check under the row locks: an EMI or admin edit may have reopened a loan since it was listed.
+    loans = list(closed_loans(today).select_for_update().filter(id__in=loan_ids).values(*HISTORY_FIELDS))
+    totals = {}
+    for loan in loans:
+        count, volume = totals.get(loan['customer_id'], (0, 0.0))
+        totals[loan['customer_id']] = count + 1, volume + loan['loan_amount']
+    customers = list(
+        Customer.objects.select_for_update().filter(id__in=sorted(totals)).only('archived_loans', 'archived_loan_volume')
+    )
+    for customer in customers:
+        count, volume = totals[customer.id]
+        customer.archived_loans += count
+        customer.archived_loan_volume += volume
+    Customer.objects.bulk_update(customers, ['archived_loans', 'archived_loan_volume'])
+    LoanHistory.objects.bulk_create([LoanHistory(**loan) for loan in loans])
+    Loan.objects.filter(id__in=[loan['id'] for loan in loans]).delete()
+    # The roll-over finds matured loans in Loan, so bring any stale profile up to date now.
+    refresh_profiles(sorted(totals), today)
+    return len(loans)
@@ -0,0 +1,117 @@
+"""Async versions of the read and scoring endpoints, served when ``CREDIT_ASYNC_VIEWS`` is on.
+
+They return the same bodies and status codes as the DRF views in
+``credit/views.py`` but await the database through Django's async ORM, so a
+slow query no longer blocks a whole worker under an ASGI server. DRF's
+``APIView`` is sync-only, hence plain Django views with the same serializers.
+"""
+import json
+from functools import wraps
+
+from django.http import HttpResponse, HttpResponseNotAllowed
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+
+from . import conditional, eligibility_cache, instrumentation
+from .models import Customer, LoanHistory
+from .pagination import KeysetPagination
+from .renderers import FastJSONRenderer
+from .profiles import aload_profile_inputs
+from .serializers import CheckEligibilitySerializer, LoanDetailSerializer, LoanListItemSerializer
+from .views import active_loans, eligibility_response, loan_detail_queryset
+
+JSON = 'application/json'
+
+
+def _response(data, status_code=status.HTTP_200_OK, headers=None):
+    with instrumentation.timed('render'):
+        body = FastJSONRenderer().render(data)
+    return HttpResponse(body, status=status_code, content_type=JSON, headers=headers)
+
+
+def _async_view(methods, replica_reads=True):
+    # Django 4.2's csrf_exempt and require_http_methods wrap views in sync
+    # functions, which would hide the coroutine from the handler.
+    def decorate(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return HttpResponseNotAllowed(methods)
+            try:
+                return await view(request, *args, **kwargs)
+            except ValidationError as exc:
+                return _response(exc.detail, status.HTTP_400_BAD_REQUEST)
+
+        wrapper.csrf_exempt = True
+        wrapper.replica_reads = replica_reads
+        return wrapper
+    return decorate
+
+
+@_async_view(['POST'])
+async def check_eligibility(request):
+    try:
+        payload = json.loads(request.body or b'{}')
+    except ValueError:
+        return _response({'detail': 'JSON parse error.'}, status.HTTP_400_BAD_REQUEST)
+    serializer = CheckEligibilitySerializer(data=payload)
+    if not serializer.is_valid():
+        return _response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+    data = serializer.validated_data
+    customer_id = data['customer_id']
+    loan_amount = data['loan_amount']
+    interest_rate = data['interest_rate']
+    tenure = data['tenure']
+
+    async def decide():
+        _, inputs = await aload_profile_inputs(customer_id)
+        return eligibility_response(inputs, loan_amount, interest_rate, tenure)
+
+    try:
+        response_data = await eligibility_cache.aget_or_compute(customer_id, loan_amount, interest_rate, tenure, decide)
+    except Customer.DoesNotExist:
+        return _response({'detail': 'Customer not found.'}, status.HTTP_404_NOT_FOUND)
+    return _response(response_data)
+
+
+@_async_view(['GET'])
+async def view_loan(request, loan_id):
+    fields = LoanDetailSerializer.requested_fields(request)
+    if conditional.is_conditional(request):
+        stamps = (
+            await conditional.loan_stamps(loan_id).afirst()
+            or await conditional.loan_stamps(loan_id, LoanHistory).afirst()
+        )
+        if stamps is None:
+            return _response({'detail': 'Loan not found.'}, status.HTTP_404_NOT_FOUND)
+        response = conditional.not_modified(request, conditional.loan_stamp(stamps), JSON)
+        if response is not None:
+            return response
+    loan = (
+        await loan_detail_queryset(fields).filter(id=loan_id).afirst()
+        or await loan_detail_queryset(fields, LoanHistory).filter(id=loan_id).afirst()
+    )
+    if loan is None:
+        return _response({'detail': 'Loan not found.'}, status.HTTP_404_NOT_FOUND)
+    with instrumentation.timed('serialize'):
+        response_data = LoanDetailSerializer.values_data([loan], fields)[0]
+    return conditional.add_validators(_response(response_data), request, conditional.loan_stamp(loan), JSON)
+
+
+@_async_view(['GET'])
+async def view_customer_loans(request, customer_id):
+    fields = LoanListItemSerializer.requested_fields(request)
+    stamps = await conditional.customer_stamps(customer_id).afirst()
+    if stamps is None:
+        return _response({'detail': 'Customer not found.'}, status.HTTP_404_NOT_FOUND)
+    stamp = conditional.customer_stamp(stamps)
+    response = conditional.not_modified(request, stamp, JSON)
+    if response is not None:
+        return response
+    paginator = KeysetPagination()
+    page = await paginator.apaginate_queryset(active_loans(customer_id, fields), request)
+    with instrumentation.timed('serialize'):
+        response_data = LoanListItemSerializer.values_data(page, fields)
+    return conditional.add_validators(
+        _response(response_data, headers=paginator.get_paginated_headers()), request, stamp, JSON
+    )
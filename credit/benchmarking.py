@@ -0,0 +1,58 @@
+"""Small helpers shared by the load-test and benchmark management commands."""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def latency_summary(latencies_ms, elapsed_seconds):
+    return {
+        'requests': len(latencies_ms),
+        'throughput_rps': len(latencies_ms) / elapsed_seconds if elapsed_seconds else None,
+        'p50_ms': percentile(latencies_ms, 50),
+        'p95_ms': percentile(latencies_ms, 95),
+        'p99_ms': percentile(latencies_ms, 99),
+    }
+
+
+def run_concurrently(func, jobs, concurrency):
+    """Call ``func(job)`` for every job on ``concurrency`` threads.
+
+    Each thread keeps its database connections across jobs, as a server
+    worker would under ``CONN_MAX_AGE``, and closes them after its last job.
+    Returns ``(results, latencies_ms, elapsed_seconds)`` with results in job order.
+    """
+    jobs = list(jobs)
+    outcomes = [None] * len(jobs)
+    pending = iter(range(len(jobs)))
+    lock = threading.Lock()
+
+    def worker():
+        try:
+            while True:
+                with lock:
+                    index = next(pending, None)
+                if index is None:
+                    return
+                started = time.perf_counter()
+                outcomes[index] = func(jobs[index]), (time.perf_counter() - started) * 1000
+        finally:
+            # Worker threads open their own connections; don't leak them.
+            connections.close_all()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        workers = [pool.submit(worker) for _ in range(min(concurrency, len(jobs)))]
+        for future in workers:
+            future.result()
+    elapsed = time.perf_counter() - started
+    return [result for result, _ in outcomes], [latency for _, latency in outcomes], elapsed
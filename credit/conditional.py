@@ -0,0 +1,79 @@
+"""Version stamps and HTTP conditional requests for view-loan and view-loans.
+
+Every write that changes what those endpoints return bumps ``version`` and
+``updated_at`` on the loan (``touch_loans``) and on its customer
+(``touch_customers``). The views turn the stamps into ``ETag`` and
+``Last-Modified`` headers, and answer a revalidation whose validators still
+match with ``304 Not Modified`` after a single primary-key lookup of the
+stamps, without reading or serializing any loans.
+"""
+import hashlib
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from .models import Customer, Loan
+
+# view-loan depends on the loan and on the customer fields nested in it
+LOAN_STAMP_FIELDS = ['version', 'updated_at', 'customer__version', 'customer__updated_at']
+CUSTOMER_STAMP_FIELDS = ['version', 'updated_at']
+
+
+def touch_loans(loan_ids):
+    return Loan.objects.filter(id__in=list(loan_ids)).update(version=F('version') + 1, updated_at=timezone.now())
+
+
+def touch_customers(customer_ids):
+    return Customer.objects.filter(id__in=list(customer_ids)).update(version=F('version') + 1, updated_at=timezone.now())
+
+
+def loan_stamps(loan_id, model=Loan):
+    return model.objects.filter(id=loan_id).values(*LOAN_STAMP_FIELDS)
+
+
+def customer_stamps(customer_id):
+    return Customer.objects.filter(id=customer_id).values(*CUSTOMER_STAMP_FIELDS)
+
+
+def loan_stamp(row):
+    """``(versions, last_modified)`` of a row holding ``LOAN_STAMP_FIELDS``."""
+    return (row['version'], row['customer__version']), max(row['updated_at'], row['customer__updated_at'])
+
+
+def customer_stamp(row):
+    return (row['version'],), row['updated_at']
+
+
+def is_conditional(request):
+    return 'HTTP_IF_NONE_MATCH' in request.META or 'HTTP_IF_MODIFIED_SINCE' in request.META
+
+
+def etag(request, stamp, media_type):
+    versions, _ = stamp
+    # The same stamps render differently per query string (fields, cursor, limit) and media type.
+    variant = hashlib.blake2b(f'{request.get_full_path()}|{media_type}'.encode(), digest_size=8).hexdigest()
+    return quote_etag(f"{'.'.join(map(str, versions))}-{variant}")
+
+
+def add_validators(response, request, stamp, media_type):
+    _, last_modified = stamp
+    response['ETag'] = etag(request, stamp, media_type)
+    response['Last-Modified'] = http_date(last_modified.timestamp())
+    if settings.CREDIT_LOAN_CACHE_CONTROL:
+        response['Cache-Control'] = settings.CREDIT_LOAN_CACHE_CONTROL
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
+def not_modified(request, stamp, media_type):
+    """The ``304`` (or ``412``) response when the request's validators match ``stamp``; None otherwise."""
+    _, last_modified = stamp
+    response = get_conditional_response(
+        request, etag=etag(request, stamp, media_type), last_modified=int(last_modified.timestamp())
+    )
+    if response is None:
+        return None
+    return add_validators(response, request, stamp, media_type)
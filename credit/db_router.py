@@ -0,0 +1,60 @@
+"""Route read-only work to the read replicas in ``settings.DATABASE_REPLICAS``.
+
+Reads go to the primary unless the current request or task has opted in with
+``replica_reads()`` (``ReplicaRoutingMiddleware`` does this for views that set
+``replica_reads = True``). Writes, migrations and any read inside a
+transaction on the primary always use the primary, so read-modify-write code
+never sees replica lag.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+def replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+def reading_from_replica():
+    return bool(_replica_reads.get() and replicas()) and not connections[DEFAULT_DB_ALIAS].in_atomic_block
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    token = _replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def allow_replica_reads():
+    """Send reads in the current context to a replica; reset by an enclosing ``replica_reads()`` block."""
+    _replica_reads.set(True)
+
+
+def use_primary():
+    """Read from the primary inside this block, e.g. when re-reading rows that were just written."""
+    return replica_reads(False)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if reading_from_replica():
+            return random.choice(replicas())
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in replicas()
@@ -0,0 +1,179 @@
+import logging
+import threading
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.db import transaction
+
+from . import db_router
+from .policy import active_policy
+
+CACHE_ALIAS = 'eligibility'
+GENERATION_KEY = 'elig:generation'
+CUSTOMER_VERSION_KEY = 'elig:version:{}'
+
+logger = logging.getLogger(__name__)
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def _fresh_version():
+    # A missing (e.g. evicted) counter restarts from the clock rather than 0,
+    # so it can never fall back to a version an older entry was stored under.
+    return time.time_ns()
+
+
+def _current_versions(customer_id):
+    cache = _cache()
+    version_key = CUSTOMER_VERSION_KEY.format(customer_id)
+    versions = cache.get_many([GENERATION_KEY, version_key])
+    generation = versions.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, _fresh_version(), timeout=None)
+        generation = cache.get(GENERATION_KEY)
+    version = versions.get(version_key)
+    if version is None:
+        cache.add(version_key, _fresh_version(), timeout=None)
+        version = cache.get(version_key)
+    return generation, version
+
+
+async def _acurrent_versions(customer_id):
+    cache = _cache()
+    version_key = CUSTOMER_VERSION_KEY.format(customer_id)
+    versions = await cache.aget_many([GENERATION_KEY, version_key])
+    generation = versions.get(GENERATION_KEY)
+    if generation is None:
+        await cache.aadd(GENERATION_KEY, _fresh_version(), timeout=None)
+        generation = await cache.aget(GENERATION_KEY)
+    version = versions.get(version_key)
+    if version is None:
+        await cache.aadd(version_key, _fresh_version(), timeout=None)
+        version = await cache.aget(version_key)
+    return generation, version
+
+
+def _decision_timeout():
+    # A decision computed on a lagging replica may predate the write that bumped
+    # the version, so keep it no longer than the read-your-writes window.
+    return settings.DATABASE_REPLICA_STICKY_SECONDS if db_router.reading_from_replica() else DEFAULT_TIMEOUT
+
+
+def cache_key(customer_id, loan_amount, interest_rate, tenure, generation, version, today=None, policy_version=None):
+    # The date is part of the key because "current" loans depend on it, and the
+    # policy version so a new policy never serves decisions made under the old one.
+    today = today or datetime.now().date()
+    policy_version = policy_version or active_policy().version
+    return (
+        f'elig:{customer_id}:{generation}:{version}:p{policy_version}:{today.isoformat()}:'
+        f'{loan_amount!r}:{interest_rate!r}:{tenure}'
+    )
+
+
+def get_or_compute(customer_id, loan_amount, interest_rate, tenure, compute):
+    """Return the cached eligibility response for these parameters, calling ``compute()`` on a miss.
+
+    Exceptions from ``compute`` (e.g. an unknown customer) propagate and nothing is cached.
+    """
+    try:
+        generation, version = _current_versions(customer_id)
+        key = cache_key(customer_id, loan_amount, interest_rate, tenure, generation, version)
+        cached = _cache().get(key)
+    except Exception:
+        # The cache is an optimisation only: fall through to the database when it is down.
+        logger.warning('Eligibility cache unavailable', exc_info=True)
+        return compute()
+    if cached is not None:
+        _count('hits')
+        return cached
+    _count('misses')
+    result = compute()
+    try:
+        _cache().set(key, result, _decision_timeout())
+    except Exception:
+        logger.warning('Could not store eligibility decision', exc_info=True)
+    return result
+
+
+async def aget_or_compute(customer_id, loan_amount, interest_rate, tenure, compute):
+    """Async ``get_or_compute``; ``compute`` is a coroutine function."""
+    try:
+        generation, version = await _acurrent_versions(customer_id)
+        key = cache_key(customer_id, loan_amount, interest_rate, tenure, generation, version)
+        cached = await _cache().aget(key)
+    except Exception:
+        logger.warning('Eligibility cache unavailable', exc_info=True)
+        return await compute()
+    if cached is not None:
+        _count('hits')
+        return cached
+    _count('misses')
+    result = await compute()
+    try:
+        await _cache().aset(key, result, _decision_timeout())
+    except Exception:
+        logger.warning('Could not store eligibility decision', exc_info=True)
+    return result
+
+
+def _bump(key):
+    cache = _cache()
+    try:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _fresh_version(), timeout=None)
+    except Exception:
+        # Runs after commit, so never fail the request; cached entries still expire.
+        logger.error('Could not invalidate eligibility cache key %s', key, exc_info=True)
+        return
+    _count('invalidations')
+
+
+def invalidate_customer(customer_id):
+    """Invalidate every cached decision for a customer once the current transaction commits."""
+    transaction.on_commit(lambda: _bump(CUSTOMER_VERSION_KEY.format(customer_id)))
+
+
+def invalidate_all():
+    """Invalidate every cached decision, used after bulk writes such as ingestion."""
+    transaction.on_commit(lambda: _bump(GENERATION_KEY))
+
+
+def cache_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = stats['hits'] / lookups if lookups else None
+    stats['evictions'] = _backend_evictions()
+    return stats
+
+
+def _backend_evictions():
+    # Redis tracks evictions server-wide; the in-memory fallback does not expose them.
+    cache = _cache()
+    if not hasattr(cache, '_cache') or not hasattr(cache._cache, 'get_client'):
+        return None
+    try:
+        return cache._cache.get_client().info('stats').get('evicted_keys')
+    except Exception:
+        return None
+
+
+def reset_cache_stats():
+    with _stats_lock:
+        for name in _stats:
+            _stats[name] = 0
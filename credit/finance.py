@@ -0,0 +1,101 @@
+"""EMI and amortization maths, vectorized with NumPy.
+
+Every function accepts scalars or arrays; scalar inputs give Python floats back.
+"""
+import numpy as np
+
+
+def approved_limit(monthly_income):
+    """Credit limit of a new customer: 36 months of income, rounded to the nearest lakh (100,000)."""
+    result = (np.round(36 * np.asarray(monthly_income, dtype=float) / 100000) * 100000).astype(np.int64)
+    return int(result) if result.ndim == 0 else result
+
+
+def monthly_rate(annual_rate):
+    return np.asarray(annual_rate, dtype=float) / (12 * 100)
+
+
+def emi(principal, annual_rate, tenure):
+    """Equated monthly instalment: ``P * r * (1 + r)**n / ((1 + r)**n - 1)``, or ``P / n`` at 0%."""
+    result = _emi(np.asarray(principal, dtype=float), monthly_rate(annual_rate), np.asarray(tenure, dtype=float))
+    return float(result) if result.ndim == 0 else result
+
+
+def _emi(principal, r, n):
+    growth = (1 + r) ** n
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(r > 0, principal * r * growth / (growth - 1), principal / n)
+
+
+def add_months(start_dates, months):
+    """Shift ``datetime64[D]`` dates by whole months, clamping to the end of shorter months."""
+    start_dates = np.asarray(start_dates, dtype='datetime64[D]')
+    start_month = start_dates.astype('datetime64[M]')
+    day = (start_dates - start_month.astype('datetime64[D]')).astype(int)
+    target_month = start_month + np.asarray(months)
+    month_length = ((target_month + 1).astype('datetime64[D]') - target_month.astype('datetime64[D]')).astype(int)
+    return target_month.astype('datetime64[D]') + np.minimum(day, month_length - 1)
+
+
+def amortization_schedules(principal, annual_rate, tenure, start_date=None):
+    """Month-by-month schedules for many loans at once, as flat arrays.
+
+    Row ``i`` belongs to loan ``loan_index[i]``; ``month`` runs from 1 to that
+    loan's tenure. ``balance`` is the outstanding principal after the payment.
+    ``due_date`` is only included when ``start_date`` is given.
+    """
+    principal, r, tenure = np.broadcast_arrays(
+        np.atleast_1d(np.asarray(principal, dtype=float)),
+        np.atleast_1d(monthly_rate(annual_rate)),
+        np.atleast_1d(np.asarray(tenure, dtype=np.int64)),
+    )
+    payment = _emi(principal, r, tenure)
+
+    loan_index = np.repeat(np.arange(len(tenure)), tenure)
+    offsets = np.cumsum(tenure) - tenure
+    month = np.arange(loan_index.size) - np.repeat(offsets, tenure) + 1
+
+    p, rate, installment = principal[loan_index], r[loan_index], payment[loan_index]
+
+    def balance_after(k):
+        # Closed form of the balance after k payments, so no month depends on the previous one.
+        growth = (1 + rate) ** k
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(rate > 0, p * growth - installment * (growth - 1) / rate, p - installment * k)
+
+    opening = balance_after(month - 1)
+    balance = balance_after(month)
+    interest = opening * rate
+    principal_paid = installment - interest
+    balance = np.where(month == tenure[loan_index], 0.0, np.maximum(balance, 0.0))
+
+    schedule = {
+        'loan_index': loan_index,
+        'month': month,
+        'payment': installment,
+        'principal': principal_paid,
+        'interest': interest,
+        'balance': balance,
+    }
+    if start_date is not None:
+        start = np.atleast_1d(np.asarray(start_date, dtype='datetime64[D]'))
+        schedule['due_date'] = add_months(start[loan_index], month)
+    return schedule
+
+
+def amortization_schedule(principal, annual_rate, tenure, start_date=None):
+    """Schedule for a single loan as a list of dicts, one per month."""
+    schedule = amortization_schedules(principal, annual_rate, tenure, start_date)
+    rows = []
+    for i in range(schedule['month'].size):
+        row = {
+            'month': int(schedule['month'][i]),
+            'payment': float(schedule['payment'][i]),
+            'principal': float(schedule['principal'][i]),
+            'interest': float(schedule['interest'][i]),
+            'balance': float(schedule['balance'][i]),
+        }
+        if 'due_date' in schedule:
+            row['due_date'] = schedule['due_date'][i].item()
+        rows.append(row)
+    return rows
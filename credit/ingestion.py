@@ -0,0 +1,446 @@
+import hashlib
+import logging
+import os
+from contextlib import contextmanager
+from datetime import datetime
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from . import conditional, eligibility_cache
+from .instrumentation import timed
+from .models import Customer, IngestedRow, IngestionSource, Loan, LoanHistory, Repayment
+from .profiles import refresh_profiles
+
+CHUNK_SIZE = 5000
+CUSTOMERS = 'customers'
+LOANS = 'loans'
+
+logger = logging.getLogger(__name__)
+
+CUSTOMER_COLUMNS = {
+    'Customer ID': 'id',
+    'First Name': 'first_name',
+    'Last Name': 'last_name',
+    'Age': 'age',
+    'Phone Number': 'phone_number',
+    'Monthly Salary': 'monthly_salary',
+    'Approved Limit': 'approved_limit',
+}
+
+LOAN_COLUMNS = {
+    'Loan ID': 'id',
+    'Customer ID': 'customer_id',
+    'Loan Amount': 'loan_amount',
+    'Tenure': 'tenure',
+    'Interest Rate': 'interest_rate',
+    'Monthly payment': 'monthly_repayment',
+    'EMIs paid on Time': 'emis_paid_on_time',
+    'Date of Approval': 'start_date',
+    'End Date': 'end_date',
+}
+
+CUSTOMER_UPDATE_FIELDS = [
+    'first_name', 'last_name', 'age', 'phone_number', 'monthly_salary', 'approved_limit',
+]
+LOAN_UPDATE_FIELDS = [
+    'customer', 'loan_amount', 'tenure', 'interest_rate', 'monthly_repayment', 'emis_paid_on_time',
+    'start_date', 'end_date', 'is_approved',
+]
+# Maintained by credit.repayments once a loan has ledger rows
+LEDGER_FIELDS = ['emis_paid_on_time']
+
+
+def prepare_customers(df):
+    frame = df[list(CUSTOMER_COLUMNS)].rename(columns=CUSTOMER_COLUMNS)
+    # Later rows win, exactly like the old row-by-row update_or_create.
+    frame = frame.drop_duplicates('id', keep='last')
+    frame['phone_number'] = frame['phone_number'].astype(str)
+    return frame
+
+
+def prepare_loans(df, known_customer_ids):
+    # Blank dates stay NaT here, so row hashes depend on the source alone; see fill_loan_dates.
+    frame = df[list(LOAN_COLUMNS)].rename(columns=LOAN_COLUMNS)
+    frame = frame[frame['customer_id'].isin(known_customer_ids)]
+    frame = frame.drop_duplicates('id', keep='last')
+    for column in ('start_date', 'end_date'):
+        frame[column] = pd.to_datetime(frame[column], errors='coerce')
+    # Keep rows inside the loan_tenure_positive constraint so one bad row cannot fail a whole chunk's bulk insert.
+    frame = frame[frame['tenure'] > 0]
+    frame['is_approved'] = True
+    return frame
+
+
+def fill_loan_dates(frame, existing, today=None):
+    """Fill blank dates from the stored loan in ``existing`` (``values()`` rows), or with today for new loans."""
+    today = pd.Timestamp(today or datetime.now().date())
+    stored = pd.DataFrame(existing, columns=['id', 'start_date', 'end_date']).set_index('id')
+    frame = frame.copy()
+    for column in ('start_date', 'end_date'):
+        known = pd.to_datetime(stored[column]).reindex(frame['id']).to_numpy()
+        frame[column] = frame[column].fillna(pd.Series(known, index=frame.index)).fillna(today)
+    # Keep rows inside the loan_end_after_start constraint
+    frame['end_date'] = frame[['start_date', 'end_date']].max(axis=1)
+    for column in ('start_date', 'end_date'):
+        frame[column] = frame[column].dt.date
+    return frame
+
+
+def _upsert(model, frame, update_fields, chunk_size):
+    written = 0
+    for start in range(0, len(frame), chunk_size):
+        records = frame.iloc[start:start + chunk_size].to_dict('records')
+        model.objects.bulk_create(
+            [model(**record) for record in records],
+            update_conflicts=True,
+            unique_fields=['id'],
+            update_fields=update_fields,
+        )
+        written += len(records)
+    return written
+
+
+def upsert_customers(frame, chunk_size=CHUNK_SIZE):
+    return _upsert(Customer, frame, CUSTOMER_UPDATE_FIELDS, chunk_size)
+
+
+def upsert_loans(frame, chunk_size=CHUNK_SIZE):
+    """Upsert loans; a loan with payments in the ``Repayment`` ledger keeps its payment counters.
+
+    The ledger numbers installments from ``emis_paid_on_time + emis_paid_late``,
+    so overwriting the on-time count from the file would make the next posting
+    collide with an installment that is already recorded.
+    """
+    with_ledger = frame['id'].isin(list(
+        Repayment.objects.filter(loan_id__in=frame['id'].tolist()).values_list('loan_id', flat=True).distinct()
+    ))
+    ledger_fields = [field for field in LOAN_UPDATE_FIELDS if field not in LEDGER_FIELDS]
+    return (
+        _upsert(Loan, frame[~with_ledger], LOAN_UPDATE_FIELDS, chunk_size)
+        + _upsert(Loan, frame[with_ledger], ledger_fields, chunk_size)
+    )
+
+
+def reset_sequences(*models):
+    # Rows are inserted with explicit IDs, so move the Postgres sequences past
+    # them; otherwise the next RegisterCustomerView insert collides.
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    if statements:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+
+def known_customer_ids():
+    return set(Customer.objects.values_list('id', flat=True))
+
+
+def _iter_csv(path, chunk_size, rows=None):
+    first, stop = rows or (0, None)
+    # skiprows counts source records, blank lines included, like the positions from _csv_ids.
+    # nrows counts parsed rows, so a span with blank lines is read slightly past its end.
+    yield from pd.read_csv(
+        path, chunksize=chunk_size, skiprows=range(1, first + 1), nrows=None if stop is None else stop - first
+    )
+
+
+def _csv_ids(path, id_column, chunk_size):
+    for chunk in pd.read_csv(path, chunksize=chunk_size, usecols=[id_column], skip_blank_lines=False):
+        yield chunk.index.to_numpy(), chunk[id_column].to_numpy()
+
+
+def _iter_parquet(path, chunk_size, rows=None):
+    import pyarrow.parquet as pq
+
+    # iter_batches decodes one row group at a time and slices it to chunk_size
+    parquet_file = pq.ParquetFile(path)
+    groups = list(range(parquet_file.num_row_groups))
+    if rows is not None:
+        # Only the row groups overlapping the span are decoded, whole
+        first, stop = rows
+        starts = np.cumsum([0] + [parquet_file.metadata.row_group(i).num_rows for i in groups])
+        groups = [i for i in groups if starts[i] < stop and starts[i + 1] > first]
+    for batch in parquet_file.iter_batches(batch_size=chunk_size, row_groups=groups):
+        yield batch.to_pandas()
+
+
+def _parquet_ids(path, id_column, chunk_size):
+    import pyarrow.parquet as pq
+
+    offset = 0
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=[id_column]):
+        ids = batch.column(0).to_numpy(zero_copy_only=False)
+        yield np.arange(offset, offset + len(ids)), ids
+        offset += len(ids)
+
+
+@contextmanager
+def _xlsx_rows(path, first=0, stop=None):
+    """The header and the data rows of the active sheet from position ``first`` to ``stop``."""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.active
+        header = next(sheet.iter_rows(max_row=1, values_only=True), None)
+        # Position 0 is the first row under the header
+        yield header, sheet.iter_rows(min_row=first + 2, max_row=None if stop is None else stop + 1, values_only=True)
+    finally:
+        workbook.close()
+
+
+def _iter_xlsx(path, chunk_size, rows=None):
+    with _xlsx_rows(path, *(rows or ())) as (header, source_rows):
+        if header is None:
+            return
+        source_rows = (row for row in source_rows if any(value is not None for value in row))
+        while True:
+            batch = list(islice(source_rows, chunk_size))
+            if not batch:
+                break
+            yield pd.DataFrame(batch, columns=header)
+
+
+def _xlsx_ids(path, id_column, chunk_size):
+    with _xlsx_rows(path) as (header, source_rows):
+        if header is None:
+            return
+        column = list(header).index(id_column)
+        positions = enumerate(row[column] for row in source_rows)
+        while True:
+            batch = list(islice(positions, chunk_size))
+            if not batch:
+                break
+            yield np.array([position for position, _ in batch]), np.array([value for _, value in batch], dtype=float)
+
+
+# Per extension: (chunk reader, ID-column reader)
+READERS = {
+    '.csv': (_iter_csv, _csv_ids),
+    '.parquet': (_iter_parquet, _parquet_ids),
+    '.xlsx': (_iter_xlsx, _xlsx_ids),
+    '.xlsm': (_iter_xlsx, _xlsx_ids),
+}
+
+
+def _readers(path):
+    extension = os.path.splitext(path)[1].lower()
+    try:
+        return READERS[extension]
+    except KeyError:
+        raise ValueError(f"Unsupported ingestion source '{path}': expected one of {', '.join(READERS)}")
+
+
+def iter_source_chunks(path, chunk_size=CHUNK_SIZE, rows=None):
+    """Yield the source file as DataFrames of at most ``chunk_size`` rows.
+
+    ``rows`` limits the read to the ``[first, stop)`` span of source positions
+    from ``iter_source_ids``; a few rows past either end may be included.
+    """
+    return _readers(path)[0](path, chunk_size, rows)
+
+
+def iter_source_ids(path, id_column, chunk_size=CHUNK_SIZE):
+    """Yield ``(positions, ids)`` arrays of one column of the source, without reading the other columns."""
+    return _readers(path)[1](path, id_column, chunk_size)
+
+
+def _in_range(chunk, id_column, id_range):
+    if id_range is None:
+        return chunk
+    low, high = id_range
+    return chunk[chunk[id_column].between(low, high)]
+
+
+def file_fingerprint(path, source):
+    """SHA-256 of the file at ``path`` as ``(fingerprint, size, mtime_ns)``.
+
+    The hash already stored on ``source`` is reused while size and mtime match,
+    so an unchanged file is not read at all.
+    """
+    stat = os.stat(path)
+    known = source.pending_fingerprint or source.fingerprint
+    if known and (source.size, source.mtime_ns) == (stat.st_size, stat.st_mtime_ns):
+        return known, stat.st_size, stat.st_mtime_ns
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for block in iter(lambda: handle.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest(), stat.st_size, stat.st_mtime_ns
+
+
+def source_key(kind, path, id_range=None):
+    key = f'{kind}:{os.path.abspath(path)}'
+    if id_range is not None:
+        key += ':{}-{}'.format(*id_range)
+    return key
+
+
+def row_hashes(frame):
+    # hash_pandas_object is seeded with a fixed key, so hashes are stable across processes.
+    return pd.util.hash_pandas_object(frame, index=False).to_numpy().view(np.int64)
+
+
+def changed_rows(model, kind, frame):
+    """The rows of ``frame`` that are new, or differ from what was last written, and their hashes.
+
+    A stored hash only counts while its row still exists, so rows deleted from
+    the database are written again.
+    """
+    hashes = row_hashes(frame)
+    ids = frame['id'].astype(np.int64).tolist()
+    stored = dict(
+        IngestedRow.objects.filter(kind=kind, row_id__in=ids)
+        .filter(Exists(model.objects.filter(id=OuterRef('row_id'))))
+        .values_list('row_id', 'row_hash')
+    )
+    changed = np.fromiter(
+        (stored.get(row_id) != row_hash for row_id, row_hash in zip(ids, hashes.tolist())), dtype=bool, count=len(ids)
+    )
+    return frame[changed], hashes[changed]
+
+
+def record_row_hashes(kind, frame, hashes):
+    IngestedRow.objects.bulk_create(
+        [
+            IngestedRow(kind=kind, row_id=row_id, row_hash=row_hash)
+            for row_id, row_hash in zip(frame['id'].astype(np.int64).tolist(), hashes.tolist())
+        ],
+        update_conflicts=True,
+        unique_fields=['kind', 'row_id'],
+        update_fields=['row_hash'],
+    )
+
+
+def _ingest_source(kind, path, chunk_size, id_range, rows, force, write_chunk):
+    """Feed ``path`` chunk by chunk to ``write_chunk``, skipping the file when unchanged.
+
+    Each chunk commits together with a checkpoint, so a run that dies is
+    resumed after its last committed chunk when the same file is ingested
+    again with the same chunk size.
+    """
+    source, _ = IngestionSource.objects.get_or_create(key=source_key(kind, path, id_range))
+    fingerprint, size, mtime_ns = file_fingerprint(path, source)
+    if source.fingerprint == fingerprint and not force:
+        logger.info('%s is unchanged since %s; skipping', source.key, source.completed_at)
+        return 0
+    resume = source.chunks_done if (source.pending_fingerprint, source.chunk_size) == (fingerprint, chunk_size) else 0
+    if resume:
+        logger.info('Resuming %s after chunk %d', source.key, resume)
+    source.pending_fingerprint, source.size, source.mtime_ns = fingerprint, size, mtime_ns
+    source.chunk_size, source.chunks_done = chunk_size, resume
+    source.save()
+
+    written = 0
+    for number, chunk in enumerate(iter_source_chunks(path, chunk_size, rows)):
+        if number < resume:
+            continue
+        # One transaction per chunk keeps locks short and memory flat.
+        with transaction.atomic():
+            written += write_chunk(chunk)
+            source.chunks_done = number + 1
+            source.save(update_fields=['chunks_done'])
+
+    source.fingerprint, source.pending_fingerprint, source.chunks_done = fingerprint, '', 0
+    source.completed_at = timezone.now()
+    source.save(update_fields=['fingerprint', 'pending_fingerprint', 'chunks_done', 'completed_at'])
+    return written
+
+
+def ingest_customers(path, chunk_size=CHUNK_SIZE, id_range=None, reset=True, force=False, rows=None):
+    """Write the new and changed customers of ``path``; returns how many were written.
+
+    ``id_range`` and ``rows`` restrict the run to one shard from ``plan_id_shards``.
+    """
+    def write_chunk(chunk):
+        with timed('prepare'):
+            frame = prepare_customers(_in_range(chunk, 'Customer ID', id_range))
+        with timed('diff'):
+            frame, hashes = changed_rows(Customer, CUSTOMERS, frame)
+        if frame.empty:
+            return 0
+        with timed('write'):
+            written = upsert_customers(frame, chunk_size)
+            record_row_hashes(CUSTOMERS, frame, hashes)
+            conditional.touch_customers(frame['id'].tolist())
+        eligibility_cache.invalidate_all()
+        return written
+
+    written = _ingest_source(CUSTOMERS, path, chunk_size, id_range, rows, force, write_chunk)
+    if reset and written:
+        reset_sequences(Customer)
+    return written
+
+
+def ingest_loans(path, chunk_size=CHUNK_SIZE, id_range=None, reset=True, force=False, rows=None):
+    """Write the new and changed loans of ``path``; returns how many were written.
+
+    Pass ``force`` after customers were written: loans skipped earlier for an
+    unknown customer may now be accepted although the loan file is unchanged.
+    """
+    customer_ids = known_customer_ids()
+
+    def write_chunk(chunk):
+        with timed('prepare'):
+            frame = prepare_loans(_in_range(chunk, 'Loan ID', id_range), customer_ids)
+        with timed('diff'):
+            # Archived loans are final; writing them back to Loan would count them twice.
+            archived = LoanHistory.objects.filter(id__in=frame['id'].tolist()).values_list('id', flat=True)
+            frame = frame[~frame['id'].isin(list(archived))]
+            frame, hashes = changed_rows(Loan, LOANS, frame)
+        if frame.empty:
+            return 0
+        existing = list(Loan.objects.filter(id__in=frame['id'].tolist()).values('id', 'customer_id', 'start_date', 'end_date'))
+        with timed('prepare'):
+            frame = fill_loan_dates(frame, existing)
+        # Refresh the credit profiles of both the new and any previous owners of these loans
+        affected = set(frame['customer_id'].tolist())
+        affected.update(loan['customer_id'] for loan in existing)
+        with timed('write'):
+            written = upsert_loans(frame, chunk_size)
+            record_row_hashes(LOANS, frame, hashes)
+            conditional.touch_loans(frame['id'].tolist())
+        with timed('refresh_profiles'):
+            refresh_profiles(affected)
+        # After the refresh, which locks these customers in ID order
+        conditional.touch_customers(affected)
+        eligibility_cache.invalidate_all()
+        return written
+
+    written = _ingest_source(LOANS, path, chunk_size, id_range, rows, force, write_chunk)
+    if reset and written:
+        reset_sequences(Loan)
+    return written
+
+
+def plan_id_shards(path, id_column, shard_count, chunk_size=CHUNK_SIZE):
+    """Split the ID span of a source into ``shard_count`` contiguous inclusive ranges.
+
+    Returns ``{'id_range': [low, high], 'rows': [first, stop]}`` per shard, where
+    ``rows`` spans the chunks of the source holding IDs in that range. Reading
+    only the ID column once here lets each shard read just its own rows when
+    the file is sorted by ID, instead of parsing the whole file per shard.
+    """
+    spans = []
+    for positions, ids in iter_source_ids(path, id_column, chunk_size):
+        present = ~pd.isna(ids)
+        if present.any():
+            spans.append((int(ids[present].min()), int(ids[present].max()), int(positions[0]), int(positions[-1]) + 1))
+    if not spans:
+        return []
+    low, high = min(span[0] for span in spans), max(span[1] for span in spans)
+    step = max(-(-(high - low + 1) // shard_count), 1)
+    shards = []
+    for start in range(low, high + 1, step):
+        end = min(start + step - 1, high)
+        overlapping = [span for span in spans if span[0] <= end and span[1] >= start]
+        if overlapping:
+            rows = [min(span[2] for span in overlapping), max(span[3] for span in overlapping)]
+            shards.append({'id_range': [start, end], 'rows': rows})
+    return shards
@@ -0,0 +1,222 @@
+"""Per-request and per-task instrumentation, exported in the Prometheus text format.
+
+``collect`` gathers the SQL query count, time spent in the database (through a
+connection execute wrapper) and named phases (``timed('serialize')``, ...)
+for one request or task; ``record_request`` and ``track_task`` fold them into
+process-wide counters and histograms. Metrics are kept per process: every gunicorn or Celery worker
+exports its own, so aggregate them in Prometheus with ``sum by (route)``.
+"""
+import cProfile
+import io
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+try:
+    import pyinstrument
+except ImportError:  # optional, only for X-Profile: pyinstrument
+    pyinstrument = None
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 500)
+
+METRICS = {
+    'credit_requests_total': ('counter', 'HTTP requests by route, method and status.'),
+    'credit_request_duration_seconds': ('histogram', 'Total request latency by route.'),
+    'credit_request_db_queries': ('histogram', 'SQL queries per request by route.'),
+    'credit_request_db_seconds_total': ('counter', 'Time spent executing SQL by route.'),
+    'credit_request_phase_seconds_total': ('counter', 'Time spent in instrumented phases by route.'),
+    'credit_tasks_total': ('counter', 'Instrumented task runs by task and outcome.'),
+    'credit_task_duration_seconds': ('histogram', 'Task duration.'),
+    'credit_task_db_queries_total': ('counter', 'SQL queries issued by tasks.'),
+    'credit_task_db_seconds_total': ('counter', 'Time tasks spent executing SQL.'),
+    'credit_task_phase_seconds_total': ('counter', 'Time tasks spent in instrumented phases.'),
+    'credit_eligibility_cache_hits_total': ('counter', 'Eligibility cache hits.'),
+    'credit_eligibility_cache_misses_total': ('counter', 'Eligibility cache misses.'),
+    'credit_eligibility_cache_invalidations_total': ('counter', 'Eligibility cache invalidations.'),
+    'credit_eligibility_cache_evictions_total': ('counter', 'Keys evicted by the cache backend (Redis only).'),
+}
+
+_current = ContextVar('credit_instrumentation', default=None)
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+
+
+class Stats:
+    __slots__ = ('queries', 'db_seconds', 'phases')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.phases = {}
+
+
+def query_timer(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_seconds += time.perf_counter() - started
+
+
+def install_query_timer(sender, connection, **kwargs):
+    # connection_created fires on every reconnect of the same wrapper.
+    if query_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_timer)
+
+
+@contextmanager
+def collect():
+    """Collect stats for the enclosed block; they flow into async-ORM threads through the context."""
+    stats = Stats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def timed(phase):
+    """Add the time spent in the block to ``phase`` of the current request or task, if any."""
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.phases[phase] = stats.phases.get(phase, 0.0) + time.perf_counter() - started
+
+
+def add_phase_time(phase, seconds):
+    stats = _current.get()
+    if stats is not None:
+        stats.phases[phase] = stats.phases.get(phase, 0.0) + seconds
+
+
+def record_request(route, method, status_code, seconds, stats):
+    labels = (('route', route),)
+    with _lock:
+        _inc('credit_requests_total', labels + (('method', method), ('status', str(status_code))))
+        _observe('credit_request_duration_seconds', labels, seconds, LATENCY_BUCKETS)
+        _observe('credit_request_db_queries', labels, stats.queries, QUERY_BUCKETS)
+        _inc('credit_request_db_seconds_total', labels, stats.db_seconds)
+        for phase, phase_seconds in stats.phases.items():
+            _inc('credit_request_phase_seconds_total', labels + (('phase', phase),), phase_seconds)
+
+
+@contextmanager
+def track_task(name):
+    """Instrument a Celery task (or any other unit of work outside a request)."""
+    started = time.perf_counter()
+    outcome = 'failure'
+    with collect() as stats:
+        try:
+            yield stats
+            outcome = 'success'
+        finally:
+            labels = (('task', name),)
+            with _lock:
+                _inc('credit_tasks_total', labels + (('outcome', outcome),))
+                _observe('credit_task_duration_seconds', labels, time.perf_counter() - started, LATENCY_BUCKETS)
+                _inc('credit_task_db_queries_total', labels, stats.queries)
+                _inc('credit_task_db_seconds_total', labels, stats.db_seconds)
+                for phase, phase_seconds in stats.phases.items():
+                    _inc('credit_task_phase_seconds_total', labels + (('phase', phase),), phase_seconds)
+
+
+def profile(mode, func, *args):
+    """Run ``func`` under pyinstrument (when installed and asked for) or cProfile; returns ``(result, report)``."""
+    if mode == 'pyinstrument' and pyinstrument is not None:
+        profiler = pyinstrument.Profiler()
+        profiler.start()
+        try:
+            result = func(*args)
+        finally:
+            profiler.stop()
+        return result, profiler.output_text()
+    profiler = cProfile.Profile()
+    result = profiler.runcall(func, *args)
+    report = io.StringIO()
+    pstats.Stats(profiler, stream=report).sort_stats('cumulative').print_stats(50)
+    return result, report.getvalue()
+
+
+def _inc(name, labels, amount=1):
+    key = (name, labels)
+    _counters[key] = _counters.get(key, 0) + amount
+
+
+def _observe(name, labels, value, buckets):
+    key = (name, labels)
+    histogram = _histograms.get(key)
+    if histogram is None:
+        # One count per bucket (non-cumulative), then sum and count.
+        histogram = _histograms[key] = [buckets, [0] * len(buckets), 0.0, 0]
+    for position, bound in enumerate(buckets):
+        if value <= bound:
+            histogram[1][position] += 1
+            break
+    histogram[2] += value
+    histogram[3] += 1
+
+
+def reset_metrics():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render_metrics(extra_counters=None):
+    """All metrics of this process in the Prometheus text exposition format (version 0.0.4)."""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: [value[0], list(value[1]), value[2], value[3]] for key, value in _histograms.items()}
+    for name, value in (extra_counters or {}).items():
+        counters[(name, ())] = value
+
+    samples = {}
+    for (name, labels), value in sorted(counters.items()):
+        samples.setdefault(name, []).append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+    for (name, labels), (buckets, counts, total, count) in sorted(histograms.items()):
+        lines = samples.setdefault(name, [])
+        cumulative = 0
+        for bound, bucket_count in zip(buckets, counts):
+            cumulative += bucket_count
+            lines.append(f'{name}_bucket{_format_labels(labels + (("le", _format_value(float(bound))),))} {cumulative}')
+        lines.append(f'{name}_bucket{_format_labels(labels + (("le", "+Inf"),))} {count}')
+        lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(total)}')
+        lines.append(f'{name}_count{_format_labels(labels)} {count}')
+
+    output = []
+    for name in sorted(samples):
+        kind, help_text = METRICS[name]
+        output.append(f'# HELP {name} {help_text}')
+        output.append(f'# TYPE {name} {kind}')
+        output.extend(samples[name])
+    return '\n'.join(output) + '\n'
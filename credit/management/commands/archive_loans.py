@@ -0,0 +1,21 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+
+from credit.archival import ARCHIVE_BATCH_SIZE, archive_closed_loans, closed_loans
+
+
+class Command(BaseCommand):
+    help = ('Move fully repaid loans that ended and started before this year from the loan table to the loan '
+            'history, keeping their contribution to the credit-score inputs on the customer.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE, help='Loans moved per transaction.')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the loans that would be archived.')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            self.stdout.write(f'{closed_loans(datetime.now().date()).count()} closed loans would be archived.')
+            return
+        moved = archive_closed_loans(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Archived {moved} closed loans.'))
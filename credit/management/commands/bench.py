@@ -0,0 +1,275 @@
+import json
+import random
+import tempfile
+import time
+from itertools import count
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext, setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+from django.urls import reverse
+
+from credit import finance
+from credit.benchmarking import latency_summary, run_concurrently
+from credit.ingestion import ingest_customers, ingest_loans
+from credit.management.commands.bench_ingest import generate_workbooks
+from credit.models import Customer, Loan
+from credit.profiles import refresh_profiles
+
+ENDPOINTS = ('register', 'check-eligibility', 'create-loan', 'view-loan', 'view-loans')
+EXPECTED_STATUS = {'register': 201}
+
+
+def load_distributions(customer_path, loan_path):
+    """Rows of the shipped workbooks to resample from, or None when they are missing."""
+    if not Path(customer_path).exists() or not Path(loan_path).exists():
+        return None
+    customers = pd.read_excel(customer_path, usecols=['Age', 'Monthly Salary'])
+    loans = pd.read_excel(loan_path, usecols=[
+        'Loan Amount', 'Tenure', 'Interest Rate', 'Monthly payment', 'EMIs paid on Time', 'Date of Approval',
+    ])
+    loans = loans.dropna()
+    loans = loans[loans['Tenure'] > 0]
+    return {'customers': customers.dropna(), 'loans': loans}
+
+
+def synthetic_distributions(rng, size=1000):
+    # Fallback shaped like the shipped workbooks.
+    tenure = rng.integers(6, 180, size)
+    amount = rng.integers(1, 100, size) * 10000.0
+    rate = np.round(rng.uniform(8, 20, size), 2)
+    return {
+        'customers': pd.DataFrame({'Age': rng.integers(21, 70, size), 'Monthly Salary': rng.integers(20, 300, size) * 1000}),
+        'loans': pd.DataFrame({
+            'Loan Amount': amount,
+            'Tenure': tenure,
+            'Interest Rate': rate,
+            'Monthly payment': finance.emi(amount, rate, tenure),
+            'EMIs paid on Time': (tenure * rng.random(size)).astype(int),
+            'Date of Approval': pd.Timestamp('2010-01-01') + pd.to_timedelta(rng.integers(0, 5000, size), unit='D'),
+        }),
+    }
+
+
+def seed_population(customers, loans_per_customer, distributions, seed=0, tag=''):
+    """Create ``customers`` customers with ``loans_per_customer`` loans each, resampling whole workbook rows.
+
+    ``tag`` keeps phone numbers unique across runs. Returns ``(customer_ids, loan_ids)``.
+    """
+    rng = np.random.default_rng(seed)
+    people = distributions['customers'].sample(customers, replace=True, random_state=rng)
+    salaries = people['Monthly Salary'].astype(int).to_numpy()
+    created = Customer.objects.bulk_create(
+        [
+            Customer(
+                first_name='Bench', last_name=str(i), phone_number=f'b{tag}{i}',
+                monthly_salary=int(salary), approved_limit=int(limit), age=int(age),
+            )
+            for i, (salary, limit, age) in enumerate(zip(
+                salaries, finance.approved_limit(salaries), people['Age'].astype(int)
+            ))
+        ],
+        batch_size=2000,
+    )
+    customer_ids = [customer.pk for customer in created]
+
+    total = customers * loans_per_customer
+    rows = distributions['loans'].sample(total, replace=True, random_state=rng)
+    tenure = rows['Tenure'].astype(int).to_numpy()
+    start = pd.to_datetime(rows['Date of Approval']).to_numpy().astype('datetime64[D]')
+    end = finance.add_months(start, tenure)
+    paid = np.minimum(rows['EMIs paid on Time'].astype(int).to_numpy(), tenure)
+    owners = np.repeat(customer_ids, loans_per_customer)
+    Loan.objects.bulk_create(
+        [
+            Loan(
+                customer_id=int(owners[i]), loan_amount=float(amount), tenure=int(tenure[i]), interest_rate=float(rate),
+                monthly_repayment=float(payment), emis_paid_on_time=int(paid[i]),
+                start_date=start[i].item(), end_date=end[i].item(), is_approved=True,
+            )
+            for i, (amount, rate, payment) in enumerate(zip(
+                rows['Loan Amount'], rows['Interest Rate'], rows['Monthly payment']
+            ))
+        ],
+        batch_size=5000,
+    )
+    refresh_profiles(customer_ids)
+    loan_ids = list(Loan.objects.filter(customer_id__in=customer_ids[:1000]).values_list('id', flat=True))
+    return customer_ids, loan_ids
+
+
+def compare_to_baseline(report, baseline, tolerance):
+    """Regressions of ``report`` against ``baseline`` as human-readable strings.
+
+    Latency may grow and throughput may drop by ``tolerance`` (a fraction);
+    queries per request may not grow at all.
+    """
+    regressions = []
+    for name, current in report['endpoints'].items():
+        previous = baseline.get('endpoints', {}).get(name)
+        if not previous:
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms'):
+            if previous.get(metric) and current[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(f'{name} {metric} {current[metric]:.2f} > baseline {previous[metric]:.2f}')
+        if previous.get('throughput_rps') and current['throughput_rps'] < previous['throughput_rps'] * (1 - tolerance):
+            regressions.append(
+                f"{name} throughput {current['throughput_rps']:.1f} < baseline {previous['throughput_rps']:.1f} req/s"
+            )
+        if current['queries_per_request'] > previous.get('queries_per_request', float('inf')):
+            regressions.append(
+                f"{name} queries/request {current['queries_per_request']:.2f} > baseline {previous['queries_per_request']:.2f}"
+            )
+    previous = baseline.get('ingestion')
+    current = report.get('ingestion')
+    if previous and current and current['rows_per_second'] < previous['rows_per_second'] * (1 - tolerance):
+        regressions.append(
+            f"ingestion {current['rows_per_second']:.0f} < baseline {previous['rows_per_second']:.0f} rows/s"
+        )
+    return regressions
+
+
+class Command(BaseCommand):
+    help = ('Seed a synthetic population, load-test every API endpoint and ingestion, and report throughput, '
+            'latency percentiles and queries per request as JSON; optionally fail on regressions against a baseline.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=1000)
+        parser.add_argument('--loans-per-customer', type=int, default=3)
+        parser.add_argument('--requests', type=int, default=500, help='Requests per endpoint.')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--warmup', type=int, default=20, help='Untimed requests per endpoint before measuring.')
+        parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=list(ENDPOINTS))
+        parser.add_argument('--ingest-rows', type=int, default=10000, help='Loan rows to ingest; 0 skips ingestion.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Also write the JSON report to this file.')
+        parser.add_argument('--baseline', help='JSON report of an earlier run to compare against.')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed latency growth / throughput drop against the baseline (fraction).')
+        parser.add_argument('--in-place', action='store_true',
+                            help='Use the configured database instead of a throwaway test database; seeded rows stay.')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as handle:
+                baseline = json.load(handle)
+
+        # Like the test runner: DEBUG off (as in production) and the test client's host allowed.
+        try:
+            setup_test_environment()
+        except RuntimeError:
+            own_environment = False  # already inside a test run
+        else:
+            own_environment = True
+        old_config = None
+        try:
+            if not options['in_place']:
+                old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+            report = self.benchmark(options)
+        finally:
+            if old_config is not None:
+                teardown_databases(old_config, verbosity=0)
+            if own_environment:
+                teardown_test_environment()
+
+        output = json.dumps(report, indent=2)
+        self.stdout.write(output)
+        if options['output']:
+            Path(options['output']).write_text(output)
+        if baseline is not None:
+            regressions = compare_to_baseline(report, baseline, options['tolerance'])
+            if regressions:
+                raise CommandError('Performance regressions against baseline:\n' + '\n'.join(regressions))
+            self.stderr.write(self.style.SUCCESS('No regressions against baseline.'))
+
+    def benchmark(self, options):
+        tag = f'{int(time.time()) % 16 ** 6:06x}'
+        distributions = load_distributions(
+            settings.BASE_DIR / 'customer_data.xlsx', settings.BASE_DIR / 'loan_data.xlsx'
+        ) or synthetic_distributions(np.random.default_rng(options['seed']))
+        started = time.perf_counter()
+        customer_ids, loan_ids = seed_population(
+            options['customers'], options['loans_per_customer'], distributions, options['seed'], tag
+        )
+        report = {
+            'config': {
+                key: options[key] for key in (
+                    'customers', 'loans_per_customer', 'requests', 'concurrency', 'warmup', 'ingest_rows', 'seed'
+                )
+            },
+            'seed_seconds': time.perf_counter() - started,
+            'database': connection.vendor,
+            'endpoints': {},
+        }
+        rng = random.Random(options['seed'])
+        phones = (f'r{tag}{n}' for n in count())
+        for endpoint in options['endpoints']:
+            warmup = [self.build_request(endpoint, rng, customer_ids, loan_ids, phones) for _ in range(options['warmup'])]
+            self.drive(endpoint, warmup, options['concurrency'])
+            jobs = [self.build_request(endpoint, rng, customer_ids, loan_ids, phones) for _ in range(options['requests'])]
+            report['endpoints'][endpoint] = self.drive(endpoint, jobs, options['concurrency'])
+        if options['ingest_rows']:
+            report['ingestion'] = self.time_ingestion(options['ingest_rows'], options['seed'])
+        return report
+
+    def build_request(self, endpoint, rng, customer_ids, loan_ids, phones):
+        if endpoint == 'register':
+            return 'post', reverse('customer-register'), {
+                'first_name': 'Bench', 'last_name': 'Register', 'age': rng.randint(21, 70),
+                'monthly_income': rng.randint(20, 300) * 1000, 'phone_number': next(phones),
+            }
+        if endpoint in ('check-eligibility', 'create-loan'):
+            return 'post', reverse(endpoint), {
+                'customer_id': rng.choice(customer_ids),
+                'loan_amount': rng.choice([50000, 100000, 250000, 500000]),
+                'interest_rate': rng.choice([8.0, 11.0, 14.0, 17.0]),
+                'tenure': rng.choice([6, 12, 24, 36]),
+            }
+        if endpoint == 'view-loan':
+            return 'get', reverse('view-loan', args=[rng.choice(loan_ids)]), None
+        return 'get', reverse('view-loans', args=[rng.choice(customer_ids)]), None
+
+    def drive(self, endpoint, jobs, concurrency):
+        expected = EXPECTED_STATUS.get(endpoint, 200)
+
+        def send(job):
+            method, path, body = job
+            # Count server errors instead of aborting the run.
+            client = Client(raise_request_exception=False)
+            with CaptureQueriesContext(connection) as queries:
+                if method == 'post':
+                    response = client.post(path, body, content_type='application/json')
+                else:
+                    response = client.get(path)
+            return response.status_code, len(queries)
+
+        outcomes, latencies, elapsed = run_concurrently(send, jobs, concurrency)
+        summary = latency_summary(latencies, elapsed)
+        summary['queries_per_request'] = sum(queries for _, queries in outcomes) / len(outcomes) if outcomes else 0
+        summary['errors'] = sum(1 for code, _ in outcomes if code != expected)
+        return summary
+
+    def time_ingestion(self, rows, seed):
+        with tempfile.TemporaryDirectory() as workdir:
+            customer_path, loan_path = generate_workbooks(workdir, rows, seed=seed, fmt='csv')
+            # Generated IDs overlap existing rows, so roll back like bench_ingest.
+            with transaction.atomic():
+                started = time.perf_counter()
+                customers = ingest_customers(customer_path)
+                loans = ingest_loans(loan_path)
+                seconds = time.perf_counter() - started
+                transaction.set_rollback(True)
+        return {
+            'customers': customers,
+            'loans': loans,
+            'seconds': seconds,
+            'rows_per_second': (customers + loans) / seconds if seconds else None,
+        }
@@ -0,0 +1,49 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from credit import finance
+
+
+def scalar_emi(loan_amount, interest_rate, tenure):
+    # The formula as it was written inline in the views.
+    r = interest_rate / (12 * 100)
+    n = tenure
+    return (loan_amount * r * (1 + r) ** n) / ((1 + r) ** n - 1) if r > 0 else loan_amount / n
+
+
+class Command(BaseCommand):
+    help = 'Microbenchmark the vectorized EMI and schedule engine against the scalar EMI formula.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loans', type=int, nargs='+', default=[1, 1000, 1000000])
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        self.stdout.write(f"{'loans':>9} {'scalar ms':>10} {'numpy ms':>10} {'speedup':>8} {'schedule ms':>12} {'max diff':>9}")
+        for count in options['loans']:
+            amounts = rng.integers(1, 100, count) * 10000.0
+            rates = np.round(rng.uniform(0, 20, count), 2)
+            tenures = rng.integers(6, 120, count)
+
+            started = time.perf_counter()
+            scalar = [scalar_emi(a, r, n) for a, r, n in zip(amounts.tolist(), rates.tolist(), tenures.tolist())]
+            scalar_ms = (time.perf_counter() - started) * 1000
+
+            started = time.perf_counter()
+            vector = finance.emi(amounts, rates, tenures)
+            vector_ms = (time.perf_counter() - started) * 1000
+
+            # Schedules grow with tenure, so cap the sample to keep memory bounded
+            sample = min(count, 100000)
+            started = time.perf_counter()
+            finance.amortization_schedules(amounts[:sample], rates[:sample], tenures[:sample])
+            schedule_ms = (time.perf_counter() - started) * 1000
+
+            max_diff = float(np.max(np.abs(np.asarray(scalar) - vector)))
+            self.stdout.write(
+                f'{count:>9} {scalar_ms:>10.3f} {vector_ms:>10.3f} {scalar_ms / max(vector_ms, 1e-9):>7.1f}x '
+                f'{schedule_ms:>12.3f} {max_diff:>9.2e}'
+            )
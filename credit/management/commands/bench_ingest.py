@@ -0,0 +1,83 @@
+import os
+import resource
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from credit.ingestion import ingest_customers, ingest_loans
+
+
+def generate_workbooks(directory, loan_rows, seed=0, fmt='xlsx'):
+    """Write synthetic customer/loan sources shaped like the shipped Excel files."""
+    rng = np.random.default_rng(seed)
+    customer_rows = max(loan_rows // 10, 1)
+    customer_ids = np.arange(1, customer_rows + 1)
+    salaries = rng.integers(20, 300, customer_rows) * 1000
+    customers = pd.DataFrame({
+        'Customer ID': customer_ids,
+        'First Name': 'First',
+        'Last Name': pd.Series(customer_ids).astype(str),
+        'Age': rng.integers(21, 70, customer_rows),
+        'Phone Number': 9000000000 + customer_ids,
+        'Monthly Salary': salaries,
+        'Approved Limit': np.round(36 * salaries / 100000) * 100000,
+    })
+    start = pd.Timestamp('2010-01-01') + pd.to_timedelta(rng.integers(0, 5000, loan_rows), unit='D')
+    tenure = rng.integers(6, 180, loan_rows)
+    loans = pd.DataFrame({
+        'Customer ID': rng.choice(customer_ids, loan_rows),
+        'Loan ID': np.arange(1, loan_rows + 1),
+        'Loan Amount': rng.integers(1, 100, loan_rows) * 10000,
+        'Tenure': tenure,
+        'Interest Rate': np.round(rng.uniform(8, 20, loan_rows), 2),
+        'Monthly payment': rng.integers(1000, 50000, loan_rows),
+        'EMIs paid on Time': rng.integers(0, 180, loan_rows),
+        'Date of Approval': start,
+        'End Date': start + pd.to_timedelta(tenure * 30, unit='D'),
+    })
+    customer_path = os.path.join(directory, f'customers_{loan_rows}.{fmt}')
+    loan_path = os.path.join(directory, f'loans_{loan_rows}.{fmt}')
+    for frame, path in ((customers, customer_path), (loans, loan_path)):
+        if fmt == 'csv':
+            frame.to_csv(path, index=False)
+        elif fmt == 'parquet':
+            frame.to_parquet(path, index=False)
+        else:
+            frame.to_excel(path, index=False)
+    return customer_path, loan_path
+
+
+class Command(BaseCommand):
+    help = 'Time streaming ingestion against generated Excel, CSV or Parquet sources.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000],
+                            help='Loan rows per generated workbook (customers are rows / 10).')
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--format', choices=['xlsx', 'csv', 'parquet'], default='xlsx')
+        parser.add_argument('--workdir', default=None,
+                            help='Directory for generated workbooks (defaults to a temporary directory).')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as tmp:
+            workdir = options['workdir'] or tmp
+            for rows in options['rows']:
+                customer_path, loan_path = generate_workbooks(workdir, rows, fmt=options['format'])
+                # Roll back so the generated rows never stay in the database.
+                with transaction.atomic():
+                    started = time.perf_counter()
+                    customers = ingest_customers(customer_path, options['chunk_size'])
+                    customer_seconds = time.perf_counter() - started
+                    started = time.perf_counter()
+                    loans = ingest_loans(loan_path, options['chunk_size'])
+                    loan_seconds = time.perf_counter() - started
+                    transaction.set_rollback(True)
+                peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+                self.stdout.write(
+                    f'{rows} {options["format"]} rows: {customers} customers in {customer_seconds:.2f}s, '
+                    f'{loans} loans in {loan_seconds:.2f}s ({loans / max(loan_seconds, 1e-9):.0f} loans/s, peak RSS {peak_mb:.1f} MB)'
+                )
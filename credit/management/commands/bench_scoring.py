@@ -0,0 +1,106 @@
+import statistics
+import time
+from datetime import date, datetime, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from credit.models import Customer, Loan
+from credit.profiles import load_profile_inputs, refresh_profiles
+from credit.scoring import load_credit_inputs
+
+
+def legacy_credit_inputs(customer_id):
+    # The per-loan loop the eligibility views used before the aggregate query.
+    customer = Customer.objects.get(id=customer_id)
+    loans = Loan.objects.filter(customer=customer)
+    now = datetime.now()
+    totals = {
+        'num_loans': loans.count(),
+        'current_loans_sum': 0,
+        'total_current_emi': 0,
+        'loans_paid_on_time': 0,
+        'loan_activity_this_year': 0,
+        'loan_approved_volume': 0,
+    }
+    for loan in loans:
+        if loan.end_date >= now.date():
+            totals['current_loans_sum'] += loan.loan_amount
+            totals['total_current_emi'] += loan.monthly_repayment
+        if loan.emis_paid_on_time >= loan.tenure:
+            totals['loans_paid_on_time'] += 1
+        if loan.start_date.year == now.year:
+            totals['loan_activity_this_year'] += 1
+        totals['loan_approved_volume'] += loan.loan_amount
+    return customer, totals
+
+
+def aggregate_credit_inputs(customer_id):
+    return load_credit_inputs(customer_id)
+
+
+def profile_credit_inputs(customer_id):
+    return load_profile_inputs(customer_id)
+
+
+class Command(BaseCommand):
+    help = 'Compare latency and query count of the per-loan scoring loop, the aggregate query and the credit profile.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1, 100, 10000],
+                            help='Loans per customer to benchmark.')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        # Seed inside a transaction that is always rolled back, so the benchmark
+        # never leaves rows behind in the target database.
+        with transaction.atomic():
+            results = [self.run_size(size, options['repeat']) for size in options['sizes']]
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"{'loans':>8} {'impl':>10} {'median ms':>10} {'queries':>8}")
+        for size, rows in results:
+            for name, median_ms, queries in rows:
+                self.stdout.write(f"{size:>8} {name:>10} {median_ms:>10.3f} {queries:>8}")
+
+    def run_size(self, size, repeat):
+        customer = Customer.objects.create(
+            first_name='Bench', last_name=str(size), phone_number=f'bench-{size}',
+            monthly_salary=100000, approved_limit=3600000, age=35,
+        )
+        today = date.today()
+        Loan.objects.bulk_create(
+            [
+                Loan(
+                    customer=customer,
+                    loan_amount=10000 + i,
+                    tenure=12,
+                    interest_rate=10.0,
+                    monthly_repayment=900.0,
+                    emis_paid_on_time=12 if i % 2 else 3,
+                    start_date=today - timedelta(days=i % 1500),
+                    # Ends on or after the start, spread either side of today
+                    end_date=today - timedelta(days=i % 1500) + timedelta(days=i % 1000),
+                    is_approved=True,
+                )
+                for i in range(size)
+            ],
+            batch_size=2000,
+        )
+        refresh_profiles([customer.id])
+        rows = []
+        implementations = (
+            ('loop', legacy_credit_inputs),
+            ('aggregate', aggregate_credit_inputs),
+            ('profile', profile_credit_inputs),
+        )
+        for name, func in implementations:
+            timings = []
+            for _ in range(repeat):
+                with CaptureQueriesContext(connection) as ctx:
+                    started = time.perf_counter()
+                    func(customer.id)
+                    timings.append((time.perf_counter() - started) * 1000)
+            rows.append((name, statistics.median(timings), len(ctx.captured_queries)))
+        return size, rows
@@ -0,0 +1,104 @@
+import statistics
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+from rest_framework.renderers import JSONRenderer
+
+from credit.models import Customer, Loan
+from credit.renderers import FastJSONRenderer
+from credit.serializers import LoanDetailSerializer, LoanListItemSerializer
+
+
+def active_loans(customer_id):
+    return Loan.objects.filter(
+        customer_id=customer_id, is_approved=True, emis_paid_on_time__lt=F('tenure') - F('emis_paid_late')
+    ).order_by('id')
+
+
+def drf_loan_list(customer_id):
+    # Model instances through LoanListItemSerializer and JSONRenderer, as view-loans did before.
+    return JSONRenderer().render(LoanListItemSerializer(active_loans(customer_id), many=True).data)
+
+
+def fast_loan_list(customer_id):
+    rows = LoanListItemSerializer.values_queryset(active_loans(customer_id))
+    return FastJSONRenderer().render(LoanListItemSerializer.values_data(rows))
+
+
+def drf_loan_details(customer_id):
+    loans = Loan.objects.select_related('customer').filter(customer_id=customer_id).order_by('id')
+    return JSONRenderer().render(LoanDetailSerializer(loans, many=True).data)
+
+
+def fast_loan_details(customer_id):
+    rows = LoanDetailSerializer.values_queryset(Loan.objects.filter(customer_id=customer_id).order_by('id'))
+    return FastJSONRenderer().render(LoanDetailSerializer.values_data(rows))
+
+
+class Command(BaseCommand):
+    help = ('Compare per-item CPU time of the DRF serializers with the values() and orjson fast path used by '
+            'view-loans and view-loan, and check that both produce the same bytes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10, 1000, 10000],
+                            help='Loans per customer to serialize.')
+        parser.add_argument('--repeat', type=int, default=10)
+
+    def handle(self, *args, **options):
+        # Seed inside a transaction that is always rolled back, like bench_scoring.
+        with transaction.atomic():
+            results = [self.run_size(size, options['repeat']) for size in options['sizes']]
+            transaction.set_rollback(True)
+
+        mismatches = []
+        self.stdout.write(f"{'loans':>8} {'shape':>7} {'drf us/item':>12} {'fast us/item':>13} {'speedup':>8}  bytes")
+        for size, rows in results:
+            for shape, drf_us, fast_us, identical in rows:
+                self.stdout.write(
+                    f"{size:>8} {shape:>7} {drf_us:>12.2f} {fast_us:>13.2f} {drf_us / max(fast_us, 1e-9):>7.1f}x  "
+                    f"{'identical' if identical else 'DIFFERENT'}"
+                )
+                if not identical:
+                    mismatches.append(f'{shape} x {size}')
+        if mismatches:
+            raise CommandError(f"Fast path output differs from the DRF serializers: {', '.join(mismatches)}")
+
+    def run_size(self, size, repeat):
+        customer = Customer.objects.create(
+            first_name='Bench', last_name=str(size), phone_number=f'bench-ser-{size}',
+            monthly_salary=100000, approved_limit=3600000, age=35,
+        )
+        today = date.today()
+        Loan.objects.bulk_create(
+            [
+                Loan(
+                    customer=customer,
+                    loan_amount=10000 + i * 1.25,
+                    tenure=12,
+                    interest_rate=10.5,
+                    monthly_repayment=900.0 + i / 3,
+                    emis_paid_on_time=i % 12,
+                    start_date=today - timedelta(days=i % 1500),
+                    end_date=today + timedelta(days=365),
+                    is_approved=True,
+                )
+                for i in range(size)
+            ],
+            batch_size=2000,
+        )
+        rows = []
+        for shape, drf, fast in (('list', drf_loan_list, fast_loan_list), ('detail', drf_loan_details, fast_loan_details)):
+            timings = {drf: [], fast: []}
+            bodies = {}
+            for _ in range(repeat):
+                for func in (drf, fast):
+                    started = time.perf_counter()
+                    bodies[func] = func(customer.id)
+                    timings[func].append((time.perf_counter() - started) * 1e6 / size)
+            rows.append((
+                shape, statistics.median(timings[drf]), statistics.median(timings[fast]), bodies[drf] == bodies[fast]
+            ))
+        return size, rows
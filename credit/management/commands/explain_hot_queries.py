@@ -0,0 +1,137 @@
+import re
+import statistics
+import time
+from datetime import date, timedelta
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import F
+
+from credit.models import Customer, CustomerCreditProfile, Loan
+from credit.profiles import refresh_profiles
+from credit.scoring import credit_input_annotations
+
+EXECUTION_TIME = re.compile(r'Execution Time: ([\d.]+) ms')
+
+
+def hot_queries(customer_id, loan_id, today):
+    """The loan-table queries on the request path, keyed by name."""
+    return {
+        'view-loans': Loan.objects.filter(
+            customer_id=customer_id, is_approved=True, emis_paid_on_time__lt=F('tenure') - F('emis_paid_late')
+        ).order_by('id'),
+        'credit-inputs': Customer.objects.filter(id=customer_id).annotate(**credit_input_annotations(today)),
+        'current-loans': Loan.objects.filter(customer_id=customer_id, end_date__gte=today),
+        'activity-this-year': Loan.objects.filter(customer_id=customer_id, start_date__year=today.year),
+        'matured-since': Loan.objects.filter(end_date__lt=today, end_date__gte=today - timedelta(days=1)),
+        'profile': Customer.objects.select_related('credit_profile').filter(id=customer_id),
+        'loan-detail': Loan.objects.select_related('customer').filter(id=loan_id),
+    }
+
+
+def sequential_scans(plan):
+    """Lines of a query plan that read the whole loan table."""
+    if connection.vendor == 'postgresql':
+        pattern = re.compile(r'Seq Scan on credit_loan\b')
+    else:
+        pattern = re.compile(r'\bSCAN credit_loan\b')
+    return [line.strip() for line in plan.splitlines() if pattern.search(line)]
+
+
+class Command(BaseCommand):
+    help = ('Seed a large loan book, EXPLAIN the hot queries and fail when one of them '
+            'scans the whole loan table or exceeds the latency budget.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=2000)
+        parser.add_argument('--loans-per-customer', type=int, default=50)
+        parser.add_argument('--budget-ms', type=float, default=50.0,
+                            help='Maximum median execution time per query.')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every query plan.')
+
+    def handle(self, *args, **options):
+        # Seed inside a transaction that is always rolled back, like bench_scoring.
+        with transaction.atomic():
+            customer_id, loan_id = self.seed(options['customers'], options['loans_per_customer'])
+            results = [
+                self.explain_query(name, queryset, options)
+                for name, queryset in hot_queries(customer_id, loan_id, date.today()).items()
+            ]
+            transaction.set_rollback(True)
+
+        failures = []
+        self.stdout.write(f"{'query':>20} {'median ms':>10}  plan")
+        for name, median_ms, scans in results:
+            verdict = 'SEQ SCAN' if scans else 'index'
+            self.stdout.write(f"{name:>20} {median_ms:>10.3f}  {verdict}")
+            if scans:
+                failures.append(f"{name} scans the loan table: {'; '.join(scans)}")
+            if median_ms > options['budget_ms']:
+                failures.append(f"{name} took {median_ms:.3f} ms (budget {options['budget_ms']} ms)")
+        if failures:
+            raise CommandError('\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('All hot queries use indexes and are within budget.'))
+
+    def seed(self, customers, loans_per_customer):
+        rng = np.random.default_rng(0)
+        created = Customer.objects.bulk_create(
+            [
+                Customer(
+                    first_name='Explain', last_name=str(i), phone_number=f'explain-{i}',
+                    monthly_salary=50000, approved_limit=1800000, age=35,
+                )
+                for i in range(customers)
+            ],
+            batch_size=2000,
+        )
+        if not created or created[0].pk is None:
+            created = list(Customer.objects.filter(phone_number__startswith='explain-').order_by('id'))
+        today = date.today()
+        total = customers * loans_per_customer
+        tenure = rng.integers(6, 121, total)
+        paid = (tenure * rng.random(total)).astype(int)
+        # Roughly a fifth of the book is fully repaid, like the sample workbooks.
+        paid = np.where(rng.random(total) < 0.2, tenure, paid)
+        start_offset = rng.integers(0, 3650, total)
+        loans = []
+        for i in range(total):
+            start = today - timedelta(days=int(start_offset[i]))
+            loans.append(Loan(
+                customer_id=created[i // loans_per_customer].pk,
+                loan_amount=float(rng.integers(10000, 1000000)),
+                tenure=int(tenure[i]),
+                interest_rate=10.0,
+                monthly_repayment=1000.0,
+                emis_paid_on_time=int(paid[i]),
+                start_date=start,
+                end_date=start + timedelta(days=int(tenure[i]) * 30),
+                is_approved=bool(i % 10),
+            ))
+        Loan.objects.bulk_create(loans, batch_size=5000)
+        refresh_profiles([customer.pk for customer in created], today)
+        with connection.cursor() as cursor:
+            for model in (Customer, Loan, CustomerCreditProfile):
+                cursor.execute(f'ANALYZE {model._meta.db_table}')
+        customer_id = created[len(created) // 2].pk
+        return customer_id, Loan.objects.filter(customer_id=customer_id).values_list('id', flat=True).first()
+
+    def explain_query(self, name, queryset, options):
+        analyze = connection.vendor == 'postgresql'
+        timings = []
+        plan = ''
+        for _ in range(options['repeat']):
+            started = time.perf_counter()
+            plan = queryset.explain(analyze=True) if analyze else queryset.explain()
+            elapsed = (time.perf_counter() - started) * 1000
+            if not analyze:
+                # SQLite and others cannot EXPLAIN ANALYZE, so time the query itself.
+                started = time.perf_counter()
+                list(queryset.all())
+                elapsed = (time.perf_counter() - started) * 1000
+            match = EXECUTION_TIME.search(plan)
+            timings.append(float(match.group(1)) if match else elapsed)
+        if options['verbose_plans']:
+            self.stdout.write(f'-- {name}\n{plan}')
+        return name, statistics.median(timings), sequential_scans(plan)
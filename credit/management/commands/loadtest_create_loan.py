@@ -0,0 +1,87 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+
+from credit import finance
+from credit.benchmarking import latency_summary, run_concurrently
+from credit.models import Customer, Loan, LoanRequest
+from credit.policy import active_policy
+
+
+class Command(BaseCommand):
+    help = 'Fire parallel create-loan requests for one customer and verify no credit was double-booked.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument('--concurrency', type=int, default=10)
+        parser.add_argument('--mode', choices=['sync', 'async'], default='async',
+                            help='async sends an Idempotency-Key and waits for the Celery workers to decide.')
+        parser.add_argument('--loan-amount', type=float, default=120000)
+        parser.add_argument('--tenure', type=int, default=12)
+        parser.add_argument('--monthly-salary', type=int, default=100000)
+        parser.add_argument('--timeout', type=float, default=120, help='Seconds to wait for async decisions.')
+        parser.add_argument('--keep', action='store_true', help='Keep the load-test customer and its loans.')
+
+    def handle(self, *args, **options):
+        salary = options['monthly_salary']
+        customer = Customer.objects.create(
+            first_name='Load', last_name='Test', phone_number=f'lt-{uuid.uuid4().hex[:12]}',
+            monthly_salary=salary, approved_limit=finance.approved_limit(salary), age=30,
+        )
+        payload = {
+            'customer_id': customer.id,
+            'loan_amount': options['loan_amount'],
+            'interest_rate': 14.0,
+            'tenure': options['tenure'],
+        }
+        run_id = uuid.uuid4().hex
+
+        def create(index):
+            headers = {'HTTP_IDEMPOTENCY_KEY': f'{run_id}-{index}'} if options['mode'] == 'async' else {}
+            response = Client(HTTP_HOST='localhost').post(
+                reverse('create-loan'), payload, content_type='application/json', **headers
+            )
+            if response.status_code not in (200, 202):
+                raise CommandError(f'create-loan returned {response.status_code}: {response.content[:200]!r}')
+            return response.json()
+
+        try:
+            _, latencies, elapsed = run_concurrently(create, range(options['requests']), options['concurrency'])
+            summary = latency_summary(latencies, elapsed)
+            self.stdout.write(
+                f"{options['mode']}: {summary['requests']} requests at concurrency {options['concurrency']}: "
+                f"{summary['throughput_rps']:.1f} req/s, p50 {summary['p50_ms']:.1f} ms, p99 {summary['p99_ms']:.1f} ms"
+            )
+            if options['mode'] == 'async':
+                self.wait_for_decisions(customer, options['timeout'])
+            self.verify(customer)
+        finally:
+            if not options['keep']:
+                customer.delete()
+
+    def wait_for_decisions(self, customer, timeout):
+        deadline = time.monotonic() + timeout
+        pending = customer.loan_requests.filter(status=LoanRequest.STATUS_PENDING)
+        while pending.exists():
+            if time.monotonic() > deadline:
+                raise CommandError(f'{pending.count()} loan requests still pending after {timeout}s; are workers running?')
+            time.sleep(0.2)
+
+    def verify(self, customer):
+        # Replay the approved loans in booking order: each one must have passed
+        # the EMI/salary cap given the loans booked before it.
+        booked_emi = 0.0
+        violations = 0
+        cap = active_policy().emi_salary_cap
+        loans = Loan.objects.filter(customer=customer).order_by('id')
+        for loan in loans:
+            if booked_emi + loan.loan_amount / loan.tenure > cap * customer.monthly_salary:
+                violations += 1
+            booked_emi += loan.monthly_repayment
+        self.stdout.write(f'{loans.count()} loans booked, total EMI {booked_emi:.2f} of salary {customer.monthly_salary}.')
+        if violations:
+            raise CommandError(f'{violations} loans were booked past the EMI cap: concurrent creates double-booked credit.')
+        self.stdout.write(self.style.SUCCESS('No double-booking detected.'))
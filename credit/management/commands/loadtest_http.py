@@ -0,0 +1,95 @@
+import json
+import random
+import urllib.error
+import urllib.request
+
+from django.core.management.base import BaseCommand, CommandError
+
+from credit.benchmarking import latency_summary, run_concurrently
+from credit.models import Customer, Loan
+
+ENDPOINTS = ('check-eligibility', 'view-loan', 'view-loans')
+
+
+class Command(BaseCommand):
+    help = ('Load-test the read and scoring endpoints over HTTP at a fixed concurrency and compare deployments, '
+            'e.g. the sync gunicorn web service against the uvicorn-worker web-async service.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', action='append', required=True, metavar='NAME=URL',
+                            help='Deployment to test, e.g. sync=http://web:8000; repeat to compare.')
+        parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=list(ENDPOINTS))
+        parser.add_argument('--requests', type=int, default=1000, help='Requests per endpoint and target.')
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--timeout', type=float, default=30)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+
+    def handle(self, *args, **options):
+        targets = []
+        for target in options['target']:
+            name, sep, url = target.partition('=')
+            if not sep or not url:
+                raise CommandError(f'--target must look like NAME=URL, got {target!r}')
+            targets.append((name, url.rstrip('/')))
+
+        rng = random.Random(options['seed'])
+        customer_ids = list(Customer.objects.values_list('id', flat=True)[:10000])
+        loan_ids = list(Loan.objects.values_list('id', flat=True)[:10000])
+        if not customer_ids or not loan_ids:
+            raise CommandError('Load some customers and loans first (e.g. ingest_excel).')
+        # The same request mix is replayed against every target.
+        jobs = {
+            endpoint: [self.build_request(endpoint, rng, customer_ids, loan_ids) for _ in range(options['requests'])]
+            for endpoint in options['endpoints']
+        }
+
+        results = []
+        for name, base_url in targets:
+            for endpoint, requests in jobs.items():
+                def send(job):
+                    return self.send(base_url, job, options['timeout'])
+
+                statuses, latencies, elapsed = run_concurrently(send, requests, options['concurrency'])
+                summary = latency_summary(latencies, elapsed)
+                summary.update(target=name, endpoint=endpoint, concurrency=options['concurrency'],
+                               errors=sum(1 for code in statuses if code is None or code >= 500))
+                results.append(summary)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(f"{'target':>10} {'endpoint':>18} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+        for row in results:
+            self.stdout.write(
+                f"{row['target']:>10} {row['endpoint']:>18} {row['throughput_rps']:>9.1f} "
+                f"{row['p50_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['errors']:>7}"
+            )
+
+    def build_request(self, endpoint, rng, customer_ids, loan_ids):
+        if endpoint == 'check-eligibility':
+            body = {
+                'customer_id': rng.choice(customer_ids),
+                'loan_amount': rng.choice([50000, 100000, 250000, 500000]),
+                'interest_rate': rng.choice([8.0, 11.0, 14.0, 17.0]),
+                'tenure': rng.choice([6, 12, 24, 36]),
+            }
+            return 'POST', '/check-eligibility', json.dumps(body).encode()
+        if endpoint == 'view-loan':
+            return 'GET', f'/view-loan/{rng.choice(loan_ids)}', None
+        return 'GET', f'/view-loans/{rng.choice(customer_ids)}', None
+
+    def send(self, base_url, job, timeout):
+        method, path, body = job
+        request = urllib.request.Request(
+            base_url + path, data=body, method=method,
+            headers={'Content-Type': 'application/json', 'Accept': 'application/json'},
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as exc:
+            return exc.code
+        except (urllib.error.URLError, OSError):
+            return None
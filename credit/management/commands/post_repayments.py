@@ -0,0 +1,60 @@
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ParseError
+
+from credit.parsers import iter_csv_rows
+from credit.repayments import CHUNK_SIZE, post_repayments
+
+BLOCK_SIZE = 100000
+TOTALS = ('payments', 'posted', 'on_time', 'late', 'already_posted', 'failed')
+
+
+class Command(BaseCommand):
+    help = ('Post a bank file of EMI payments (CSV with reference, loan_id, amount and paid_on columns) to the '
+            'repayment ledger. Re-running a file only posts the payments not posted yet.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file with a header line.')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Payments per transaction.')
+        parser.add_argument('--block-size', type=int, default=BLOCK_SIZE,
+                            help='Rows read into memory at a time. Within a block, payments on the same loan are '
+                                 'applied in paid_on order; blocks are applied in file order.')
+        parser.add_argument('--show-failures', type=int, default=20, help='Failed rows to print.')
+
+    def handle(self, *args, **options):
+        totals = dict.fromkeys(TOTALS, 0)
+        seconds = 0.0
+        shown = 0
+        try:
+            with open(options['path'], 'rb') as handle:
+                rows = iter_csv_rows(handle)
+                offset = 0
+                while True:
+                    block = list(islice(rows, options['block_size']))
+                    if not block:
+                        break
+                    posted = post_repayments(block, options['chunk_size'])
+                    summary = posted['summary']
+                    for name in TOTALS:
+                        totals[name] += summary[name]
+                    seconds += summary['seconds']
+                    for result in posted['results']:
+                        if result['status'] >= 400 and shown < options['show_failures']:
+                            # +2: the header line and 1-based line numbers
+                            self.stdout.write(f"Line {offset + result['row'] + 2}: {result['status']} {result['errors']}")
+                            shown += 1
+                    offset += len(block)
+                    if options['verbosity'] >= 2:
+                        self.stdout.write(
+                            f"{offset} rows read, {totals['posted']} posted ({summary['payments_per_second']} payments/s)"
+                        )
+        except (OSError, ParseError) as exc:
+            raise CommandError(str(exc))
+
+        rate = totals['payments'] / seconds if seconds else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Posted {totals['posted']} payments ({totals['on_time']} on time, {totals['late']} late), "
+            f"{totals['already_posted']} already posted, {totals['failed']} failed, "
+            f"in {seconds:.2f}s ({rate:.0f} payments/s)."
+        ))
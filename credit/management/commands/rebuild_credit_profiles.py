@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from credit.profiles import find_profile_drift, refresh_profiles
+
+
+class Command(BaseCommand):
+    help = 'Rebuild every customer credit profile from the loan table, or check the stored profiles for drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Only compare stored profiles against the loan table; exit non-zero on drift.')
+
+    def handle(self, *args, **options):
+        if options['check']:
+            drift = find_profile_drift()
+            for customer_id, field, stored, expected in drift[:50]:
+                self.stdout.write(f'Customer {customer_id}: {field} is {stored}, expected {expected}')
+            if drift:
+                raise CommandError(f'{len(drift)} drifted profile fields found.')
+            self.stdout.write(self.style.SUCCESS('No credit profile drift found.'))
+            return
+        refreshed = refresh_profiles()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {refreshed} credit profiles.'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from credit import eligibility_cache
+from credit.profiles import find_debt_drift, refresh_profiles
+
+
+class Command(BaseCommand):
+    help = ("Compare every customer's current_debt, current_emi and debt_valid_until with the loan table and "
+            "repair the customers that drifted.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Only report drift; exit non-zero when any is found.')
+
+    def handle(self, *args, **options):
+        drift = find_debt_drift()
+        for customer_id, field, stored, expected in drift[:50]:
+            self.stdout.write(f'Customer {customer_id}: {field} is {stored}, expected {expected}')
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('No customer debt drift found.'))
+            return
+        if options['check']:
+            raise CommandError(f'{len(drift)} drifted customer debt fields found.')
+        customer_ids = sorted({customer_id for customer_id, *_ in drift})
+        refresh_profiles(customer_ids)
+        for customer_id in customer_ids:
+            eligibility_cache.invalidate_customer(customer_id)
+        self.stdout.write(self.style.SUCCESS(f'Repaired the debt fields of {len(customer_ids)} customers.'))
@@ -0,0 +1,90 @@
+import csv
+import json
+
+import numpy as np
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from credit.models import Customer, Loan
+from credit.policy import active_policy, load_policy
+from credit.profiles import load_profile_inputs_bulk
+from credit.scoring import input_columns
+
+POLICIES = ('current', 'candidate')
+
+
+class Command(BaseCommand):
+    help = ('Re-score the whole book under the active and a candidate credit policy: every approved loan is '
+            'decided again on its own terms against its customer\'s current credit profile. Reports approval '
+            'counts, mean scores and decisions that would flip.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--policy', required=True, help='Candidate policy file (same format as credit_policy.yaml).')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Customers scored per batch.')
+        parser.add_argument('--output', help='Write the loans whose decision flips to this CSV file.')
+
+    def handle(self, *args, **options):
+        try:
+            policies = {'current': active_policy(), 'candidate': load_policy(options['policy'])}
+        except ImproperlyConfigured as exc:
+            raise CommandError(str(exc))
+
+        summary = {
+            'loans': 0,
+            'current_version': policies['current'].version,
+            'candidate_version': policies['candidate'].version,
+            **{f'{name}_approved': 0 for name in POLICIES},
+            **{f'{name}_score_sum': 0.0 for name in POLICIES},
+            'newly_rejected': 0,
+            'newly_approved': 0,
+            'rate_changed': 0,
+        }
+        flips = []
+        customer_ids = list(Customer.objects.order_by('id').values_list('id', flat=True))
+        for start in range(0, len(customer_ids), options['chunk_size']):
+            self.score_chunk(customer_ids[start:start + options['chunk_size']], policies, summary, flips)
+
+        loans = summary['loans']
+        for name in POLICIES:
+            summary[f'{name}_mean_score'] = summary.pop(f'{name}_score_sum') / loans if loans else None
+        self.stdout.write(json.dumps(summary, indent=2))
+        if options['output']:
+            with open(options['output'], 'w', newline='') as handle:
+                writer = csv.writer(handle)
+                writer.writerow([
+                    'loan_id', 'customer_id', 'current_approval', 'candidate_approval', 'current_score',
+                    'candidate_score', 'current_rate', 'candidate_rate',
+                ])
+                writer.writerows(flips)
+
+    def score_chunk(self, customer_ids, policies, summary, flips):
+        inputs = load_profile_inputs_bulk(customer_ids)
+        rows = list(
+            Loan.objects.filter(customer_id__in=customer_ids, is_approved=True)
+            .values_list('id', 'customer_id', 'loan_amount', 'interest_rate', 'tenure')
+        )
+        if not rows:
+            return
+        loan_ids, owners, amounts, rates, tenures = (np.array(column) for column in zip(*rows))
+        columns = input_columns([inputs[owner] for owner in owners.tolist()])
+        decisions = {
+            name: policy.evaluate_batch(columns, amounts, rates, tenures) for name, policy in policies.items()
+        }
+        current, candidate = decisions['current'], decisions['candidate']
+
+        summary['loans'] += len(rows)
+        for name, decision in decisions.items():
+            summary[f'{name}_approved'] += int(decision['approval'].sum())
+            summary[f'{name}_score_sum'] += float(decision['credit_score'].sum())
+        summary['newly_rejected'] += int((current['approval'] & ~candidate['approval']).sum())
+        summary['newly_approved'] += int((~current['approval'] & candidate['approval']).sum())
+        summary['rate_changed'] += int(
+            (current['corrected_interest_rate'] != candidate['corrected_interest_rate']).sum()
+        )
+        for position in np.flatnonzero(current['approval'] != candidate['approval']):
+            flips.append([
+                int(loan_ids[position]), int(owners[position]),
+                bool(current['approval'][position]), bool(candidate['approval'][position]),
+                round(float(current['credit_score'][position]), 2), round(float(candidate['credit_score'][position]), 2),
+                float(current['corrected_interest_rate'][position]), float(candidate['corrected_interest_rate'][position]),
+            ])
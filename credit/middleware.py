@@ -0,0 +1,125 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+
+from . import db_router, instrumentation
+
+PRIMARY_COOKIE = 'db_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PROFILE_MODES = ('cprofile', 'pyinstrument')
+
+
+class ReplicaRoutingMiddleware:
+    """Serve views marked ``replica_reads = True`` from a read replica.
+
+    After a successful write (e.g. ``create-loan`` or ``customer/register``)
+    the client gets a short-lived cookie that keeps its requests on the
+    primary, so it always reads its own writes despite replication lag.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not db_router.replicas():
+            return self.get_response(request)
+        request.replica_reads_allowed = PRIMARY_COOKIE not in request.COOKIES
+        with db_router.replica_reads(False):
+            response = self.get_response(request)
+        return self.pin_after_write(request, response)
+
+    async def __acall__(self, request):
+        if not db_router.replicas():
+            return await self.get_response(request)
+        request.replica_reads_allowed = PRIMARY_COOKIE not in request.COOKIES
+        with db_router.replica_reads(False):
+            response = await self.get_response(request)
+        return self.pin_after_write(request, response)
+
+    def pin_after_write(self, request, response):
+        wrote = request.method not in SAFE_METHODS and not getattr(request, 'replica_view', False)
+        if wrote and response.status_code < 400:
+            response.set_cookie(
+                PRIMARY_COOKIE, '1', max_age=settings.DATABASE_REPLICA_STICKY_SECONDS, httponly=True, samesite='Lax'
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'view_class', view_func)
+        # Read-only POSTs such as check-eligibility must not pin the client to the primary.
+        request.replica_view = getattr(view_class, 'replica_reads', False)
+        if request.replica_view and getattr(request, 'replica_reads_allowed', False):
+            db_router.allow_replica_reads()
+        return None
+
+
+class InstrumentationMiddleware:
+    """Record latency, SQL queries, DB time and phase timings of every request for ``/metrics``.
+
+    With ``CREDIT_PROFILING_ENABLED`` on, a request sent with
+    ``X-Profile: cprofile`` (or ``pyinstrument``) is profiled and answered
+    with the profiler report instead of its normal body.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.CREDIT_METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        mode = self.profile_mode(request)
+        with instrumentation.collect() as stats:
+            if mode:
+                response, report = instrumentation.profile(mode, self.get_response, request)
+            else:
+                response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - started, stats)
+        if mode:
+            return HttpResponse(
+                report, content_type='text/plain; charset=utf-8', headers={'X-Profile-Status': str(response.status_code)}
+            )
+        return response
+
+    async def __acall__(self, request):
+        # Profiling is sync-only: the profilers would miss the async ORM's threads.
+        started = time.perf_counter()
+        with instrumentation.collect() as stats:
+            response = await self.get_response(request)
+        self.record(request, response, time.perf_counter() - started, stats)
+        return response
+
+    def process_template_response(self, request, response):
+        # Called right before DRF renders the response body.
+        started = time.perf_counter()
+        response.add_post_render_callback(
+            lambda rendered: instrumentation.add_phase_time('render', time.perf_counter() - started)
+        )
+        return response
+
+    def profile_mode(self, request):
+        mode = request.headers.get('X-Profile', '').lower()
+        if not settings.CREDIT_PROFILING_ENABLED or not mode:
+            return None
+        return mode if mode in PROFILE_MODES else 'cprofile'
+
+    def record(self, request, response, seconds, stats):
+        match = request.resolver_match
+        # Unresolved paths share one label so scanners cannot blow up the series count.
+        route = (match.url_name or match.route) if match else 'unmatched'
+        instrumentation.record_request(route, request.method, response.status_code, seconds, stats)
@@ -0,0 +1,29 @@
+# Generated by Django 4.2 on 2026-10-18 03:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('credit', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestionRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('customer_file', models.CharField(max_length=500)),
+                ('loan_file', models.CharField(max_length=500)),
+                ('chunk_size', models.PositiveIntegerField()),
+                ('status', models.CharField(choices=[('running', 'Running'), ('completed', 'Completed'), ('failed', 'Completed with failed shards')], default='running', max_length=20)),
+                ('customers_written', models.PositiveIntegerField(default=0)),
+                ('loans_written', models.PositiveIntegerField(default=0)),
+                ('failed_shards', models.JSONField(blank=True, default=list)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('duration_seconds', models.FloatField(blank=True, null=True)),
+            ],
+        ),
+    ]
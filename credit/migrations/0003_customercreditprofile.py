@@ -0,0 +1,28 @@
+# Generated by Django 4.2 on 2026-10-18 03:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('credit', '0002_ingestionrun'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerCreditProfile',
+            fields=[
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='credit_profile', serialize=False, to='credit.customer')),
+                ('num_loans', models.PositiveIntegerField(default=0)),
+                ('current_loans_sum', models.FloatField(default=0)),
+                ('total_current_emi', models.FloatField(default=0)),
+                ('loans_paid_on_time', models.PositiveIntegerField(default=0)),
+                ('loan_activity_this_year', models.PositiveIntegerField(default=0)),
+                ('loan_approved_volume', models.FloatField(default=0)),
+                ('as_of', models.DateField(help_text='Date the current-loan and current-year figures are valid for')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2 on 2026-10-18 03:11
+
+from django.db import migrations, models
+
+
+def clamp_end_dates(apps, schema_editor):
+    # Earlier ingestion could store end < start, e.g. a blank start date filled with today
+    Loan = apps.get_model('credit', 'Loan')
+    Loan.objects.filter(end_date__lt=models.F('start_date')).update(end_date=models.F('start_date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('credit', '0004_loanrequest'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customercreditprofile',
+            name='as_of',
+            field=models.DateField(db_index=True, help_text='Date the current-loan and current-year figures are valid for'),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(condition=models.Q(('is_approved', True), ('emis_paid_on_time__lt', models.F('tenure'))), fields=['customer', 'id'], name='loan_active_by_customer'),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['customer', 'end_date'], name='loan_customer_end_date'),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['customer', 'start_date'], name='loan_customer_start_date'),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['end_date'], name='loan_end_date'),
+        ),
+        migrations.AddConstraint(
+            model_name='loan',
+            constraint=models.CheckConstraint(check=models.Q(('tenure__gt', 0)), name='loan_tenure_positive'),
+        ),
+        migrations.RunPython(clamp_end_dates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='loan',
+            constraint=models.CheckConstraint(check=models.Q(('end_date__gte', models.F('start_date'))), name='loan_end_after_start'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-18 03:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('credit', '0005_loan_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='loan',
+            name='policy_version',
+            field=models.PositiveIntegerField(blank=True, help_text='Credit policy that approved the loan; empty for ingested loans', null=True),
+        ),
+        migrations.AddField(
+            model_name='loanrequest',
+            name='policy_version',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
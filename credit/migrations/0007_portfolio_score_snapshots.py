@@ -0,0 +1,52 @@
+# Generated by Django 4.2 on 2026-10-18 03:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('credit', '0006_policy_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PortfolioScoringRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('as_of', models.DateField(help_text="Date current loans and this year's activity were evaluated for")),
+                ('policy_version', models.PositiveIntegerField()),
+                ('chunk_size', models.PositiveIntegerField()),
+                ('status', models.CharField(choices=[('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='running', max_length=20)),
+                ('customers_scored', models.PositiveIntegerField(default=0)),
+                ('loans_scored', models.PositiveBigIntegerField(default=0)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('duration_seconds', models.FloatField(blank=True, null=True)),
+                ('loans_per_second', models.FloatField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CreditScoreSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scored_at', models.DateTimeField()),
+                ('credit_score', models.FloatField()),
+                ('emi_burden', models.FloatField(help_text='Current EMIs as a share of monthly salary')),
+                ('num_loans', models.PositiveIntegerField()),
+                ('current_loans_sum', models.FloatField()),
+                ('total_current_emi', models.FloatField()),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='score_snapshots', to='credit.customer')),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='credit.portfolioscoringrun')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='creditscoresnapshot',
+            index=models.Index(fields=['customer', 'scored_at'], name='snapshot_customer_scored_at'),
+        ),
+        migrations.AddConstraint(
+            model_name='creditscoresnapshot',
+            constraint=models.UniqueConstraint(fields=('run', 'customer'), name='snapshot_one_per_customer_per_run'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2 on 2026-10-18 03:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('credit', '0007_portfolio_score_snapshots'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestedRow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=20)),
+                ('row_id', models.BigIntegerField()),
+                ('row_hash', models.BigIntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='IngestionSource',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text='Kind, absolute path and optional ID range', max_length=600, unique=True)),
+                ('size', models.BigIntegerField(default=0)),
+                ('mtime_ns', models.BigIntegerField(default=0)),
+                ('fingerprint', models.CharField(blank=True, help_text='SHA-256 of the last fully ingested content', max_length=64)),
+                ('pending_fingerprint', models.CharField(blank=True, max_length=64)),
+                ('chunk_size', models.PositiveIntegerField(default=0)),
+                ('chunks_done', models.PositiveIntegerField(default=0)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='ingestedrow',
+            constraint=models.UniqueConstraint(fields=('kind', 'row_id'), name='ingested_row_kind_row_id'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.2 on 2026-10-18 03:43
+
+from datetime import date
+
+from django.db import migrations, models
+from django.db.models import FloatField, Min, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_current_debt(apps, schema_editor):
+    Customer = apps.get_model('credit', 'Customer')
+    Loan = apps.get_model('credit', 'Loan')
+    current = Loan.objects.filter(customer=OuterRef('pk'), end_date__gte=date.today()).order_by().values('customer')
+
+    def total(field):
+        return Coalesce(
+            Subquery(current.annotate(total=Sum(field)).values('total')), Value(0.0), output_field=FloatField()
+        )
+
+    Customer.objects.update(
+        current_debt=total('loan_amount'),
+        current_emi=total('monthly_repayment'),
+        debt_valid_until=Subquery(current.annotate(first=Min('end_date')).values('first')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('credit', '0008_ingestion_checkpoints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='current_emi',
+            field=models.FloatField(default=0, help_text='Sum of the monthly repayments of the current loans'),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='debt_valid_until',
+            field=models.DateField(blank=True, help_text='Earliest end date among the current loans; current_debt and current_emi are exact up to this day', null=True),
+        ),
+        migrations.AlterField(
+            model_name='customer',
+            name='current_debt',
+            field=models.FloatField(default=0, help_text="Sum of the customer's current loans (end date not passed)"),
+        ),
+        migrations.RunPython(populate_current_debt, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.2 on 2026-10-18 03:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('credit', '0010_version_stamps'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='archived_loan_volume',
+            field=models.FloatField(default=0, help_text="Sum of the amounts of this customer's archived loans"),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='archived_loans',
+            field=models.PositiveIntegerField(default=0, help_text="Number of this customer's archived loans"),
+        ),
+        migrations.AlterField(
+            model_name='loanrequest',
+            name='loan',
+            field=models.OneToOneField(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='request', to='credit.loan'),
+        ),
+        migrations.CreateModel(
+            name='LoanHistory',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('loan_amount', models.FloatField()),
+                ('tenure', models.PositiveIntegerField(help_text='Tenure in months')),
+                ('interest_rate', models.FloatField()),
+                ('monthly_repayment', models.FloatField()),
+                ('emis_paid_on_time', models.PositiveIntegerField()),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('is_approved', models.BooleanField()),
+                ('policy_version', models.PositiveIntegerField(blank=True, null=True)),
+                ('version', models.PositiveIntegerField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='loan_history', to='credit.customer')),
+            ],
+            options={
+                'verbose_name_plural': 'loan history',
+            },
+        ),
+    ]
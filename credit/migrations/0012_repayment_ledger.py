@@ -0,0 +1,54 @@
+# Generated by Django 4.2 on 2026-10-18 03:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.expressions
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('credit', '0011_loan_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Repayment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reference', models.CharField(help_text='Payment reference from the bank file', max_length=100, unique=True)),
+                ('installment', models.PositiveIntegerField(help_text='Number of the EMI this payment settled')),
+                ('amount', models.FloatField()),
+                ('paid_on', models.DateField()),
+                ('on_time', models.BooleanField(help_text="Paid by the installment's due date and covering the full EMI")),
+                ('posted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='loan',
+            name='loan_active_by_customer',
+        ),
+        migrations.AddField(
+            model_name='loan',
+            name='emis_paid_late',
+            field=models.PositiveIntegerField(default=0, help_text='EMIs posted through the repayment ledger after their due date or short of the full EMI'),
+        ),
+        migrations.AddField(
+            model_name='loanhistory',
+            name='emis_paid_late',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(condition=models.Q(('is_approved', True), ('emis_paid_on_time__lt', django.db.models.expressions.CombinedExpression(models.F('tenure'), '-', models.F('emis_paid_late')))), fields=['customer', 'id'], name='loan_active_by_customer'),
+        ),
+        migrations.AddField(
+            model_name='repayment',
+            name='loan',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='repayments', to='credit.loan'),
+        ),
+        migrations.AddConstraint(
+            model_name='repayment',
+            constraint=models.UniqueConstraint(fields=('loan', 'installment'), name='repayment_one_per_installment'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 04:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('credit', '0012_repayment_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingestionrun',
+            name='loan_shards',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 # Create your models here.
 
@@ -8,8 +9,20 @@ class Customer(models.Model):
     phone_number = models.CharField(max_length=15, unique=True)
     monthly_salary = models.PositiveIntegerField()
     approved_limit = models.PositiveIntegerField()
-    current_debt = models.PositiveIntegerField(default=0)
+    current_debt = models.FloatField(default=0, help_text="Sum of the customer's current loans (end date not passed)")
+    current_emi = models.FloatField(default=0, help_text="Sum of the monthly repayments of the current loans")
+    debt_valid_until = models.DateField(
+        null=True, blank=True,
+        help_text="Earliest end date among the current loans; current_debt and current_emi are exact up to this day",
+    )
     age = models.PositiveIntegerField()
+    # Contribution of the loans moved to LoanHistory, see credit.archival. All of
+    # them were fully repaid, so each also counts as a loan paid on time.
+    archived_loans = models.PositiveIntegerField(default=0, help_text="Number of this customer's archived loans")
+    archived_loan_volume = models.FloatField(default=0, help_text="Sum of the amounts of this customer's archived loans")
+    # Bumped by credit.conditional.touch_customers whenever the customer or any of its loans changes
+    version = models.PositiveIntegerField(default=1, help_text="ETag stamp of view-loans and, with the loan's, view-loan")
+    updated_at = models.DateTimeField(default=timezone.now)
 
     def __str__(self):
         return f"{self.first_name} {self.last_name} ({self.id})"
@@ -21,9 +34,225 @@ class Loan(models.Model):
     interest_rate = models.FloatField()
     monthly_repayment = models.FloatField()
     emis_paid_on_time = models.PositiveIntegerField(default=0)
+    emis_paid_late = models.PositiveIntegerField(
+        default=0, help_text="EMIs posted through the repayment ledger after their due date or short of the full EMI"
+    )
     start_date = models.DateField()
     end_date = models.DateField()
     is_approved = models.BooleanField(default=False)
+    policy_version = models.PositiveIntegerField(null=True, blank=True, help_text="Credit policy that approved the loan; empty for ingested loans")
+    # Bumped by credit.conditional.touch_loans whenever the loan changes
+    version = models.PositiveIntegerField(default=1, help_text="ETag stamp of view-loan")
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # view-loans: approved, not yet fully repaid loans of one customer, in id order
+            models.Index(
+                fields=['customer', 'id'],
+                condition=models.Q(is_approved=True) & models.Q(
+                    emis_paid_on_time__lt=models.F('tenure') - models.F('emis_paid_late')
+                ),
+                name='loan_active_by_customer',
+            ),
+            # Scoring: a customer's current loans (end_date >= today) and current-year activity
+            models.Index(fields=['customer', 'end_date'], name='loan_customer_end_date'),
+            models.Index(fields=['customer', 'start_date'], name='loan_customer_start_date'),
+            # Nightly roll-over: loans that matured since a given date
+            models.Index(fields=['end_date'], name='loan_end_date'),
+        ]
+        constraints = [
+            models.CheckConstraint(check=models.Q(tenure__gt=0), name='loan_tenure_positive'),
+            models.CheckConstraint(check=models.Q(end_date__gte=models.F('start_date')), name='loan_end_after_start'),
+        ]
+
+    def __str__(self):
+        return f"Loan {self.id} for Customer {self.customer_id}"
+
+class LoanHistory(models.Model):
+    """A closed loan moved out of ``Loan`` by ``credit.archival``; same ID and columns, no query indexes."""
+    id = models.BigIntegerField(primary_key=True)
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='loan_history')
+    loan_amount = models.FloatField()
+    tenure = models.PositiveIntegerField(help_text="Tenure in months")
+    interest_rate = models.FloatField()
+    monthly_repayment = models.FloatField()
+    emis_paid_on_time = models.PositiveIntegerField()
+    emis_paid_late = models.PositiveIntegerField(default=0)
+    start_date = models.DateField()
+    end_date = models.DateField()
+    is_approved = models.BooleanField()
+    policy_version = models.PositiveIntegerField(null=True, blank=True)
+    version = models.PositiveIntegerField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = 'loan history'
+
+    def __str__(self):
+        return f"Archived loan {self.id} for Customer {self.customer_id}"
+
+class Repayment(models.Model):
+    """One EMI payment posted through ``credit.repayments``; ``reference`` makes posting idempotent."""
+    reference = models.CharField(max_length=100, unique=True, help_text="Payment reference from the bank file")
+    # No database constraint: the loan may have been moved to LoanHistory by the archival job.
+    loan = models.ForeignKey(Loan, on_delete=models.DO_NOTHING, db_constraint=False, related_name='repayments')
+    installment = models.PositiveIntegerField(help_text="Number of the EMI this payment settled")
+    amount = models.FloatField()
+    paid_on = models.DateField()
+    on_time = models.BooleanField(help_text="Paid by the installment's due date and covering the full EMI")
+    posted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['loan', 'installment'], name='repayment_one_per_installment'),
+        ]
+
+    def __str__(self):
+        return f"Repayment {self.reference} of installment {self.installment} on Loan {self.loan_id}"
+
+class IngestionRun(models.Model):
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_COMPLETED, 'Completed'),
+        (STATUS_FAILED, 'Completed with failed shards'),
+    ]
+
+    customer_file = models.CharField(max_length=500)
+    loan_file = models.CharField(max_length=500)
+    chunk_size = models.PositiveIntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_RUNNING)
+    customers_written = models.PositiveIntegerField(default=0)
+    loans_written = models.PositiveIntegerField(default=0)
+    failed_shards = models.JSONField(default=list, blank=True)
+    # The planned loan shards, re-run in full when a customer retry writes customers
+    loan_shards = models.JSONField(default=list, blank=True)
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    duration_seconds = models.FloatField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Ingestion run {self.id} ({self.status})"
+
+class IngestionSource(models.Model):
+    """Fingerprint and checkpoint of one ingestion source (a file, or one ID-range shard of it)."""
+    key = models.CharField(max_length=600, unique=True, help_text="Kind, absolute path and optional ID range")
+    size = models.BigIntegerField(default=0)
+    mtime_ns = models.BigIntegerField(default=0)
+    fingerprint = models.CharField(max_length=64, blank=True, help_text="SHA-256 of the last fully ingested content")
+    # Checkpoint of the run in progress: chunks of pending_fingerprint already committed
+    pending_fingerprint = models.CharField(max_length=64, blank=True)
+    chunk_size = models.PositiveIntegerField(default=0)
+    chunks_done = models.PositiveIntegerField(default=0)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.key
+
+class IngestedRow(models.Model):
+    """Hash of the prepared source row last written for a customer or loan ID."""
+    kind = models.CharField(max_length=20)
+    row_id = models.BigIntegerField()
+    row_hash = models.BigIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'row_id'], name='ingested_row_kind_row_id'),
+        ]
+
+class CustomerCreditProfile(models.Model):
+    """Denormalized credit-score inputs, kept in step with the customer's loans."""
+    customer = models.OneToOneField(Customer, on_delete=models.CASCADE, primary_key=True, related_name='credit_profile')
+    num_loans = models.PositiveIntegerField(default=0)
+    current_loans_sum = models.FloatField(default=0)
+    total_current_emi = models.FloatField(default=0)
+    loans_paid_on_time = models.PositiveIntegerField(default=0)
+    loan_activity_this_year = models.PositiveIntegerField(default=0)
+    loan_approved_volume = models.FloatField(default=0)
+    as_of = models.DateField(help_text="Date the current-loan and current-year figures are valid for", db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Credit profile for Customer {self.customer_id}"
+
+class LoanRequest(models.Model):
+    STATUS_PENDING = 'pending'
+    STATUS_APPROVED = 'approved'
+    STATUS_REJECTED = 'rejected'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_APPROVED, 'Approved'),
+        (STATUS_REJECTED, 'Rejected'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    idempotency_key = models.CharField(max_length=255, unique=True)
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='loan_requests')
+    loan_amount = models.FloatField()
+    interest_rate = models.FloatField()
+    tenure = models.PositiveIntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    # No database constraint: the loan may have been moved to LoanHistory by the archival job.
+    loan = models.OneToOneField(
+        Loan, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='request'
+    )
+    message = models.CharField(max_length=255, blank=True)
+    monthly_installment = models.FloatField(null=True, blank=True)
+    policy_version = models.PositiveIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Loan request {self.id} ({self.status})"
+
+class PortfolioScoringRun(models.Model):
+    """One run of the nightly portfolio re-scoring job; its snapshots share ``started_at``."""
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_COMPLETED, 'Completed'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    as_of = models.DateField(help_text="Date current loans and this year's activity were evaluated for")
+    policy_version = models.PositiveIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_RUNNING)
+    customers_scored = models.PositiveIntegerField(default=0)
+    loans_scored = models.PositiveBigIntegerField(default=0)
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    duration_seconds = models.FloatField(null=True, blank=True)
+    loans_per_second = models.FloatField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Portfolio scoring run {self.id} ({self.status})"
+
+class CreditScoreSnapshot(models.Model):
+    run = models.ForeignKey(PortfolioScoringRun, on_delete=models.CASCADE, related_name='snapshots')
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='score_snapshots')
+    scored_at = models.DateTimeField()
+    credit_score = models.FloatField()
+    emi_burden = models.FloatField(help_text="Current EMIs as a share of monthly salary")
+    num_loans = models.PositiveIntegerField()
+    current_loans_sum = models.FloatField()
+    total_current_emi = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['run', 'customer'], name='snapshot_one_per_customer_per_run'),
+        ]
+        indexes = [
+            # Score history of one customer
+            models.Index(fields=['customer', 'scored_at'], name='snapshot_customer_scored_at'),
+        ]
 
     def __str__(self):
-        return f"Loan {self.id} for Customer {self.customer.id}"
+        return f"Score {self.credit_score:.1f} for Customer {self.customer_id} at {self.scored_at:%Y-%m-%d %H:%M}"
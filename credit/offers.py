@@ -0,0 +1,56 @@
+"""What-if loan offers: every approvable tenure and interest rate for one loan amount.
+
+The customer's credit inputs are loaded once and the whole tenure x rate grid
+is decided in one ``CreditPolicy.evaluate_batch`` call, so each offer passes
+exactly the band and EMI-cap rules of ``check-eligibility`` for that tenure
+and rate.
+"""
+import numpy as np
+
+from .policy import active_policy
+from .scoring import input_columns
+
+DEFAULT_TENURES = [6, 12, 18, 24, 36, 48, 60, 72, 84, 96, 120]
+# 8% to 24% in steps of 0.5%; the policy's band floors are exclusive, so 12.5 is the cheapest rate above 12
+DEFAULT_INTEREST_RATES = [rate / 2 for rate in range(16, 49)]
+RANKINGS = ['monthly_installment', 'total_interest']
+DEFAULT_LIMIT = 10
+
+
+def loan_offers(inputs, loan_amount, interest_rates=None, tenures=None, rank_by='monthly_installment',
+                limit=DEFAULT_LIMIT, policy=None):
+    """The best ``limit`` approvable offers for ``loan_amount``, ranked by ``rank_by``.
+
+    Ties are broken by the other ranking, then the shorter tenure and the
+    lower rate. Returns the offers with the customer's credit score, the
+    number of grid points evaluated and approvable, and the policy version.
+    """
+    policy = policy or active_policy()
+    rates = np.unique(np.asarray(DEFAULT_INTEREST_RATES if interest_rates is None else interest_rates, dtype=float))
+    terms = np.unique(np.asarray(DEFAULT_TENURES if tenures is None else tenures, dtype=float))
+    tenure, rate = (grid.ravel() for grid in np.meshgrid(terms, rates, indexing='ij'))
+
+    # The customer's one row of inputs broadcasts against the whole grid.
+    decisions = policy.evaluate_batch(input_columns([inputs]), loan_amount, rate, tenure)
+    approved = np.flatnonzero(decisions['approval'])
+    monthly_installment = decisions['monthly_installment'][approved]
+    total_interest = monthly_installment * tenure[approved] - loan_amount
+    keys = {'monthly_installment': monthly_installment, 'total_interest': total_interest}
+    secondary = RANKINGS[1 - RANKINGS.index(rank_by)]
+    order = np.lexsort((rate[approved], tenure[approved], keys[secondary], keys[rank_by]))[:limit]
+
+    return {
+        'credit_score': float(decisions['credit_score'][0]),
+        'evaluated': int(tenure.size),
+        'approvable': int(approved.size),
+        'policy_version': decisions['policy_version'],
+        'offers': [
+            {
+                'tenure': int(tenure[approved[i]]),
+                'interest_rate': float(rate[approved[i]]),
+                'monthly_installment': round(float(monthly_installment[i]), 2),
+                'total_interest': round(float(total_interest[i]), 2),
+            }
+            for i in order
+        ],
+    }
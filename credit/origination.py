@@ -0,0 +1,92 @@
+import logging
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import conditional, eligibility_cache, finance, instrumentation
+from .models import Customer, Loan, LoanRequest
+from .profiles import apply_new_loan, load_profile_inputs
+from .scoring import evaluate_eligibility
+
+logger = logging.getLogger(__name__)
+
+
+def originate_loan(customer_id, loan_amount, interest_rate, tenure):
+    """Score and, when approved, book a loan while holding the customer's row lock.
+
+    Concurrent originations for the same customer are serialized, so two
+    requests can never both pass the EMI/salary check against the same
+    existing EMIs. Returns ``(decision, loan)``, with ``loan`` None when
+    rejected. Raises ``Customer.DoesNotExist`` for unknown customers.
+    """
+    with transaction.atomic():
+        Customer.objects.select_for_update().only('id').get(id=customer_id)
+        customer, inputs = load_profile_inputs(customer_id)
+        with instrumentation.timed('scoring'):
+            decision = evaluate_eligibility(inputs, loan_amount, interest_rate, tenure)
+        if not decision.approval:
+            return decision, None
+        today = datetime.now().date()
+        loan = Loan.objects.create(
+            customer=customer,
+            loan_amount=loan_amount,
+            tenure=tenure,
+            interest_rate=interest_rate,
+            monthly_repayment=decision.monthly_installment,
+            emis_paid_on_time=0,
+            start_date=today,
+            end_date=finance.add_months(today, tenure).item(),
+            is_approved=True,
+            policy_version=decision.policy_version,
+        )
+        apply_new_loan(loan, today)
+        conditional.touch_customers([customer.id])
+        eligibility_cache.invalidate_customer(customer.id)
+    return decision, loan
+
+
+def process_loan_request(loan_request_id):
+    """Decide a queued ``LoanRequest``; requests that already have an outcome are left alone."""
+    with transaction.atomic():
+        loan_request = LoanRequest.objects.select_for_update().get(id=loan_request_id)
+        if loan_request.status != LoanRequest.STATUS_PENDING:
+            return loan_request
+        try:
+            decision, loan = originate_loan(
+                loan_request.customer_id, loan_request.loan_amount, loan_request.interest_rate, loan_request.tenure
+            )
+        except Customer.DoesNotExist:
+            loan_request.status = LoanRequest.STATUS_FAILED
+            loan_request.message = 'Customer not found.'
+        except Exception:
+            # originate_loan's savepoint is rolled back; record the failure instead of leaving it pending.
+            logger.exception('Loan request %s could not be decided', loan_request_id)
+            loan_request.status = LoanRequest.STATUS_FAILED
+            loan_request.message = 'Loan request could not be decided.'
+        else:
+            loan_request.status = LoanRequest.STATUS_APPROVED if loan else LoanRequest.STATUS_REJECTED
+            loan_request.loan = loan
+            loan_request.message = decision.message
+            loan_request.monthly_installment = round(decision.monthly_installment, 2) if loan else None
+            loan_request.policy_version = decision.policy_version
+        loan_request.save()
+    return loan_request
+
+
+def claim_stale_requests(loan_request_ids=None):
+    """IDs of pending requests untouched for ``CREDIT_LOAN_REQUEST_REQUEUE_SECONDS``, to be queued again.
+
+    Their ``updated_at`` is bumped, so each is re-queued at most once per period.
+    """
+    now = timezone.now()
+    stale = LoanRequest.objects.filter(
+        status=LoanRequest.STATUS_PENDING,
+        updated_at__lt=now - timedelta(seconds=settings.CREDIT_LOAN_REQUEST_REQUEUE_SECONDS),
+    )
+    if loan_request_ids is not None:
+        stale = stale.filter(id__in=loan_request_ids)
+    loan_request_ids = list(stale.values_list('id', flat=True))
+    stale.filter(id__in=loan_request_ids).update(updated_at=now)
+    return loan_request_ids
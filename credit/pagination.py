@@ -0,0 +1,69 @@
+from rest_framework.exceptions import ValidationError
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination:
+    """Keyset ("seek") pagination over a queryset ordered by ``id``.
+
+    The response body stays a plain list; the cursor for the next page is
+    returned in the ``Link`` and ``X-Next-Cursor`` headers. Each page is a
+    ``WHERE id > cursor ORDER BY id LIMIT n`` range read, so the cost of a
+    page does not grow with how deep into the list the client is.
+    """
+    cursor_query_param = 'cursor'
+    limit_query_param = 'limit'
+    default_limit = 100
+    max_limit = 1000
+
+    def paginate_queryset(self, queryset, request):
+        return self._finish_page(list(self._page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request):
+        return self._finish_page([obj async for obj in self._page_queryset(queryset, request)])
+
+    def _page_queryset(self, queryset, request):
+        self.request = request
+        cursor = self._positive_int(self.cursor_query_param, 0)
+        self.limit = min(self._positive_int(self.limit_query_param, self.default_limit), self.max_limit)
+        if cursor:
+            queryset = queryset.filter(id__gt=cursor)
+        # Fetch one extra row to know whether there is a next page without a COUNT.
+        return queryset.order_by('id')[:self.limit + 1]
+
+    def _finish_page(self, page):
+        self.has_next = len(page) > self.limit
+        page = page[:self.limit]
+        if self.has_next:
+            # Pages are model instances or values() rows
+            self.next_cursor = page[-1]['id'] if isinstance(page[-1], dict) else page[-1].id
+        else:
+            self.next_cursor = None
+        return page
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.cursor_query_param, self.next_cursor)
+        return replace_query_param(url, self.limit_query_param, self.limit)
+
+    def get_paginated_headers(self):
+        if self.next_cursor is None:
+            return {}
+        return {
+            'Link': f'<{self.get_next_link()}>; rel="next"',
+            'X-Next-Cursor': str(self.next_cursor),
+        }
+
+    def _positive_int(self, name, default):
+        # Works for DRF requests and the plain Django requests of the async views.
+        raw = getattr(self.request, 'query_params', self.request.GET).get(name)
+        if raw in (None, ''):
+            return default
+        try:
+            value = int(raw)
+        except ValueError:
+            raise ValidationError({name: 'Must be an integer.'})
+        if value < 0 or (value == 0 and name == self.limit_query_param):
+            raise ValidationError({name: 'Must be a positive integer.'})
+        return value
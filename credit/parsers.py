@@ -0,0 +1,30 @@
+import codecs
+import csv
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+def iter_csv_rows(stream, encoding='utf-8'):
+    """Rows of a binary CSV stream with a header line, as dicts; blank cells are left out."""
+    # utf-8-sig also drops the byte-order mark spreadsheet exports start with.
+    if codecs.lookup(encoding).name == 'utf-8':
+        encoding = 'utf-8-sig'
+    try:
+        for row in csv.DictReader(codecs.iterdecode(stream, encoding)):
+            yield {key: value for key, value in row.items() if key and value not in (None, '')}
+    except (csv.Error, UnicodeDecodeError) as exc:
+        raise ParseError(f'CSV parse error - {exc}')
+
+
+def read_csv_rows(stream, encoding='utf-8'):
+    """``iter_csv_rows`` as a list."""
+    return list(iter_csv_rows(stream, encoding))
+
+
+class CSVParser(BaseParser):
+    """``text/csv`` request bodies, parsed into a list of dicts keyed by the header line."""
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return read_csv_rows(stream, (parser_context or {}).get('encoding') or 'utf-8')
@@ -0,0 +1,255 @@
+"""Versioned credit policy: score weights, approval bands, rate floors and the EMI cap.
+
+The policy is a YAML file (``CREDIT_POLICY_PATH``) compiled into an immutable
+``CreditPolicy`` once per process. ``active_policy()`` re-stats the file at
+most every ``CREDIT_POLICY_CHECK_SECONDS`` and swaps in the new policy when
+its ``version`` changes, so a policy roll-out needs no restart. Every
+``Decision`` carries the version that produced it.
+"""
+import bisect
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import yaml
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from .finance import emi
+
+APPROVED = "Loan approved successfully."
+REJECTED_EMI_CAP = "Loan not approved: EMI exceeds {cap:.0%} of monthly salary."
+REJECTED_RATE_TOO_LOW = "Loan not approved: interest rate too low for credit score."
+REJECTED_LOW_SCORE = "Loan not approved due to low credit score."
+
+SCORE_FIELDS = (
+    'base', 'per_loan', 'per_loan_paid_on_time', 'activity_per_loan', 'activity_cap', 'volume_unit', 'volume_cap',
+    'min', 'max',
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Decision:
+    approval: bool
+    corrected_interest_rate: float
+    monthly_installment: float
+    credit_score: float
+    message: str
+    policy_version: int
+
+
+@dataclass(frozen=True)
+class CreditPolicy:
+    version: int
+    base: float
+    per_loan: float
+    per_loan_paid_on_time: float
+    activity_per_loan: float
+    activity_cap: float
+    volume_unit: float
+    volume_cap: float
+    min_score: float
+    max_score: float
+    emi_salary_cap: float
+    rejection_floor_rate: float
+    # Band thresholds in ascending order; a score above thresholds[i] (and no
+    # higher threshold) falls into band i. min_rates[i] is None for "any rate".
+    thresholds: tuple
+    min_rates: tuple
+
+    @classmethod
+    def compile(cls, definition):
+        """Validate a parsed policy definition and build the decision table from it."""
+        def number(value, name, positive=False):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ImproperlyConfigured(f'Credit policy: {name} must be a number, got {value!r}.')
+            if positive and value <= 0:
+                raise ImproperlyConfigured(f'Credit policy: {name} must be positive.')
+            return float(value)
+
+        if not isinstance(definition, dict):
+            raise ImproperlyConfigured('Credit policy: expected a mapping at the top level.')
+        version = definition.get('version')
+        if isinstance(version, bool) or not isinstance(version, int) or version < 1:
+            raise ImproperlyConfigured(f'Credit policy: version must be a positive integer, got {version!r}.')
+        score = definition.get('score') or {}
+        missing = [name for name in SCORE_FIELDS if name not in score]
+        if missing:
+            raise ImproperlyConfigured(f'Credit policy v{version}: score is missing {", ".join(missing)}.')
+        weights = {name: number(score[name], f'score.{name}') for name in SCORE_FIELDS}
+        number(weights['volume_unit'], 'score.volume_unit', positive=True)
+
+        bands = definition.get('bands')
+        if not isinstance(bands, list) or not bands:
+            raise ImproperlyConfigured(f'Credit policy v{version}: bands must be a non-empty list.')
+        table = {}
+        for band in bands:
+            threshold = number((band or {}).get('min_score'), 'bands[].min_score')
+            if threshold in table:
+                raise ImproperlyConfigured(f'Credit policy v{version}: two bands start at score {threshold:g}.')
+            min_rate = band.get('min_rate')
+            table[threshold] = None if min_rate is None else number(min_rate, 'bands[].min_rate')
+        thresholds = tuple(sorted(table))
+
+        return cls(
+            version=version,
+            base=weights['base'],
+            per_loan=weights['per_loan'],
+            per_loan_paid_on_time=weights['per_loan_paid_on_time'],
+            activity_per_loan=weights['activity_per_loan'],
+            activity_cap=weights['activity_cap'],
+            volume_unit=weights['volume_unit'],
+            volume_cap=weights['volume_cap'],
+            min_score=weights['min'],
+            max_score=weights['max'],
+            emi_salary_cap=number(definition.get('emi_salary_cap'), 'emi_salary_cap', positive=True),
+            rejection_floor_rate=number(definition.get('rejection_floor_rate'), 'rejection_floor_rate'),
+            thresholds=thresholds,
+            min_rates=tuple(table[threshold] for threshold in thresholds),
+        )
+
+    def credit_score(self, inputs):
+        # Borrowing past the approved limit zeroes the score
+        if inputs.current_loans_sum > inputs.approved_limit:
+            return self.min_score
+        score = (
+            self.base
+            + inputs.num_loans * self.per_loan
+            + inputs.loans_paid_on_time * self.per_loan_paid_on_time
+            + min(inputs.loan_activity_this_year * self.activity_per_loan, self.activity_cap)
+            + min(inputs.loan_approved_volume / self.volume_unit, self.volume_cap)
+        )
+        return max(self.min_score, min(score, self.max_score))
+
+    def credit_scores(self, columns):
+        """Vectorized ``credit_score`` over a mapping of credit-input name to array."""
+        score = (
+            self.base
+            + columns['num_loans'] * self.per_loan
+            + columns['loans_paid_on_time'] * self.per_loan_paid_on_time
+            + np.minimum(columns['loan_activity_this_year'] * self.activity_per_loan, self.activity_cap)
+            + np.minimum(columns['loan_approved_volume'] / self.volume_unit, self.volume_cap)
+        )
+        score = np.clip(score, self.min_score, self.max_score)
+        return np.where(columns['current_loans_sum'] > columns['approved_limit'], self.min_score, score)
+
+    def evaluate(self, inputs, loan_amount, interest_rate, tenure):
+        score = self.credit_score(inputs)
+        band = bisect.bisect_left(self.thresholds, score) - 1
+        if inputs.total_current_emi + (loan_amount / tenure) > self.emi_salary_cap * inputs.monthly_salary:
+            approval = False
+            corrected_interest_rate = max(interest_rate, self.rejection_floor_rate)
+            message = REJECTED_EMI_CAP.format(cap=self.emi_salary_cap)
+        elif band < 0:
+            approval = False
+            corrected_interest_rate = max(interest_rate, self.rejection_floor_rate)
+            message = REJECTED_LOW_SCORE
+        else:
+            min_rate = self.min_rates[band]
+            approval = min_rate is None or interest_rate > min_rate
+            corrected_interest_rate = interest_rate if approval else min_rate
+            message = APPROVED if approval else REJECTED_RATE_TOO_LOW
+        return Decision(
+            approval=approval,
+            corrected_interest_rate=corrected_interest_rate,
+            monthly_installment=emi(loan_amount, corrected_interest_rate, tenure),
+            credit_score=score,
+            message=message,
+            policy_version=self.version,
+        )
+
+    def evaluate_batch(self, columns, loan_amount, interest_rate, tenure):
+        """Vectorized ``evaluate`` over ``columns``, a mapping of credit-input name to array."""
+        loan_amount = np.asarray(loan_amount, dtype=float)
+        interest_rate = np.asarray(interest_rate, dtype=float)
+        tenure = np.asarray(tenure, dtype=float)
+
+        score = self.credit_scores(columns)
+        over_cap = columns['total_current_emi'] + loan_amount / tenure > self.emi_salary_cap * columns['monthly_salary']
+        band = np.searchsorted(np.asarray(self.thresholds), score, side='left') - 1
+        rejected = band < 0
+        # "Any rate" bands get a floor of -inf, so every rate clears them.
+        floors = np.array([-np.inf if rate is None else rate for rate in self.min_rates])
+        floor = floors[np.maximum(band, 0)]
+
+        rate_ok = interest_rate > floor
+        approval = ~over_cap & ~rejected & rate_ok
+        corrected = np.where(~over_cap & ~rejected & ~rate_ok, floor, interest_rate)
+        corrected = np.where(over_cap | rejected, np.maximum(interest_rate, self.rejection_floor_rate), corrected)
+
+        return {
+            'approval': approval,
+            'corrected_interest_rate': corrected,
+            'monthly_installment': emi(loan_amount, corrected, tenure),
+            'credit_score': score,
+            'policy_version': self.version,
+        }
+
+
+def load_policy(path):
+    """Read and compile a policy file; raises ``ImproperlyConfigured`` when it is missing or invalid."""
+    try:
+        with open(path) as handle:
+            definition = yaml.safe_load(handle)
+    except (OSError, yaml.YAMLError) as exc:
+        raise ImproperlyConfigured(f'Credit policy {path} could not be read: {exc}') from exc
+    return CreditPolicy.compile(definition)
+
+
+_lock = threading.Lock()
+_state = {'policy': None, 'stamp': None, 'checked_at': 0.0}
+
+
+def active_policy():
+    """The compiled policy currently in force; cheap enough to call on every decision."""
+    policy = _state['policy']
+    if policy is not None and time.monotonic() - _state['checked_at'] < settings.CREDIT_POLICY_CHECK_SECONDS:
+        return policy
+    with _lock:
+        return _reload()
+
+
+def _reload():
+    policy = _state['policy']
+    _state['checked_at'] = time.monotonic()
+    path = settings.CREDIT_POLICY_PATH
+    try:
+        stat = os.stat(path)
+    except OSError:
+        if policy is None:
+            raise ImproperlyConfigured(f'Credit policy file {path} does not exist.')
+        logger.warning('Credit policy file %s disappeared; keeping v%s', path, policy.version)
+        return policy
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    if policy is not None and stamp == _state['stamp']:
+        return policy
+
+    try:
+        candidate = load_policy(path)
+    except ImproperlyConfigured:
+        if policy is None:
+            raise
+        # Keep serving the last good policy; retry once the file changes again.
+        logger.exception('Invalid credit policy in %s; keeping v%s', path, policy.version)
+        _state['stamp'] = stamp
+        return policy
+    _state['stamp'] = stamp
+    if policy is not None and candidate.version == policy.version:
+        if candidate != policy:
+            logger.warning('Credit policy %s changed without a version bump; keeping v%s', path, policy.version)
+        return policy
+    if policy is not None:
+        logger.info('Credit policy v%s replaced by v%s', policy.version, candidate.version)
+    _state['policy'] = candidate
+    return candidate
+
+
+def reset_policy():
+    """Forget the compiled policy so the next ``active_policy()`` reloads the file."""
+    with _lock:
+        _state.update(policy=None, stamp=None, checked_at=0.0)
@@ -0,0 +1,301 @@
+import math
+from datetime import datetime
+
+from django.db import transaction
+from django.db.models import F, Min, Q, Value
+from django.db.models.functions import Coalesce, Least
+
+from .db_router import use_primary
+from .models import Customer, CustomerCreditProfile, Loan
+from .scoring import CreditInputs, credit_input_annotations
+
+PROFILE_FIELDS = [
+    'num_loans', 'current_loans_sum', 'total_current_emi', 'loans_paid_on_time',
+    'loan_activity_this_year', 'loan_approved_volume',
+]
+# Maintained on Customer next to the profile, see over_limit_inputs
+DEBT_FIELDS = ['current_debt', 'current_emi', 'debt_valid_until']
+REFRESH_BATCH_SIZE = 2000
+
+
+def _today(today):
+    return today or datetime.now().date()
+
+
+def next_maturity(today):
+    """Earliest end date among a customer's current loans, as an aggregate over ``Customer.loans``."""
+    return Min('loans__end_date', filter=Q(loans__end_date__gte=today))
+
+
+def refresh_profiles(customer_ids=None, today=None):
+    """Recompute profiles and the customers' debt fields from the loan table; every customer when ``customer_ids`` is None.
+
+    Each batch locks its customer rows, in ID order, before aggregating, so
+    concurrent refreshes of the same customer (e.g. parallel loan shards)
+    run one after the other and the last to commit has seen every loan.
+    """
+    today = _today(today)
+    if customer_ids is None:
+        customer_ids = Customer.objects.values_list('id', flat=True).order_by('id').iterator()
+    customer_ids = sorted(customer_ids)
+    refreshed = 0
+    for start in range(0, len(customer_ids), REFRESH_BATCH_SIZE):
+        with transaction.atomic():
+            refreshed += _refresh_batch(customer_ids[start:start + REFRESH_BATCH_SIZE], today)
+    return refreshed
+
+
+def _refresh_batch(customer_ids, today):
+    customers = Customer.objects.filter(id__in=customer_ids)
+    # NO KEY UPDATE does not wait on the key-share locks that inserting a loan takes on its customer
+    list(customers.select_for_update(no_key=True).order_by('id').values_list('id', flat=True))
+    rows = list(
+        customers.annotate(**credit_input_annotations(today), next_maturity=next_maturity(today))
+        .values('id', 'next_maturity', *PROFILE_FIELDS)
+    )
+    Customer.objects.bulk_update(
+        [
+            Customer(
+                id=row['id'], current_debt=row['current_loans_sum'], current_emi=row['total_current_emi'],
+                debt_valid_until=row.pop('next_maturity'),
+            )
+            for row in rows
+        ],
+        DEBT_FIELDS,
+    )
+    profiles = [
+        CustomerCreditProfile(customer_id=row.pop('id'), as_of=today, **row)
+        for row in rows
+    ]
+    CustomerCreditProfile.objects.bulk_create(
+        profiles,
+        update_conflicts=True,
+        unique_fields=['customer'],
+        update_fields=PROFILE_FIELDS + ['as_of', 'updated_at'],
+    )
+    return len(profiles)
+
+
+def _profile_inputs(customer, profile):
+    return CreditInputs(
+        customer_id=customer.id,
+        monthly_salary=customer.monthly_salary,
+        approved_limit=customer.approved_limit,
+        **{field: getattr(profile, field) for field in PROFILE_FIELDS}
+    )
+
+
+def over_limit_inputs(customer, today):
+    """Inputs for a customer past its approved limit, from the customer row alone; None otherwise.
+
+    Over the limit the credit score is the policy minimum whatever the other
+    inputs, so only the current EMIs still matter for the decision. The debt
+    fields are only trusted while no counted loan can have matured.
+    """
+    valid_until = customer['debt_valid_until']
+    if customer['current_debt'] <= customer['approved_limit'] or (valid_until is not None and valid_until < today):
+        return None
+    return CreditInputs(
+        customer_id=customer['id'],
+        monthly_salary=customer['monthly_salary'],
+        approved_limit=customer['approved_limit'],
+        current_loans_sum=customer['current_debt'],
+        total_current_emi=customer['current_emi'],
+    )
+
+
+def _debt_row(customer):
+    return {field: getattr(customer, field) for field in ['id', 'monthly_salary', 'approved_limit', *DEBT_FIELDS]}
+
+
+def load_profile_inputs(customer_id, today=None):
+    """Credit-score inputs for a customer from its profile: one primary-key lookup when fresh.
+
+    Falls back to recomputing the profile when it is missing or was computed
+    for an earlier day, unless the customer is over its limit (see
+    ``over_limit_inputs``). Raises ``Customer.DoesNotExist`` for unknown customers.
+    """
+    today = _today(today)
+    customer = Customer.objects.select_related('credit_profile').get(id=customer_id)
+    profile = getattr(customer, 'credit_profile', None)
+    if profile is None or profile.as_of != today:
+        inputs = over_limit_inputs(_debt_row(customer), today)
+        if inputs is not None:
+            return customer, inputs
+        # Recompute from, and re-read, the primary: a replica may not have the new profile yet.
+        with use_primary():
+            refresh_profiles([customer.id], today)
+            profile = CustomerCreditProfile.objects.get(customer_id=customer.id)
+        customer.credit_profile = profile
+    return customer, _profile_inputs(customer, profile)
+
+
+async def aload_profile_inputs(customer_id, today=None):
+    """Async ``load_profile_inputs`` on the async ORM; same single lookup when the profile is fresh."""
+    today = _today(today)
+    customer = await Customer.objects.select_related('credit_profile').aget(id=customer_id)
+    profile = getattr(customer, 'credit_profile', None)
+    if profile is None or profile.as_of != today:
+        inputs = over_limit_inputs(_debt_row(customer), today)
+        if inputs is not None:
+            return customer, inputs
+        with use_primary():
+            totals = await (
+                Customer.objects.filter(id=customer.id)
+                .annotate(**credit_input_annotations(today), next_maturity=next_maturity(today))
+                .values(*PROFILE_FIELDS, 'next_maturity')
+                .aget()
+            )
+            await Customer.objects.filter(id=customer.id).aupdate(
+                current_debt=totals['current_loans_sum'], current_emi=totals['total_current_emi'],
+                debt_valid_until=totals.pop('next_maturity'),
+            )
+            profile, _ = await CustomerCreditProfile.objects.aupdate_or_create(
+                customer_id=customer.id, defaults=dict(totals, as_of=today)
+            )
+        customer.credit_profile = profile
+    return customer, _profile_inputs(customer, profile)
+
+
+def load_profile_inputs_bulk(customer_ids, today=None):
+    """``load_profile_inputs`` for many customers: a constant number of queries per batch of IDs.
+
+    Returns ``{customer_id: CreditInputs}``; unknown customers are left out.
+    """
+    today = _today(today)
+    customer_ids = sorted(set(customer_ids))
+    fields = ['id', 'monthly_salary', 'approved_limit', *DEBT_FIELDS, 'credit_profile__as_of']
+    fields += [f'credit_profile__{field}' for field in PROFILE_FIELDS]
+    inputs = {}
+    for start in range(0, len(customer_ids), REFRESH_BATCH_SIZE):
+        batch = customer_ids[start:start + REFRESH_BATCH_SIZE]
+        rows = list(Customer.objects.filter(id__in=batch).values(*fields))
+        stale = []
+        for row in rows:
+            if row['credit_profile__as_of'] != today:
+                over_limit = over_limit_inputs(row, today)
+                if over_limit is None:
+                    stale.append(row['id'])
+                else:
+                    inputs[row['id']] = over_limit
+        if stale:
+            with use_primary():
+                refresh_profiles(stale, today)
+                refreshed = list(Customer.objects.filter(id__in=stale).values(*fields))
+            rows = [row for row in rows if row['credit_profile__as_of'] == today] + refreshed
+        for row in rows:
+            if row['credit_profile__as_of'] != today:
+                continue  # over the limit, answered above
+            inputs[row['id']] = CreditInputs(
+                customer_id=row['id'],
+                monthly_salary=row['monthly_salary'],
+                approved_limit=row['approved_limit'],
+                **{field: row[f'credit_profile__{field}'] for field in PROFILE_FIELDS}
+            )
+    return inputs
+
+
+def apply_new_loan(loan, today=None):
+    """Add a freshly created loan to its customer's profile and debt fields with F() increments."""
+    today = _today(today)
+    changes = {
+        'num_loans': F('num_loans') + 1,
+        'loan_approved_volume': F('loan_approved_volume') + loan.loan_amount,
+    }
+    if loan.end_date >= today:
+        changes['current_loans_sum'] = F('current_loans_sum') + loan.loan_amount
+        changes['total_current_emi'] = F('total_current_emi') + loan.monthly_repayment
+    if loan.emis_paid_on_time >= loan.tenure:
+        changes['loans_paid_on_time'] = F('loans_paid_on_time') + 1
+    if loan.start_date.year == today.year:
+        changes['loan_activity_this_year'] = F('loan_activity_this_year') + 1
+    updated = CustomerCreditProfile.objects.filter(customer_id=loan.customer_id, as_of=today).update(**changes)
+    if not updated:
+        refresh_profiles([loan.customer_id], today)
+    elif loan.end_date >= today:
+        end_date = Value(loan.end_date)
+        Customer.objects.filter(id=loan.customer_id).update(
+            current_debt=F('current_debt') + loan.loan_amount,
+            current_emi=F('current_emi') + loan.monthly_repayment,
+            debt_valid_until=Least(Coalesce('debt_valid_until', end_date), end_date),
+        )
+
+
+def roll_over_profiles(today=None):
+    """Bring every stale profile forward to ``today``.
+
+    Only customers with a loan that matured since the profile was computed, or
+    whose current-year activity belongs to an earlier year, are recomputed; the
+    rest only have their ``as_of`` date moved forward.
+    """
+    today = _today(today)
+    stale = CustomerCreditProfile.objects.filter(as_of__lt=today)
+    matured = Loan.objects.filter(
+        end_date__lt=today,
+        end_date__gte=F('customer__credit_profile__as_of'),
+    ).values_list('customer_id', flat=True)
+    new_year = stale.filter(as_of__year__lt=today.year, loan_activity_this_year__gt=0).values_list('customer_id', flat=True)
+    debt_matured = Customer.objects.filter(debt_valid_until__lt=today).values_list('id', flat=True)
+    affected = set(matured) | set(new_year) | set(debt_matured)
+    refreshed = refresh_profiles(sorted(affected), today)
+    stale.update(as_of=today)
+    return refreshed
+
+
+def find_profile_drift():
+    """Return ``(customer_id, field, stored, expected)`` for every profile that disagrees with the loan table.
+
+    Each profile is checked against the aggregates for its own ``as_of`` date,
+    so profiles that are merely waiting for the nightly roll-over are not drift.
+    """
+    drift = []
+    stored = {}
+    for row in CustomerCreditProfile.objects.values('customer_id', 'as_of', *PROFILE_FIELDS).iterator():
+        stored.setdefault(row['as_of'], {})[row['customer_id']] = row
+    for as_of, profiles in stored.items():
+        customer_ids = sorted(profiles)
+        for start in range(0, len(customer_ids), REFRESH_BATCH_SIZE):
+            expected_rows = (
+                Customer.objects.filter(id__in=customer_ids[start:start + REFRESH_BATCH_SIZE])
+                .annotate(**credit_input_annotations(as_of))
+                .values('id', *PROFILE_FIELDS)
+            )
+            for expected in expected_rows:
+                profile = profiles[expected['id']]
+                for field in PROFILE_FIELDS:
+                    if not math.isclose(profile[field], expected[field], rel_tol=1e-9, abs_tol=1e-6):
+                        drift.append((expected['id'], field, profile[field], expected[field]))
+    return drift
+
+
+def find_debt_drift(today=None):
+    """Return ``(customer_id, field, stored, expected)`` for every customer whose debt fields disagree with the loans.
+
+    Customers with a counted loan that has since matured are waiting for the
+    nightly roll-over and are never trusted by ``over_limit_inputs``, so they
+    are not drift.
+    """
+    today = _today(today)
+    current = credit_input_annotations(today)
+    customer_ids = list(
+        Customer.objects.filter(Q(debt_valid_until__isnull=True) | Q(debt_valid_until__gte=today))
+        .order_by('id').values_list('id', flat=True)
+    )
+    drift = []
+    for start in range(0, len(customer_ids), REFRESH_BATCH_SIZE):
+        rows = (
+            Customer.objects.filter(id__in=customer_ids[start:start + REFRESH_BATCH_SIZE])
+            .annotate(
+                expected_debt=current['current_loans_sum'],
+                expected_emi=current['total_current_emi'],
+                next_maturity=next_maturity(today),
+            )
+            .values('id', *DEBT_FIELDS, 'expected_debt', 'expected_emi', 'next_maturity')
+        )
+        for row in rows:
+            for field, expected in (('current_debt', 'expected_debt'), ('current_emi', 'expected_emi')):
+                if not math.isclose(row[field], row[expected], rel_tol=1e-9, abs_tol=1e-6):
+                    drift.append((row['id'], field, row[field], row[expected]))
+            if row['debt_valid_until'] != row['next_maturity']:
+                drift.append((row['id'], 'debt_valid_until', row['debt_valid_until'], row['next_maturity']))
+    return drift
@@ -0,0 +1,94 @@
+from django.db import IntegrityError, transaction
+from rest_framework import status
+
+from . import finance, instrumentation
+from .models import Customer
+from .serializers import BulkCustomerRegisterSerializer, CustomerRegisterSerializer
+
+CHUNK_SIZE = 2000
+PHONE_TAKEN = 'customer with this phone number already exists.'
+
+
+def register_customers(rows, chunk_size=CHUNK_SIZE):
+    """Register many customers at once; returns one result per row, in input order.
+
+    Rows are validated one by one, phone numbers are checked against the
+    database in a single query and against each other, approved limits are
+    computed for the whole batch, and customers are inserted with
+    ``bulk_create`` per chunk. A bad row only fails itself.
+    """
+    results = [None] * len(rows)
+
+    def fail(position, errors):
+        results[position] = {'row': position, 'status': status.HTTP_400_BAD_REQUEST, 'errors': errors}
+
+    valid = []
+    for position, row in enumerate(rows):
+        serializer = BulkCustomerRegisterSerializer(data=row)
+        if serializer.is_valid():
+            valid.append((position, serializer.validated_data))
+        else:
+            fail(position, serializer.errors)
+
+    taken = set(
+        Customer.objects.filter(phone_number__in=[data['phone_number'] for _, data in valid])
+        .values_list('phone_number', flat=True)
+    )
+    first_row = {}
+    accepted = []
+    for position, data in valid:
+        phone_number = data['phone_number']
+        if phone_number in taken:
+            fail(position, {'phone_number': [PHONE_TAKEN]})
+        elif phone_number in first_row:
+            fail(position, {'phone_number': [f'Duplicate of row {first_row[phone_number]} in this batch.']})
+        else:
+            first_row[phone_number] = position
+            accepted.append((position, data))
+
+    limits = finance.approved_limit([data['monthly_income'] for _, data in accepted]).tolist()
+    customers = [
+        Customer(
+            first_name=data['first_name'],
+            last_name=data['last_name'],
+            age=data['age'],
+            phone_number=data['phone_number'],
+            monthly_salary=data['monthly_income'],
+            approved_limit=limit,
+        )
+        for (_, data), limit in zip(accepted, limits)
+    ]
+    positions = [position for position, _ in accepted]
+    for start in range(0, len(customers), chunk_size):
+        chunk = list(zip(positions[start:start + chunk_size], customers[start:start + chunk_size]))
+        with instrumentation.timed('write'):
+            inserted = _insert_chunk(chunk)
+        for position, customer in inserted:
+            if customer is None:
+                fail(position, {'phone_number': [PHONE_TAKEN]})
+            else:
+                results[position] = {
+                    'row': position, 'status': status.HTTP_201_CREATED, **CustomerRegisterSerializer(customer).data
+                }
+    return results
+
+
+def _insert_chunk(chunk):
+    try:
+        with transaction.atomic():
+            Customer.objects.bulk_create([customer for _, customer in chunk])
+        return chunk
+    except IntegrityError:
+        pass
+    # A concurrent registration took one of these phone numbers after the
+    # check; insert this chunk row by row so only that row fails.
+    inserted = []
+    for position, customer in chunk:
+        customer.pk = None
+        try:
+            with transaction.atomic():
+                customer.save(force_insert=True)
+        except IntegrityError:
+            customer = None
+        inserted.append((position, customer))
+    return inserted
@@ -0,0 +1,67 @@
+import math
+import re
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # optional, FastJSONRenderer falls back to the json module
+    orjson = None
+
+# Floats the json module writes in exponent form: orjson writes "1e16", "1.5e-7" where it writes "1e+16", "1.5e-07",
+# and "0.00005" where it writes "5e-05" (0 < |x| < 1e-4)
+EXPONENT = re.compile(rb'\de[-\d]|(?<![\d.])0\.0000')
+# Hand dates and dataclasses to DRF's encoder, which formats (or rejects) them differently
+ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS if orjson is not None else 0
+
+
+class FastJSONRenderer(JSONRenderer):
+    """``JSONRenderer`` on orjson: byte-for-byte the same output, several times faster for large bodies.
+
+    Anything orjson would write differently (dates and other types only DRF's
+    encoder knows, exponent-form floats, indented or non-strict output) is
+    handed to ``JSONRenderer`` instead, as is NaN or Infinity, which orjson
+    writes as ``null`` and ``JSONRenderer`` rejects.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None or data is None or self.ensure_ascii or not self.compact or not self.strict
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            body = orjson.dumps(data, default=self._default, option=ORJSON_OPTIONS)
+        except TypeError:  # orjson.JSONEncodeError: non-str keys, out-of-range integers, ...
+            return super().render(data, accepted_media_type, renderer_context)
+        if EXPONENT.search(body) or (b'null' in body and _has_non_finite(data)):
+            return super().render(data, accepted_media_type, renderer_context)
+        # JSONRenderer escapes these two so the output stays a JavaScript subset.
+        return body.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+    def _default(self, obj):
+        return self.encoder_class().default(obj)
+
+
+def _has_non_finite(data):
+    stack = [data]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, float):
+            if not math.isfinite(item):
+                return True
+        elif isinstance(item, dict):
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple)):
+            stack.extend(item)
+    return False
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Newline-delimited JSON; views stream the body themselves, this only takes part in content negotiation."""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data
@@ -0,0 +1,194 @@
+"""Batched posting of EMI payments into the ``Repayment`` ledger.
+
+Each payment settles its loan's next installment, number
+``emis_paid_on_time + emis_paid_late + 1``. It counts towards
+``emis_paid_on_time`` when made by that installment's due date (the start
+date plus that many months) and covering the full EMI, and towards
+``emis_paid_late`` otherwise. Payments on the same loan are applied in
+``paid_on`` order, ties in input order.
+
+Per chunk, the loans are locked and read in one query, the ledger rows are
+inserted with ``bulk_create``, and the loan counters move in a single
+``UPDATE`` whose ``CASE`` groups the loans by increment. Posting is
+idempotent on ``reference``: a payment already in the ledger is reported
+with its original outcome and is not applied again.
+"""
+import time
+from collections import Counter
+
+import numpy as np
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+from rest_framework import status
+
+from . import conditional, eligibility_cache, finance, instrumentation
+from .models import Loan, Repayment
+from .profiles import refresh_profiles
+from .serializers import RepaymentSerializer
+
+CHUNK_SIZE = 2000
+# Fields that identify a payment; a reference reused with other values is rejected
+PAYMENT_FIELDS = ['reference', 'loan_id', 'amount', 'paid_on']
+# EMIs are stored unrounded, payments in whole paise
+AMOUNT_TOLERANCE = 0.005
+REFERENCE_REUSED = 'Payment reference was already used for a different payment.'
+
+
+def post_repayments(rows, chunk_size=CHUNK_SIZE):
+    """Post many payments at once; returns ``{'summary': ..., 'results': ...}``.
+
+    ``results`` holds one entry per row in input order: ``201`` posted,
+    ``200`` already posted earlier (with the original outcome), ``400``
+    invalid, ``404`` unknown loan, ``409`` loan already fully repaid, ``422``
+    reference reused for a different payment. ``summary`` has the counts and
+    the throughput.
+    """
+    started = time.perf_counter()
+    results = [None] * len(rows)
+
+    def fail(position, code, errors):
+        results[position] = {'row': position, 'status': code, 'errors': errors}
+
+    valid = []
+    first_row = {}
+    for position, row in enumerate(rows):
+        serializer = RepaymentSerializer(data=row)
+        if not serializer.is_valid():
+            fail(position, status.HTTP_400_BAD_REQUEST, serializer.errors)
+            continue
+        reference = serializer.validated_data['reference']
+        if reference in first_row:
+            fail(position, status.HTTP_400_BAD_REQUEST,
+                 {'reference': [f'Duplicate of row {first_row[reference]} in this batch.']})
+        else:
+            first_row[reference] = position
+            valid.append((position, serializer.validated_data))
+
+    # Chunks are taken in date order, so a loan's payments keep their order across chunks too.
+    valid.sort(key=lambda item: (item[1]['paid_on'], item[0]))
+    for start in range(0, len(valid), chunk_size):
+        with instrumentation.timed('write'):
+            outcomes = _post_chunk_retrying(valid[start:start + chunk_size])
+        for position, outcome in outcomes:
+            results[position] = {'row': position, **outcome}
+
+    seconds = time.perf_counter() - started
+    codes = Counter(result['status'] for result in results)
+    on_time = sum(1 for result in results if result['status'] == status.HTTP_201_CREATED and result['on_time'])
+    summary = {
+        'payments': len(rows),
+        'posted': codes[status.HTTP_201_CREATED],
+        'on_time': on_time,
+        'late': codes[status.HTTP_201_CREATED] - on_time,
+        'already_posted': codes[status.HTTP_200_OK],
+        'failed': len(rows) - codes[status.HTTP_201_CREATED] - codes[status.HTTP_200_OK],
+        'seconds': round(seconds, 3),
+        'payments_per_second': round(len(rows) / seconds, 1) if seconds else None,
+    }
+    return {'summary': summary, 'results': results}
+
+
+def _post_chunk_retrying(chunk):
+    try:
+        return _post_chunk(chunk)
+    except IntegrityError:
+        # A concurrent batch posted one of these references after the ledger
+        # check; on the second pass it is found there and reported as posted.
+        return _post_chunk(chunk)
+
+
+def _payment(repayment):
+    return {field: repayment[field] for field in [*PAYMENT_FIELDS, 'installment', 'on_time']}
+
+
+def _post_chunk(chunk):
+    with transaction.atomic():
+        # Locked in ID order, so concurrent batches cannot deadlock on each other's loans.
+        loans = {
+            loan['id']: loan
+            for loan in Loan.objects.select_for_update().filter(id__in=sorted({data['loan_id'] for _, data in chunk}))
+            .order_by('id')
+            .values('id', 'customer_id', 'tenure', 'start_date', 'monthly_repayment', 'emis_paid_on_time', 'emis_paid_late')
+        }
+        ledger = {
+            repayment['reference']: repayment
+            for repayment in Repayment.objects.filter(reference__in=[data['reference'] for _, data in chunk])
+            .values(*PAYMENT_FIELDS, 'installment', 'on_time')
+        }
+        settled = {loan_id: loan['emis_paid_on_time'] + loan['emis_paid_late'] for loan_id, loan in loans.items()}
+        outcomes = []
+        new = []
+        for position, data in chunk:
+            previous = ledger.get(data['reference'])
+            loan = loans.get(data['loan_id'])
+            if previous is not None:
+                if any(previous[field] != data[field] for field in PAYMENT_FIELDS):
+                    outcomes.append((position, {
+                        'status': status.HTTP_422_UNPROCESSABLE_ENTITY, 'errors': {'reference': [REFERENCE_REUSED]}
+                    }))
+                else:
+                    outcomes.append((position, {'status': status.HTTP_200_OK, **_payment(previous)}))
+            elif loan is None:
+                outcomes.append((position, {'status': status.HTTP_404_NOT_FOUND, 'errors': {'loan_id': ['Loan not found.']}}))
+            elif settled[loan['id']] >= loan['tenure']:
+                outcomes.append((position, {
+                    'status': status.HTTP_409_CONFLICT, 'errors': {'loan_id': ['Loan is already fully repaid.']}
+                }))
+            else:
+                settled[loan['id']] += 1
+                new.append((position, data, loan, settled[loan['id']]))
+        if not new:
+            return outcomes
+
+        installments = np.array([installment for *_, installment in new])
+        due_dates = finance.add_months([loan['start_date'] for _, _, loan, _ in new], installments)
+        paid_on = np.array([data['paid_on'] for _, data, _, _ in new], dtype='datetime64[D]')
+        amounts = np.array([data['amount'] for _, data, _, _ in new])
+        emis = np.array([loan['monthly_repayment'] for _, _, loan, _ in new])
+        on_time = ((paid_on <= due_dates) & (amounts + AMOUNT_TOLERANCE >= emis)).tolist()
+
+        repayments = [
+            Repayment(installment=installment, on_time=flag, **data)
+            for (_, data, _, installment), flag in zip(new, on_time)
+        ]
+        Repayment.objects.bulk_create(repayments)
+        _apply_to_loans(loans, [(loan['id'], flag) for (_, _, loan, _), flag in zip(new, on_time)])
+        for (position, _, _, _), repayment in zip(new, repayments):
+            outcomes.append((position, {'status': status.HTTP_201_CREATED, **_payment(vars(repayment))}))
+    return outcomes
+
+
+def _increment(deltas):
+    """``CASE`` adding each loan's delta, with one ``WHEN id IN (...)`` per distinct delta."""
+    by_delta = {}
+    for loan_id, delta in deltas.items():
+        if delta:
+            by_delta.setdefault(delta, []).append(loan_id)
+    return Case(
+        *[When(id__in=loan_ids, then=Value(delta)) for delta, loan_ids in by_delta.items()],
+        default=Value(0), output_field=IntegerField(),
+    )
+
+
+def _apply_to_loans(loans, applied):
+    on_time, late = Counter(), Counter()
+    for loan_id, flag in applied:
+        (on_time if flag else late)[loan_id] += 1
+    loan_ids = sorted(on_time.keys() | late.keys())
+    Loan.objects.filter(id__in=loan_ids).update(
+        emis_paid_on_time=F('emis_paid_on_time') + _increment(on_time),
+        emis_paid_late=F('emis_paid_late') + _increment(late),
+        version=F('version') + 1,
+        updated_at=timezone.now(),
+    )
+    conditional.touch_customers({loans[loan_id]['customer_id'] for loan_id in loan_ids})
+    # A loan whose last EMI was paid on time now counts towards loans_paid_on_time.
+    repaid = sorted({
+        loans[loan_id]['customer_id'] for loan_id, count in on_time.items()
+        if loans[loan_id]['emis_paid_on_time'] < loans[loan_id]['tenure'] <= loans[loan_id]['emis_paid_on_time'] + count
+    })
+    if repaid:
+        refresh_profiles(repaid)
+        for customer_id in repaid:
+            eligibility_cache.invalidate_customer(customer_id)
@@ -0,0 +1,100 @@
+from dataclasses import dataclass
+from datetime import datetime
+
+import numpy as np
+from django.db.models import Count, F, FloatField, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import Customer
+from .policy import active_policy
+
+INPUT_COLUMNS = (
+    'monthly_salary', 'approved_limit', 'num_loans', 'current_loans_sum', 'total_current_emi', 'loans_paid_on_time',
+    'loan_activity_this_year', 'loan_approved_volume',
+)
+
+
+@dataclass
+class CreditInputs:
+    customer_id: int
+    monthly_salary: int
+    approved_limit: int
+    num_loans: int = 0
+    current_loans_sum: float = 0.0
+    total_current_emi: float = 0.0
+    loans_paid_on_time: int = 0
+    loan_activity_this_year: int = 0
+    loan_approved_volume: float = 0.0
+
+
+def _float_sum(expression, condition=None):
+    return Coalesce(Sum(expression, filter=condition), Value(0.0), output_field=FloatField())
+
+
+def credit_input_annotations(today=None):
+    """Conditional aggregates over ``Customer.loans`` for every credit-score input.
+
+    Loans moved to ``LoanHistory`` only count through the customer's
+    ``archived_*`` totals: they are never current nor this year's activity.
+    """
+    today = today or datetime.now().date()
+    current = Q(loans__end_date__gte=today)
+    return {
+        'num_loans': Count('loans') + F('archived_loans'),
+        'current_loans_sum': _float_sum('loans__loan_amount', current),
+        'total_current_emi': _float_sum('loans__monthly_repayment', current),
+        'loans_paid_on_time': (
+            Count('loans', filter=Q(loans__emis_paid_on_time__gte=F('loans__tenure'))) + F('archived_loans')
+        ),
+        'loan_activity_this_year': Count('loans', filter=Q(loans__start_date__year=today.year)),
+        'loan_approved_volume': _float_sum('loans__loan_amount') + F('archived_loan_volume'),
+    }
+
+
+def inputs_from_customer(customer):
+    return CreditInputs(
+        customer_id=customer.id,
+        monthly_salary=customer.monthly_salary,
+        approved_limit=customer.approved_limit,
+        num_loans=customer.num_loans,
+        current_loans_sum=customer.current_loans_sum,
+        total_current_emi=customer.total_current_emi,
+        loans_paid_on_time=customer.loans_paid_on_time,
+        loan_activity_this_year=customer.loan_activity_this_year,
+        loan_approved_volume=customer.loan_approved_volume,
+    )
+
+
+def load_credit_inputs(customer_id, today=None):
+    """Fetch the customer row and all of its scoring aggregates in a single query.
+
+    Raises ``Customer.DoesNotExist`` for unknown customers.
+    """
+    customer = Customer.objects.annotate(**credit_input_annotations(today)).get(id=customer_id)
+    return customer, inputs_from_customer(customer)
+
+
+def input_columns(inputs):
+    """Column arrays of a sequence of ``CreditInputs``, as ``CreditPolicy.evaluate_batch`` takes them."""
+    return {
+        name: np.fromiter((getattr(item, name) for item in inputs), dtype=float, count=len(inputs))
+        for name in INPUT_COLUMNS
+    }
+
+
+def credit_score(inputs, policy=None):
+    return (policy or active_policy()).credit_score(inputs)
+
+
+def evaluate_eligibility(inputs, loan_amount, interest_rate, tenure, policy=None):
+    """Decide one request under ``policy``, by default the active credit policy."""
+    return (policy or active_policy()).evaluate(inputs, loan_amount, interest_rate, tenure)
+
+
+def evaluate_eligibility_batch(inputs, loan_amount, interest_rate, tenure, policy=None):
+    """Vectorized ``evaluate_eligibility`` over aligned sequences of inputs and requests.
+
+    Returns a dict of NumPy arrays: ``approval``, ``corrected_interest_rate``,
+    ``monthly_installment`` and ``credit_score``, plus the ``policy_version``.
+    """
+    return (policy or active_policy()).evaluate_batch(input_columns(inputs), loan_amount, interest_rate, tenure)
@@ -1,6 +1,15 @@
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
 from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from . import finance
 from .models import Customer
 from .models import Loan
+from .models import LoanRequest
+from .offers import DEFAULT_LIMIT, RANKINGS
+
+# Tenures in months; the upper bound keeps EMI maths and due dates in range
+MAX_TENURE = 600
 
 class CustomerRegisterSerializer(serializers.ModelSerializer):
     monthly_income = serializers.IntegerField(write_only=True)
@@ -18,21 +27,34 @@ class CustomerRegisterSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         monthly_income = validated_data.pop('monthly_income')
-        # Calculate approved_limit: 36 * monthly_income, rounded to nearest lakh
-        approved_limit = int(round((36 * monthly_income) / 100000.0) * 100000)
         customer = Customer.objects.create(
-            approved_limit=approved_limit,
+            approved_limit=finance.approved_limit(monthly_income),
             monthly_salary=monthly_income,
-            current_debt=0,
             **validated_data
         )
         return customer 
 
+class BulkCustomerRegisterSerializer(serializers.Serializer):
+    # One row of customer/register/bulk: the CustomerRegisterSerializer fields
+    # without its per-row phone uniqueness query, which is done for the batch.
+    first_name = serializers.CharField(max_length=100)
+    last_name = serializers.CharField(max_length=100)
+    age = serializers.IntegerField(min_value=0)
+    monthly_income = serializers.IntegerField(min_value=0)
+    phone_number = serializers.CharField(max_length=15)
+
+class RepaymentSerializer(serializers.Serializer):
+    # One row of repayments/batch or a bank file
+    reference = serializers.CharField(max_length=100)
+    loan_id = serializers.IntegerField(min_value=1)
+    amount = serializers.FloatField(min_value=0.01)
+    paid_on = serializers.DateField()
+
 class CheckEligibilitySerializer(serializers.Serializer):
     customer_id = serializers.IntegerField()
     loan_amount = serializers.FloatField()
     interest_rate = serializers.FloatField()
-    tenure = serializers.IntegerField()
+    tenure = serializers.IntegerField(min_value=1, max_value=MAX_TENURE)
 
 class CheckEligibilityResponseSerializer(serializers.Serializer):
     customer_id = serializers.IntegerField()
@@ -41,12 +63,26 @@ class CheckEligibilityResponseSerializer(serializers.Serializer):
     corrected_interest_rate = serializers.FloatField()
     tenure = serializers.IntegerField()
     monthly_installment = serializers.FloatField() 
+    policy_version = serializers.IntegerField()
+
+class LoanOffersSerializer(serializers.Serializer):
+    customer_id = serializers.IntegerField()
+    loan_amount = serializers.FloatField(min_value=0.01)
+    # Omitted grids fall back to offers.DEFAULT_TENURES / DEFAULT_INTEREST_RATES
+    tenures = serializers.ListField(
+        child=serializers.IntegerField(min_value=1, max_value=MAX_TENURE), required=False, min_length=1, max_length=200
+    )
+    interest_rates = serializers.ListField(
+        child=serializers.FloatField(min_value=0, max_value=100), required=False, min_length=1, max_length=200
+    )
+    rank_by = serializers.ChoiceField(choices=RANKINGS, default='monthly_installment')
+    limit = serializers.IntegerField(min_value=1, max_value=1000, default=DEFAULT_LIMIT)
 
 class CreateLoanSerializer(serializers.Serializer):
     customer_id = serializers.IntegerField()
     loan_amount = serializers.FloatField()
     interest_rate = serializers.FloatField()
-    tenure = serializers.IntegerField()
+    tenure = serializers.IntegerField(min_value=1, max_value=MAX_TENURE)
 
 class CreateLoanResponseSerializer(serializers.Serializer):
     loan_id = serializers.IntegerField(allow_null=True)
@@ -54,26 +90,129 @@ class CreateLoanResponseSerializer(serializers.Serializer):
     loan_approved = serializers.BooleanField()
     message = serializers.CharField()
     monthly_installment = serializers.FloatField(allow_null=True) 
+    policy_version = serializers.IntegerField()
+
+class SparseFieldsMixin:
+    """Serialize only the fields named in ``fields``, e.g. from ``?fields=id,loan_amount``.
+
+    ``values_queryset`` and ``values_data`` are a fast path that produces the
+    same data from ``values()`` rows, selecting only the requested columns,
+    without building model instances or running DRF's per-field machinery.
+    Fields must be plain columns, SQL expressions listed in
+    ``value_expressions``, or one level of nesting listed in ``nested_values``.
+    """
+    value_expressions = {}
+    nested_values = {}
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def requested_fields(cls, request):
+        raw = getattr(request, 'query_params', request.GET).get('fields')
+        if not raw:
+            return None
+        fields = [name.strip() for name in raw.split(',') if name.strip()]
+        unknown = set(fields) - set(cls.Meta.fields)
+        if unknown:
+            raise ValidationError({'fields': f"Unknown field(s): {', '.join(sorted(unknown))}."})
+        return fields
+
+    @classmethod
+    def _value_names(cls, fields):
+        return [name for name in cls.Meta.fields if fields is None or name in fields]
+
+    @classmethod
+    def values_queryset(cls, queryset, fields=None, extra=()):
+        """``queryset`` as dict rows holding what ``values_data`` needs, plus ``id`` for pagination and ``extra``."""
+        columns = {'id', *extra}
+        expressions = {}
+        for name in cls._value_names(fields):
+            if name in cls.nested_values:
+                columns.update(f'{name}__{field}' for field in cls.nested_values[name])
+            elif name in cls.value_expressions:
+                expressions[name] = cls.value_expressions[name]
+            else:
+                columns.add(name)
+        return queryset.values(*sorted(columns), **expressions)
+
+    @classmethod
+    def values_data(cls, rows, fields=None):
+        """Serialized data of ``values_queryset`` rows: the same dicts, in the same key order, as ``.data``."""
+        names = cls._value_names(fields)
+        nested = [(name, [(field, f'{name}__{field}') for field in cls.nested_values[name]])
+                  for name in names if name in cls.nested_values]
+        if not nested:
+            return [{name: row[name] for name in names} for row in rows]
+        data = []
+        for row in rows:
+            item = {name: row.get(name) for name in names}
+            for name, columns in nested:
+                item[name] = {field: row[column] for field, column in columns}
+            data.append(item)
+        return data
 
 class CustomerDetailSerializer(serializers.ModelSerializer):
     class Meta:
         model = Customer
         fields = ['id', 'first_name', 'last_name', 'phone_number', 'age']
 
-class LoanDetailSerializer(serializers.ModelSerializer):
+class LoanDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     customer = CustomerDetailSerializer(read_only=True)
+    nested_values = {'customer': CustomerDetailSerializer.Meta.fields}
+
     class Meta:
         model = Loan
         fields = [
             'id', 'customer', 'loan_amount', 'interest_rate', 'is_approved', 'monthly_repayment', 'tenure'
         ]
 
-class LoanListItemSerializer(serializers.ModelSerializer):
+class LoanListItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     repayments_left = serializers.SerializerMethodField()
+    value_expressions = {
+        'repayments_left': Greatest(F('tenure') - F('emis_paid_on_time') - F('emis_paid_late'), Value(0))
+    }
+
     class Meta:
         model = Loan
         fields = [
             'id', 'loan_amount', 'is_approved', 'interest_rate', 'monthly_repayment', 'repayments_left'
         ]
     def get_repayments_left(self, obj):
-        return max(obj.tenure - obj.emis_paid_on_time, 0) 
\ No newline at end of file
+        return max(obj.tenure - obj.emis_paid_on_time - obj.emis_paid_late, 0)
+
+class AmortizationRowSerializer(serializers.Serializer):
+    month = serializers.IntegerField()
+    due_date = serializers.DateField()
+    payment = serializers.FloatField()
+    principal = serializers.FloatField()
+    interest = serializers.FloatField()
+    balance = serializers.FloatField()
+
+class LoanScheduleSerializer(serializers.Serializer):
+    loan_id = serializers.IntegerField()
+    loan_amount = serializers.FloatField()
+    interest_rate = serializers.FloatField()
+    tenure = serializers.IntegerField()
+    monthly_installment = serializers.FloatField()
+    schedule = AmortizationRowSerializer(many=True)
+
+class LoanRequestSerializer(serializers.ModelSerializer):
+    loan_id = serializers.IntegerField(read_only=True, allow_null=True)
+    customer_id = serializers.IntegerField(read_only=True)
+    loan_approved = serializers.SerializerMethodField()
+
+    class Meta:
+        model = LoanRequest
+        fields = [
+            'id', 'idempotency_key', 'status', 'customer_id', 'loan_amount', 'interest_rate', 'tenure',
+            'loan_id', 'loan_approved', 'message', 'monthly_installment', 'policy_version', 'created_at', 'updated_at'
+        ]
+
+    def get_loan_approved(self, obj):
+        if obj.status == LoanRequest.STATUS_PENDING:
+            return None
+        return obj.status == LoanRequest.STATUS_APPROVED
@@ -1,46 +1,137 @@
-import pandas as pd
-from celery import shared_task
-from .models import Customer, Loan
-from django.db import transaction
-from datetime import datetime
-
-@shared_task
-def ingest_customer_and_loan_data(customer_file_path, loan_file_path):
-    # Ingest customers
-    customer_df = pd.read_excel(customer_file_path)
-    with transaction.atomic():
-        for _, row in customer_df.iterrows():
-            Customer.objects.update_or_create(
-                id=row['Customer ID'],
-                defaults={
-                    'first_name': row['First Name'],
-                    'last_name': row['Last Name'],
-                    'monthly_salary': row['Monthly Salary'],
-                    'approved_limit': row['Approved Limit'],
-                    'current_debt': 0,
-                    'age': row['Age'],
-                    'phone_number': row['Phone Number'],
-                }
+from celery import chord, group, shared_task
+from django.utils import timezone
+from .archival import archive_closed_loans
+from .instrumentation import track_task
+from .ingestion import CHUNK_SIZE, CUSTOMERS, LOANS, ingest_customers, ingest_loans, plan_id_shards, reset_sequences
+from .models import Customer, IngestionRun, Loan
+from .origination import claim_stale_requests, process_loan_request
+from .portfolio import prune_snapshots, score_portfolio
+from .profiles import roll_over_profiles
+
+@shared_task
+def ingest_customer_and_loan_data(customer_file_path, loan_file_path, chunk_size=CHUNK_SIZE, force=False):
+    # Customers first, so loans can be matched against the known customer IDs.
+    # Unchanged files are skipped and only new or changed rows are written.
+    with track_task('ingest_customer_and_loan_data'):
+        customers = ingest_customers(customer_file_path, chunk_size, force=force)
+        loans = ingest_loans(loan_file_path, chunk_size, force=force or customers > 0)
+    return {'customers': customers, 'loans': loans}
+
+def start_sharded_ingestion(customer_file_path, loan_file_path, shard_count, chunk_size=CHUNK_SIZE):
+    """Fan ingestion out over ID-range shards: all customer shards, then all loan shards."""
+    customer_shards = plan_id_shards(customer_file_path, 'Customer ID', shard_count, chunk_size)
+    loan_shards = plan_id_shards(loan_file_path, 'Loan ID', shard_count, chunk_size)
+    run = IngestionRun.objects.create(
+        customer_file=customer_file_path, loan_file=loan_file_path, chunk_size=chunk_size, loan_shards=loan_shards
+    )
+    _launch_phase(run, CUSTOMERS, customer_shards, then=loan_shards)
+    return run
+
+def retry_failed_shards(run_id):
+    """Re-run only the shards of a finished run that failed.
+
+    When a customer shard is retried and writes customers, every loan shard
+    is re-read afterwards: loans of those customers were dropped as unknown
+    by the first loan phase, whichever shard they were in.
+    """
+    run = IngestionRun.objects.get(id=run_id)
+    customer_shards = [_shard(s) for s in run.failed_shards if s['kind'] == CUSTOMERS]
+    loan_shards = [_shard(s) for s in run.failed_shards if s['kind'] == LOANS]
+    run.status = IngestionRun.STATUS_RUNNING
+    run.failed_shards = []
+    run.save(update_fields=['status', 'failed_shards'])
+    if customer_shards:
+        _launch_phase(run, CUSTOMERS, customer_shards, then=loan_shards, rerun=run.loan_shards)
+    else:
+        _launch_phase(run, LOANS, loan_shards)
+    return run
+
+def _shard(result):
+    # Runs recorded before row spans were planned read the whole file for their range
+    return {'id_range': result['id_range'], 'rows': result.get('rows')}
+
+def _launch_phase(run, kind, shards, then=None, rerun=None):
+    path = run.customer_file if kind == CUSTOMERS else run.loan_file
+    # New customers can make previously skipped loans valid, so re-read unchanged loan shards then.
+    force = kind == LOANS and run.customers_written > 0
+    header = group(ingest_shard.s(kind, path, shard, run.chunk_size, force) for shard in shards)
+    return chord(header)(finish_shard_phase.s(run.id, kind, then or [], rerun))
+
+@shared_task
+def ingest_shard(kind, path, shard, chunk_size=CHUNK_SIZE, force=False):
+    # Failures are returned rather than raised so the chord callback still runs
+    # and can record which shards need a retry.
+    ingest = ingest_customers if kind == CUSTOMERS else ingest_loans
+    result = {'kind': kind, 'id_range': shard['id_range'], 'rows': shard['rows']}
+    try:
+        with track_task(f'ingest_shard_{kind}'):
+            written = ingest(
+                path, chunk_size, id_range=tuple(shard['id_range']), reset=False, force=force, rows=shard['rows']
             )
-    # Ingest loans
-    loan_df = pd.read_excel(loan_file_path)
-    with transaction.atomic():
-        for _, row in loan_df.iterrows():
-            try:
-                customer = Customer.objects.get(id=row['Customer ID'])
-            except Customer.DoesNotExist:
-                continue
-            Loan.objects.update_or_create(
-                id=row['Loan ID'],
-                defaults={
-                    'customer': customer,
-                    'loan_amount': row['Loan Amount'],
-                    'tenure': row['Tenure'],
-                    'interest_rate': row['Interest Rate'],
-                    'monthly_repayment': row['Monthly payment'],
-                    'emis_paid_on_time': row['EMIs paid on Time'],
-                    'start_date': pd.to_datetime(row['Date of Approval']).date() if not pd.isnull(row['Date of Approval']) else datetime.now().date(),
-                    'end_date': pd.to_datetime(row['End Date']).date() if not pd.isnull(row['End Date']) else datetime.now().date(),
-                    'is_approved': True,
-                }
-            ) 
\ No newline at end of file
+    except Exception as exc:
+        return {**result, 'written': 0, 'error': repr(exc)}
+    return {**result, 'written': written, 'error': None}
+
+@shared_task
+def finish_shard_phase(results, run_id, kind, next_shards, rerun_shards=None):
+    # rerun_shards replaces next_shards once this customer phase has written customers
+    run = IngestionRun.objects.get(id=run_id)
+    written = sum(result['written'] for result in results)
+    if kind == CUSTOMERS:
+        run.customers_written += written
+    else:
+        run.loans_written += written
+    run.failed_shards = run.failed_shards + [result for result in results if result['error']]
+    run.save(update_fields=['customers_written', 'loans_written', 'failed_shards'])
+
+    if kind == CUSTOMERS and written and rerun_shards:
+        next_shards = rerun_shards
+    if kind == CUSTOMERS and next_shards:
+        reset_sequences(Customer)
+        _launch_phase(run, LOANS, next_shards)
+        return
+    reset_sequences(Customer, Loan)
+    run.finished_at = timezone.now()
+    run.duration_seconds = (run.finished_at - run.started_at).total_seconds()
+    run.status = IngestionRun.STATUS_FAILED if run.failed_shards else IngestionRun.STATUS_COMPLETED
+    run.save(update_fields=['finished_at', 'duration_seconds', 'status'])
+
+@shared_task
+def roll_over_credit_profiles():
+    # Scheduled nightly by Celery beat, see CELERY_BEAT_SCHEDULE
+    return roll_over_profiles()
+
+@shared_task
+def archive_loans():
+    # Scheduled nightly by Celery beat, after the profile roll-over, see CELERY_BEAT_SCHEDULE
+    with track_task('archive_loans'):
+        return archive_closed_loans()
+
+@shared_task
+def rescore_portfolio():
+    # Scheduled nightly by Celery beat, see CELERY_BEAT_SCHEDULE
+    with track_task('rescore_portfolio'):
+        run = score_portfolio()
+        pruned = prune_snapshots()
+    return {
+        'run_id': run.id,
+        'customers': run.customers_scored,
+        'loans': run.loans_scored,
+        'seconds': run.duration_seconds,
+        'loans_per_second': run.loans_per_second,
+        'pruned_runs': pruned,
+    }
+
+@shared_task
+def decide_loan_request(loan_request_id):
+    # Queued by CreateLoanView for requests sent with an Idempotency-Key
+    return process_loan_request(loan_request_id).status
+
+@shared_task
+def requeue_stale_loan_requests():
+    # Scheduled by Celery beat, see CELERY_BEAT_SCHEDULE. Picks up requests whose
+    # publish was lost; deciding is idempotent, so a duplicate message is harmless.
+    loan_request_ids = claim_stale_requests()
+    for loan_request_id in loan_request_ids:
+        decide_loan_request.delay(loan_request_id)
+    return len(loan_request_ids)
@@ -1,12 +1,59 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+import warnings
+from datetime import date, datetime, timedelta
+from unittest import mock, skipUnless
+
+import numpy as np
+import pandas as pd
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connections
+from django.db.models import F
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, LiveServerTestCase, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
-from .models import Customer, Loan
+from credit_approval_system.celery import app as celery_app
+from . import async_views, db_router, eligibility_cache, finance, ingestion, instrumentation, offers, policy, tasks
+from .archival import archive_closed_loans
+from .benchmarking import run_concurrently
+from .db_router import ReplicaRouter
+from .middleware import PRIMARY_COOKIE, ReplicaRoutingMiddleware
+from .models import (
+    CreditScoreSnapshot, Customer, CustomerCreditProfile, IngestionRun, IngestionSource, Loan, LoanHistory, LoanRequest,
+    PortfolioScoringRun, Repayment,
+)
+from .profiles import (
+    PROFILE_FIELDS, find_debt_drift, find_profile_drift, load_profile_inputs, load_profile_inputs_bulk, refresh_profiles,
+    roll_over_profiles,
+)
+from .scoring import CreditInputs, credit_score, evaluate_eligibility, evaluate_eligibility_batch, load_credit_inputs
+from .tasks import ingest_customer_and_loan_data, retry_failed_shards, start_sharded_ingestion
+from .ingestion import ingest_customers, ingest_loans, iter_source_chunks, plan_id_shards
+from .management.commands.bench import compare_to_baseline
+from .portfolio import score_portfolio
+from .renderers import FastJSONRenderer
+from .repayments import post_repayments
+from .serializers import LoanDetailSerializer, LoanListItemSerializer
+from .management.commands.bench_emi import scalar_emi
+from .management.commands.bench_ingest import generate_workbooks
+from .management.commands.bench_scoring import legacy_credit_inputs
+from .management.commands.explain_hot_queries import sequential_scans
 
 
 
 class CreditAPITestCase(TestCase):
     def setUp(self):
+        caches['eligibility'].clear()
         self.client = APIClient()
         self.customer = Customer.objects.create(
             first_name="Test",
@@ -56,6 +103,20 @@ class CreditAPITestCase(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn('approval', response.data)
 
+    def test_tenure_out_of_range_is_rejected(self):
+        # Tenure 0 used to divide by zero and a negative one broke the loan_tenure_positive constraint
+        for tenure in (0, -3, 601):
+            data = {"customer_id": self.customer.id, "loan_amount": 100000, "interest_rate": 13.0, "tenure": tenure}
+            for name in ('check-eligibility', 'create-loan'):
+                with self.subTest(tenure=tenure, endpoint=name):
+                    response = self.client.post(reverse(name), data, format='json')
+                    self.assertEqual(response.status_code, 400)
+                    self.assertIn('tenure', response.data)
+            response = self.client.post(reverse('create-loan'), data, format='json', HTTP_IDEMPOTENCY_KEY=f"bad-{tenure}")
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(Loan.objects.exists())
+        self.assertFalse(LoanRequest.objects.exists())
+
     def test_create_loan(self):
         # Test creating a loan for a valid customer
         data = {
@@ -116,3 +177,1666 @@ class CreditAPITestCase(TestCase):
         response = self.client.get(reverse('view-loans', args=[9999]))
         self.assertEqual(response.status_code, 404)
         self.assertIn('detail', response.data)
+
+
+class CreditScoringTestCase(TestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(
+            first_name="Score",
+            last_name="User",
+            age=40,
+            monthly_salary=100000,
+            approved_limit=3600000,
+            current_debt=0,
+            phone_number="7777777777"
+        )
+        today = date.today()
+        for i in range(5):
+            Loan.objects.create(
+                customer=self.customer,
+                loan_amount=100000 + i * 1000,
+                tenure=12,
+                interest_rate=10.0,
+                monthly_repayment=9000 + i,
+                emis_paid_on_time=12 if i % 2 else 4,
+                start_date=today - timedelta(days=400 * i),
+                end_date=today + timedelta(days=200 - 150 * i),
+                is_approved=True
+            )
+
+    def test_aggregate_inputs_match_loan_loop(self):
+        _, expected = legacy_credit_inputs(self.customer.id)
+        _, inputs = load_credit_inputs(self.customer.id)
+        for field, value in expected.items():
+            self.assertAlmostEqual(getattr(inputs, field), value, msg=field)
+
+    def test_bench_scoring_seeds_valid_loans(self):
+        out = io.StringIO()
+        call_command('bench_scoring', sizes=[1200], repeat=1, stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 4)
+        self.assertFalse(Customer.objects.filter(phone_number='bench-1200').exists())
+
+    def test_aggregate_inputs_single_query(self):
+        with self.assertNumQueries(1):
+            customer, inputs = load_credit_inputs(self.customer.id)
+        self.assertEqual(customer.id, self.customer.id)
+        self.assertEqual(inputs.num_loans, 5)
+
+    def test_customer_without_loans(self):
+        other = Customer.objects.create(
+            first_name="No", last_name="Loans", age=30, monthly_salary=50000,
+            approved_limit=1800000, phone_number="6666666666"
+        )
+        _, inputs = load_credit_inputs(other.id)
+        self.assertEqual(inputs.num_loans, 0)
+        self.assertEqual(inputs.current_loans_sum, 0)
+        self.assertEqual(credit_score(inputs), 100)
+
+
+class IngestionTestCase(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def write_excel(self, name, rows):
+        path = os.path.join(self.tmp.name, name)
+        pd.DataFrame(rows).to_excel(path, index=False)
+        return path
+
+    def test_ingest_shipped_workbooks(self):
+        customer_file = os.path.join(settings.BASE_DIR, 'customer_data.xlsx')
+        loan_file = os.path.join(settings.BASE_DIR, 'loan_data.xlsx')
+        result = ingest_customer_and_loan_data(customer_file, loan_file)
+        loan_ids = pd.read_excel(loan_file)['Loan ID']
+        self.assertEqual(Customer.objects.count(), len(pd.read_excel(customer_file)))
+        self.assertEqual(Loan.objects.count(), loan_ids.nunique())
+        self.assertEqual(result['loans'], loan_ids.nunique())
+        # Running it again is an upsert, not a duplicate insert
+        ingest_customer_and_loan_data(customer_file, loan_file)
+        self.assertEqual(Loan.objects.count(), loan_ids.nunique())
+
+    def test_ingest_updates_and_skips_unknown_customers(self):
+        customer_file = self.write_excel('customers.xlsx', {
+            'Customer ID': [1, 2], 'First Name': ['A', 'B'], 'Last Name': ['X', 'Y'], 'Age': [30, 40],
+            'Phone Number': [9000000001, 9000000002], 'Monthly Salary': [50000, 60000],
+            'Approved Limit': [1800000, 2200000],
+        })
+        loan_file = self.write_excel('loans.xlsx', {
+            'Customer ID': [1, 1, 99], 'Loan ID': [10, 10, 11], 'Loan Amount': [1000, 2000, 3000],
+            'Tenure': [12, 12, 12], 'Interest Rate': [10.0, 11.0, 12.0], 'Monthly payment': [100, 200, 300],
+            'EMIs paid on Time': [1, 2, 3], 'Date of Approval': ['2020-01-01', None, '2020-01-01'],
+            'End Date': ['2021-01-01', '2021-01-01', '2021-01-01'],
+        })
+        Customer.objects.create(
+            id=1, first_name="Old", last_name="Name", age=20, monthly_salary=1,
+            approved_limit=1, phone_number="1"
+        )
+        ingest_customer_and_loan_data(customer_file, loan_file)
+        self.assertEqual(Customer.objects.get(id=1).first_name, 'A')
+        self.assertEqual(Customer.objects.get(id=1).phone_number, '9000000001')
+        loan = Loan.objects.get(id=10)
+        self.assertEqual(loan.loan_amount, 2000)
+        self.assertEqual(loan.start_date, date.today())
+        self.assertFalse(Loan.objects.filter(id=11).exists())
+
+    def test_streaming_sources_in_small_chunks(self):
+        for fmt in ('csv', 'parquet', 'xlsx'):
+            with self.subTest(fmt=fmt):
+                Customer.objects.all().delete()
+                customer_file, loan_file = generate_workbooks(self.tmp.name, 50, fmt=fmt)
+                result = ingest_customer_and_loan_data(customer_file, loan_file, chunk_size=7)
+                self.assertEqual(result, {'customers': 5, 'loans': 50})
+                self.assertEqual(Loan.objects.count(), 50)
+
+    def test_unsupported_source(self):
+        with self.assertRaises(ValueError):
+            list(iter_source_chunks('loans.json'))
+
+    def test_unchanged_files_are_skipped(self):
+        customer_file, loan_file = generate_workbooks(self.tmp.name, 50, fmt='csv')
+        self.assertEqual(ingest_customer_and_loan_data(customer_file, loan_file), {'customers': 5, 'loans': 50})
+        Loan.objects.filter(id=1).update(emis_paid_on_time=F('emis_paid_on_time') + 1)
+        # The two source lookups and the known-customer scan; the files are neither hashed nor parsed again.
+        with mock.patch('credit.ingestion.iter_source_chunks') as chunks, self.assertNumQueries(3):
+            self.assertEqual(ingest_customer_and_loan_data(customer_file, loan_file), {'customers': 0, 'loans': 0})
+        chunks.assert_not_called()
+        self.assertEqual(Loan.objects.get(id=1).emis_paid_on_time, pd.read_csv(loan_file)['EMIs paid on Time'][0] + 1)
+
+    def test_only_new_and_changed_rows_are_written(self):
+        customer_file, loan_file = generate_workbooks(self.tmp.name, 50, fmt='csv')
+        ingest_customer_and_loan_data(customer_file, loan_file, chunk_size=20)
+        loans = pd.read_csv(loan_file)
+        loans.loc[3, 'Interest Rate'] = 19.5
+        new_loan = loans.iloc[[0]].assign(**{'Loan ID': 500})
+        pd.concat([loans, new_loan]).to_csv(loan_file, index=False)
+        Loan.objects.filter(id=loans['Loan ID'][7]).delete()
+
+        result = ingest_customer_and_loan_data(customer_file, loan_file, chunk_size=20)
+        self.assertEqual(result, {'customers': 0, 'loans': 3})
+        self.assertEqual(Loan.objects.get(id=loans['Loan ID'][3]).interest_rate, 19.5)
+        self.assertEqual(Loan.objects.count(), 51)
+        self.assertEqual(find_debt_drift(), [])
+        self.assertEqual(ingest_customer_and_loan_data(customer_file, loan_file, force=True), {'customers': 0, 'loans': 0})
+
+    def test_blank_dates_do_not_make_rows_look_changed(self):
+        customer_file, loan_file = generate_workbooks(self.tmp.name, 50, fmt='csv')
+        loans = pd.read_csv(loan_file)
+        loans.loc[0, ['Date of Approval', 'End Date']] = None
+        loans.to_csv(loan_file, index=False)
+        loan_id = int(loans['Loan ID'][0])
+        ingest_customer_and_loan_data(customer_file, loan_file)
+        filled = Loan.objects.values('start_date', 'end_date').get(id=loan_id)
+        self.assertEqual(filled['start_date'], date.today())
+
+        later = mock.Mock(wraps=datetime)
+        later.now.return_value = datetime.now() + timedelta(days=40)
+        with mock.patch.object(ingestion, 'datetime', later):
+            # A forced re-read on a later day finds nothing to write
+            self.assertEqual(ingest_loans(loan_file, force=True), 0)
+            # A real change keeps the dates the blank source row was given when first written
+            loans.loc[0, 'Interest Rate'] = 19.5
+            loans.to_csv(loan_file, index=False)
+            self.assertEqual(ingest_loans(loan_file), 1)
+        self.assertEqual(Loan.objects.values('start_date', 'end_date').get(id=loan_id), filled)
+
+    def test_interrupted_run_resumes_after_last_chunk(self):
+        customer_file, loan_file = generate_workbooks(self.tmp.name, 50, fmt='csv')
+        ingest_customers(customer_file)
+        real_upsert = ingestion.upsert_loans
+        calls = []
+
+        def crash_on_third_chunk(frame, chunk_size):
+            calls.append(len(frame))
+            if len(calls) == 3:
+                raise RuntimeError('worker lost')
+            return real_upsert(frame, chunk_size)
+
+        with mock.patch.object(ingestion, 'upsert_loans', crash_on_third_chunk), self.assertRaises(RuntimeError):
+            ingest_loans(loan_file, chunk_size=10)
+        self.assertEqual(Loan.objects.count(), 20)
+        source = IngestionSource.objects.get(key=ingestion.source_key('loans', loan_file))
+        self.assertEqual((source.chunks_done, source.fingerprint), (2, ''))
+
+        with mock.patch.object(ingestion, 'changed_rows', wraps=ingestion.changed_rows) as diffed:
+            self.assertEqual(ingest_loans(loan_file, chunk_size=10), 30)
+        self.assertEqual(diffed.call_count, 3)
+        source.refresh_from_db()
+        self.assertEqual((source.chunks_done, source.pending_fingerprint), (0, ''))
+        self.assertTrue(source.fingerprint)
+        self.assertEqual(Loan.objects.count(), 50)
+
+
+class ShardedIngestionTestCase(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        eager = celery_app.conf.task_always_eager
+        celery_app.conf.task_always_eager = True
+        self.addCleanup(setattr, celery_app.conf, 'task_always_eager', eager)
+
+    def test_plan_id_shards(self):
+        customer_file, _ = generate_workbooks(self.tmp.name, 100, fmt='csv')
+        shards = plan_id_shards(customer_file, 'Customer ID', 3, chunk_size=4)
+        self.assertEqual(shards, [
+            {'id_range': [1, 4], 'rows': [0, 4]}, {'id_range': [5, 8], 'rows': [4, 8]}, {'id_range': [9, 10], 'rows': [8, 10]},
+        ])
+
+    def test_shard_reads_only_its_rows(self):
+        for fmt in ('csv', 'xlsx', 'parquet'):
+            with self.subTest(fmt=fmt):
+                _, loan_file = generate_workbooks(self.tmp.name, 100, fmt=fmt)
+                shards = plan_id_shards(loan_file, 'Loan ID', 4, chunk_size=10)
+                self.assertEqual([shard['id_range'] for shard in shards], [[1, 25], [26, 50], [51, 75], [76, 100]])
+                self.assertEqual(shards[1]['rows'], [20, 50])
+                ids = pd.concat(iter_source_chunks(loan_file, 10, shards[1]['rows']))['Loan ID'].tolist()
+                if fmt == 'parquet':
+                    # Row groups are read whole; this file has a single one
+                    self.assertTrue(set(range(26, 51)) <= set(ids))
+                else:
+                    self.assertEqual(ids, list(range(21, 51)))
+
+    def test_customer_retry_reruns_every_loan_shard(self):
+        customer_file, loan_file = generate_workbooks(self.tmp.name, 100, fmt='csv')
+        real_ingest_customers = tasks.ingest_customers
+
+        def flaky_ingest_customers(path, chunk_size, id_range=None, **kwargs):
+            if id_range[0] == 1:
+                raise RuntimeError('worker lost')
+            return real_ingest_customers(path, chunk_size, id_range=id_range, **kwargs)
+
+        with mock.patch.object(tasks, 'ingest_customers', flaky_ingest_customers):
+            run = start_sharded_ingestion(customer_file, loan_file, shard_count=4, chunk_size=30)
+        run.refresh_from_db()
+        self.assertEqual(run.status, IngestionRun.STATUS_FAILED)
+        self.assertEqual([shard['id_range'] for shard in run.failed_shards], [[1, 3]])
+        self.assertLess(Loan.objects.count(), 100)
+
+        # Only a customer shard failed, yet the loans of its customers sit in every loan shard
+        retry_failed_shards(run.id)
+        run.refresh_from_db()
+        self.assertEqual(run.status, IngestionRun.STATUS_COMPLETED)
+        self.assertEqual(Loan.objects.count(), 100)
+
+    def test_sharded_run_records_counts(self):
+        customer_file, loan_file = generate_workbooks(self.tmp.name, 100, fmt='csv')
+        run = start_sharded_ingestion(customer_file, loan_file, shard_count=4, chunk_size=30)
+        run.refresh_from_db()
+        self.assertEqual(run.status, IngestionRun.STATUS_COMPLETED)
+        self.assertEqual((run.customers_written, run.loans_written), (10, 100))
+        self.assertEqual(Loan.objects.count(), 100)
+        self.assertIsNotNone(run.duration_seconds)
+
+    def test_failed_shard_is_retried_alone(self):
+        customer_file, loan_file = generate_workbooks(self.tmp.name, 100, fmt='csv')
+        real_ingest_loans = tasks.ingest_loans
+
+        def flaky_ingest_loans(path, chunk_size, id_range=None, **kwargs):
+            if id_range[0] == 1:
+                raise RuntimeError('worker lost')
+            return real_ingest_loans(path, chunk_size, id_range=id_range, **kwargs)
+
+        with mock.patch.object(tasks, 'ingest_loans', flaky_ingest_loans):
+            run = start_sharded_ingestion(customer_file, loan_file, shard_count=4, chunk_size=30)
+        run.refresh_from_db()
+        self.assertEqual(run.status, IngestionRun.STATUS_FAILED)
+        self.assertEqual([shard['id_range'] for shard in run.failed_shards], [[1, 25]])
+        self.assertEqual(Loan.objects.count(), 75)
+
+        retry_failed_shards(run.id)
+        run.refresh_from_db()
+        self.assertEqual(run.status, IngestionRun.STATUS_COMPLETED)
+        self.assertEqual(run.failed_shards, [])
+        self.assertEqual(Loan.objects.count(), 100)
+
+
+class CreditProfileTestCase(TestCase):
+    def setUp(self):
+        caches['eligibility'].clear()
+        self.client = APIClient()
+        self.today = date.today()
+        self.customer = Customer.objects.create(
+            first_name="Profile", last_name="User", age=35, monthly_salary=100000,
+            approved_limit=3600000, phone_number="5555555555"
+        )
+        self.loan = Loan.objects.create(
+            customer=self.customer, loan_amount=200000, tenure=12, interest_rate=11.0,
+            monthly_repayment=18000, emis_paid_on_time=11, start_date=self.today - timedelta(days=300),
+            end_date=self.today + timedelta(days=60), is_approved=True
+        )
+
+    def assert_profile_matches_loans(self, today=None):
+        _, expected = load_credit_inputs(self.customer.id, today)
+        profile = CustomerCreditProfile.objects.get(customer=self.customer)
+        for field in PROFILE_FIELDS:
+            self.assertAlmostEqual(getattr(profile, field), getattr(expected, field), msg=field)
+
+    def test_eligibility_is_single_lookup_once_profile_exists(self):
+        refresh_profiles([self.customer.id])
+        data = {"customer_id": self.customer.id, "loan_amount": 100000, "interest_rate": 13.0, "tenure": 12}
+        with self.assertNumQueries(1):
+            response = self.client.post(reverse('check-eligibility'), data, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_missing_profile_is_built_on_demand(self):
+        _, inputs = load_profile_inputs(self.customer.id)
+        self.assertEqual(inputs.num_loans, 1)
+        self.assert_profile_matches_loans()
+
+    def test_create_loan_updates_profile_incrementally(self):
+        refresh_profiles([self.customer.id])
+        data = {"customer_id": self.customer.id, "loan_amount": 100000, "interest_rate": 13.0, "tenure": 12}
+        response = self.client.post(reverse('create-loan'), data, format='json')
+        self.assertTrue(response.data['loan_approved'])
+        self.assertEqual(CustomerCreditProfile.objects.get(customer=self.customer).num_loans, 2)
+        self.assert_profile_matches_loans()
+
+    def test_emi_payment_moves_on_time_count(self):
+        refresh_profiles([self.customer.id])
+        post_repayments([{"reference": "LAST-EMI", "loan_id": self.loan.id, "amount": 18000, "paid_on": self.today}])
+        self.assertEqual(CustomerCreditProfile.objects.get(customer=self.customer).loans_paid_on_time, 1)
+        self.assert_profile_matches_loans()
+
+    def test_roll_over_matured_loans(self):
+        refresh_profiles([self.customer.id])
+        later = self.today + timedelta(days=61)
+        roll_over_profiles(later)
+        profile = CustomerCreditProfile.objects.get(customer=self.customer)
+        self.assertEqual(profile.as_of, later)
+        self.assertEqual(profile.current_loans_sum, 0)
+        self.assert_profile_matches_loans(later)
+
+    def test_drift_check(self):
+        refresh_profiles()
+        self.assertEqual(find_profile_drift(), [])
+        CustomerCreditProfile.objects.filter(customer=self.customer).update(num_loans=7)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_credit_profiles', '--check', stdout=io.StringIO())
+        call_command('rebuild_credit_profiles', stdout=io.StringIO())
+        self.assertEqual(find_profile_drift(), [])
+
+    def assert_debt_matches_loans(self, today=None):
+        self.assertEqual(find_debt_drift(today), [])
+        _, expected = load_credit_inputs(self.customer.id, today)
+        customer = Customer.objects.get(id=self.customer.id)
+        self.assertAlmostEqual(customer.current_debt, expected.current_loans_sum)
+        self.assertAlmostEqual(customer.current_emi, expected.total_current_emi)
+
+    def test_debt_follows_new_loans_and_maturity(self):
+        refresh_profiles([self.customer.id])
+        self.assertEqual(Customer.objects.get(id=self.customer.id).debt_valid_until, self.loan.end_date)
+        data = {"customer_id": self.customer.id, "loan_amount": 100000, "interest_rate": 13.0, "tenure": 12}
+        self.client.post(reverse('create-loan'), data, format='json')
+        self.assertEqual(Customer.objects.get(id=self.customer.id).current_debt, 300000)
+        self.assert_debt_matches_loans()
+
+        later = self.today + timedelta(days=61)
+        roll_over_profiles(later)
+        customer = Customer.objects.get(id=self.customer.id)
+        self.assertEqual(customer.current_debt, 100000)
+        self.assertGreater(customer.debt_valid_until, later)
+        self.assert_debt_matches_loans(later)
+
+    def test_over_limit_customer_is_decided_without_loan_queries(self):
+        Customer.objects.filter(id=self.customer.id).update(approved_limit=150000)
+        refresh_profiles([self.customer.id], self.today - timedelta(days=1))
+        _, full_inputs = load_credit_inputs(self.customer.id)
+        with self.assertNumQueries(1):
+            _, inputs = load_profile_inputs(self.customer.id)
+        self.assertEqual(inputs.current_loans_sum, 200000)
+        for args in ((100000, 13.0, 12), (5000000, 13.0, 12)):
+            self.assertEqual(evaluate_eligibility(inputs, *args), evaluate_eligibility(full_inputs, *args))
+        with self.assertNumQueries(1):
+            self.assertEqual(load_profile_inputs_bulk([self.customer.id])[self.customer.id], inputs)
+
+        # Once a counted loan may have matured the stored debt is not trusted.
+        later = self.loan.end_date + timedelta(days=1)
+        _, inputs = load_profile_inputs(self.customer.id, later)
+        self.assertEqual(inputs.current_loans_sum, 0)
+
+    def test_reconcile_customer_debt(self):
+        refresh_profiles()
+        Customer.objects.filter(id=self.customer.id).update(current_debt=0, current_emi=5)
+        self.assertEqual(len(find_debt_drift()), 2)
+        with self.assertRaises(CommandError):
+            call_command('reconcile_customer_debt', '--check', stdout=io.StringIO())
+        out = io.StringIO()
+        call_command('reconcile_customer_debt', stdout=out)
+        self.assertIn('Repaired the debt fields of 1 customers', out.getvalue())
+        self.assert_debt_matches_loans()
+
+
+class EligibilityCacheTestCase(TestCase):
+    def setUp(self):
+        caches['eligibility'].clear()
+        eligibility_cache.reset_cache_stats()
+        self.client = APIClient()
+        self.customer = Customer.objects.create(
+            first_name="Cache", last_name="User", age=35, monthly_salary=100000,
+            approved_limit=3600000, phone_number="4444444444"
+        )
+        self.data = {"customer_id": self.customer.id, "loan_amount": 100000, "interest_rate": 13.0, "tenure": 12}
+
+    def check(self):
+        return self.client.post(reverse('check-eligibility'), self.data, format='json')
+
+    def test_repeated_check_is_served_from_cache(self):
+        first = self.check()
+        with self.assertNumQueries(0):
+            second = self.check()
+        self.assertEqual(first.data, second.data)
+        stats = self.client.get(reverse('eligibility-cache-stats')).data
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def test_create_loan_invalidates_customer(self):
+        self.check()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('create-loan'), self.data, format='json')
+        with self.assertNumQueries(1):
+            self.check()
+        self.assertEqual(eligibility_cache.cache_stats()['invalidations'], 1)
+
+    def test_bulk_invalidation(self):
+        self.check()
+        with self.captureOnCommitCallbacks(execute=True):
+            eligibility_cache.invalidate_all()
+        self.check()
+        self.assertEqual(eligibility_cache.cache_stats()['misses'], 2)
+
+    def test_unknown_customer_is_not_cached(self):
+        self.data['customer_id'] = 9999
+        self.assertEqual(self.check().status_code, 404)
+        self.assertEqual(self.check().status_code, 404)
+        self.assertEqual(eligibility_cache.cache_stats()['hits'], 0)
+
+
+    def test_cache_outage_falls_back_to_the_database(self):
+        broken = mock.Mock(**{name: mock.Mock(side_effect=ConnectionError('redis down')) for name in (
+            'get', 'get_many', 'set', 'add', 'incr',
+        )})
+        with mock.patch.object(eligibility_cache, '_cache', return_value=broken), \
+                self.assertLogs('credit.eligibility_cache', 'WARNING'):
+            response = self.check()
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.data['approval'])
+            # The loan is booked although the after-commit invalidation cannot reach the cache
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(self.client.post(reverse('create-loan'), self.data, format='json').status_code, 200)
+        self.assertEqual(eligibility_cache.cache_stats()['invalidations'], 0)
+
+class EligibilityBatchTestCase(TestCase):
+    def setUp(self):
+        caches['eligibility'].clear()
+        self.client = APIClient()
+        self.today = date.today()
+        self.customers = []
+        for i in range(6):
+            customer = Customer.objects.create(
+                first_name="Batch", last_name=str(i), age=30 + i, monthly_salary=40000 + i * 20000,
+                approved_limit=1500000 + i * 500000, phone_number=f"30000000{i:02d}"
+            )
+            for j in range(i * 3):
+                Loan.objects.create(
+                    customer=customer, loan_amount=90000 * (j + 1), tenure=24, interest_rate=12.0,
+                    monthly_repayment=3000 + j * 1500, emis_paid_on_time=24 if j % 3 == 0 else 5,
+                    start_date=self.today - timedelta(days=200 * j), end_date=self.today + timedelta(days=300 - 120 * j),
+                    is_approved=True
+                )
+            self.customers.append(customer)
+
+    def applications(self):
+        return [
+            {"customer_id": customer.id, "loan_amount": amount, "interest_rate": rate, "tenure": tenure}
+            for customer in self.customers
+            for amount, rate, tenure in ((50000, 11.0, 12), (300000, 14.5, 36), (900000, 17.0, 6), (100000, 0.0, 10))
+        ]
+
+    def test_batch_matches_single_checks(self):
+        applications = self.applications()
+        response = self.client.post(reverse('check-eligibility-batch'), applications, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), len(applications))
+        for application, result in zip(applications, response.data):
+            single = self.client.post(reverse('check-eligibility'), application, format='json').data
+            self.assertEqual(result['status'], 200)
+            for field, value in single.items():
+                self.assertEqual(result[field], value, msg=(application, field))
+
+    def test_unknown_customers_are_reported_in_order(self):
+        applications = [
+            {"customer_id": 9999, "loan_amount": 1000, "interest_rate": 10.0, "tenure": 12},
+            {"customer_id": self.customers[0].id, "loan_amount": 1000, "interest_rate": 10.0, "tenure": 12},
+            {"customer_id": 8888, "loan_amount": 1000, "interest_rate": 10.0, "tenure": 12},
+        ]
+        response = self.client.post(reverse('check-eligibility-batch'), applications, format='json')
+        self.assertEqual([r['status'] for r in response.data], [404, 200, 404])
+        self.assertEqual([r['customer_id'] for r in response.data], [9999, self.customers[0].id, 8888])
+
+    def test_query_count_does_not_grow_with_batch(self):
+        refresh_profiles()
+        applications = self.applications() * 20
+        with self.assertNumQueries(1):
+            self.client.post(reverse('check-eligibility-batch'), applications, format='json')
+
+    def test_ndjson_stream(self):
+        applications = self.applications()
+        response = self.client.post(
+            reverse('check-eligibility-batch'), applications, format='json', HTTP_ACCEPT='application/x-ndjson'
+        )
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['customer_id'] for line in lines], [a['customer_id'] for a in applications])
+
+    def test_invalid_items_fail_alone(self):
+        applications = self.applications()[:2]
+        applications[1:1] = [{"customer_id": self.customers[0].id}, dict(applications[0], tenure=0)]
+        with warnings.catch_warnings():
+            # The invalid tenure must never reach the vectorized EMI maths
+            warnings.simplefilter('error')
+            response = self.client.post(reverse('check-eligibility-batch'), applications, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['status'] for r in response.data], [200, 400, 400, 200])
+        self.assertIn('loan_amount', response.data[1]['errors'])
+        self.assertEqual(response.data[2]['customer_id'], self.customers[0].id)
+        self.assertIn('tenure', response.data[2]['errors'])
+
+    def test_body_must_be_a_list(self):
+        response = self.client.post(reverse('check-eligibility-batch'), {"customer_id": 1}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class FinanceTestCase(TestCase):
+    def test_emi_matches_scalar_formula(self):
+        amounts = [100000, 250000, 50000, 75000]
+        rates = [13.0, 8.5, 0.0, 19.99]
+        tenures = [12, 240, 10, 7]
+        vector = finance.emi(amounts, rates, tenures)
+        for i, args in enumerate(zip(amounts, rates, tenures)):
+            self.assertAlmostEqual(vector[i], scalar_emi(*args), places=6)
+            self.assertAlmostEqual(finance.emi(*args), scalar_emi(*args), places=6)
+
+    def test_schedule_amortizes_principal(self):
+        schedule = finance.amortization_schedules([100000, 60000], [12.0, 0.0], [12, 3], ['2024-01-31', '2024-03-15'])
+        self.assertEqual(schedule['month'].tolist(), list(range(1, 13)) + [1, 2, 3])
+        first = schedule['loan_index'] == 0
+        self.assertAlmostEqual(schedule['principal'][first].sum(), 100000, places=4)
+        self.assertAlmostEqual(schedule['interest'][0], 1000.0)
+        self.assertEqual(schedule['balance'][11], 0.0)
+        self.assertEqual(schedule['due_date'][0], np.datetime64('2024-02-29'))
+        self.assertEqual(schedule['payment'][12:].tolist(), [20000.0] * 3)
+
+    def test_schedule_endpoint(self):
+        customer = Customer.objects.create(
+            first_name="Sched", last_name="User", age=30, monthly_salary=50000,
+            approved_limit=1800000, phone_number="2222222222"
+        )
+        loan = Loan.objects.create(
+            customer=customer, loan_amount=200000, tenure=24, interest_rate=13.0, monthly_repayment=9508.36,
+            start_date="2024-01-15", end_date="2026-01-15", is_approved=True
+        )
+        response = APIClient().get(reverse('view-loan-schedule', args=[loan.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['monthly_installment'], 9508.36)
+        self.assertEqual(len(response.data['schedule']), 24)
+        self.assertEqual(response.data['schedule'][0]['due_date'], '2024-02-15')
+        self.assertEqual(response.data['schedule'][-1]['balance'], 0.0)
+        self.assertEqual(APIClient().get(reverse('view-loan-schedule', args=[9999])).status_code, 404)
+
+    def test_export_schedules(self):
+        customer = Customer.objects.create(
+            first_name="Export", last_name="User", age=30, monthly_salary=50000,
+            approved_limit=1800000, phone_number="1111111111"
+        )
+        Loan.objects.create(
+            customer=customer, loan_amount=120000, tenure=12, interest_rate=10.0, monthly_repayment=10550,
+            start_date="2024-01-01", end_date="2025-01-01", is_approved=True
+        )
+        Loan.objects.create(
+            customer=customer, loan_amount=50000, tenure=6, interest_rate=10.0, monthly_repayment=8500,
+            emis_paid_on_time=6, start_date="2023-01-01", end_date="2023-07-01", is_approved=True
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, 'schedules.parquet')
+            call_command('export_schedules', output, chunk_size=1, stdout=io.StringIO())
+            frame = pd.read_parquet(output)
+        self.assertEqual(len(frame), 12)
+        self.assertEqual(frame['customer_id'].unique().tolist(), [customer.id])
+
+
+class AsyncLoanRequestTestCase(TestCase):
+    def setUp(self):
+        caches['eligibility'].clear()
+        self.client = APIClient()
+        self.customer = Customer.objects.create(
+            first_name="Async", last_name="User", age=30, monthly_salary=50000,
+            approved_limit=1800000, phone_number="1212121212"
+        )
+        self.data = {"customer_id": self.customer.id, "loan_amount": 100000, "interest_rate": 13.0, "tenure": 12}
+        self.queued = []
+        patcher = mock.patch.object(tasks.decide_loan_request, 'delay', side_effect=self.queued.append)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def submit(self, key, data=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('create-loan'), data or self.data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_request_is_accepted_then_decided(self):
+        response = self.submit('key-1')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], 'pending')
+        self.assertIsNone(response.data['loan_approved'])
+        self.assertEqual(response['Location'], reverse('loan-request-status', args=[response.data['id']]))
+        self.assertEqual(Loan.objects.count(), 0)
+
+        self.assertEqual(tasks.decide_loan_request(*self.queued), 'approved')
+        status_response = self.client.get(response['Location'])
+        self.assertEqual(status_response.data['status'], 'approved')
+        self.assertTrue(status_response.data['loan_approved'])
+        self.assertEqual(status_response.data['loan_id'], Loan.objects.get().id)
+
+    def test_same_key_is_idempotent(self):
+        first = self.submit('key-2')
+        second = self.submit('key-2')
+        self.assertEqual(first.data['id'], second.data['id'])
+        self.assertEqual(len(self.queued), 1)
+        tasks.decide_loan_request(first.data['id'])
+        tasks.decide_loan_request(first.data['id'])
+        self.assertEqual(Loan.objects.count(), 1)
+
+    def test_key_reused_with_different_body(self):
+        self.submit('key-3')
+        response = self.submit('key-3', dict(self.data, loan_amount=5000))
+        self.assertEqual(response.status_code, 422)
+
+    def test_unknown_customer(self):
+        response = self.submit('key-4', dict(self.data, customer_id=9999))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.client.get(reverse('loan-request-status', args=[9999])).status_code, 404)
+
+    def test_request_that_cannot_be_decided_fails(self):
+        request_id = self.submit('key-5').data['id']
+        with mock.patch('credit.origination.originate_loan', side_effect=RuntimeError('boom')), \
+                self.assertLogs('credit.origination', 'ERROR'):
+            self.assertEqual(tasks.decide_loan_request(request_id), 'failed')
+        self.assertEqual(LoanRequest.objects.get(id=request_id).message, 'Loan request could not be decided.')
+
+    def test_lost_publish_is_requeued(self):
+        with mock.patch.object(tasks.decide_loan_request, 'delay', side_effect=ConnectionError('broker down')), \
+                self.assertLogs('django', 'ERROR'):
+            response = self.submit('key-6')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.queued, [])
+
+        # Fresh replays and sweeps leave it alone; once stale, a replay queues it once more
+        self.assertEqual(self.submit('key-6').status_code, 202)
+        self.assertEqual(tasks.requeue_stale_loan_requests(), 0)
+        stale = timezone.now() - timedelta(seconds=settings.CREDIT_LOAN_REQUEST_REQUEUE_SECONDS + 1)
+        LoanRequest.objects.update(updated_at=stale)
+        self.submit('key-6')
+        self.submit('key-6')
+        self.assertEqual(self.queued, [response.data['id']])
+
+        LoanRequest.objects.update(updated_at=stale)
+        self.assertEqual(tasks.requeue_stale_loan_requests(), 1)
+        self.assertEqual(self.queued, [response.data['id']] * 2)
+        self.assertEqual(tasks.decide_loan_request(response.data['id']), 'approved')
+        LoanRequest.objects.update(updated_at=stale)
+        self.assertEqual(tasks.requeue_stale_loan_requests(), 0)
+
+    def test_second_request_sees_first_loan(self):
+        # Each request is decided against the EMIs booked by the ones before it
+        big = dict(self.data, loan_amount=240000, tenure=12)
+        requests = [self.submit(f'burst-{i}', big).data['id'] for i in range(3)]
+        outcomes = [tasks.decide_loan_request(request_id) for request_id in requests]
+        self.assertEqual(outcomes, ['approved', 'rejected', 'rejected'])
+
+
+class QueryIndexTestCase(TestCase):
+    def test_hot_queries_use_indexes(self):
+        out = io.StringIO()
+        call_command('explain_hot_queries', customers=20, loans_per_customer=10, budget_ms=1000, repeat=1, stdout=out)
+        self.assertNotIn('SEQ SCAN', out.getvalue())
+        self.assertFalse(Customer.objects.filter(phone_number__startswith='explain-').exists())
+
+    def test_sequential_scan_is_detected(self):
+        plan = Loan.objects.filter(monthly_repayment=1.0).explain()
+        self.assertTrue(sequential_scans(plan))
+
+    def test_tenure_must_be_positive(self):
+        customer = Customer.objects.create(
+            first_name="Check", last_name="User", age=30, monthly_salary=50000,
+            approved_limit=1800000, phone_number="6666666666"
+        )
+        with self.assertRaises(IntegrityError):
+            Loan.objects.create(
+                customer=customer, loan_amount=1000, tenure=0, interest_rate=10.0, monthly_repayment=0,
+                emis_paid_on_time=0, start_date=date.today(), end_date=date.today(), is_approved=True
+            )
+
+
+class LoanListingTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.customer = Customer.objects.create(
+            first_name="Corporate", last_name="Customer", age=45, monthly_salary=500000,
+            approved_limit=18000000, phone_number="7777777777"
+        )
+        Loan.objects.bulk_create([
+            Loan(
+                customer=self.customer, loan_amount=10000 + i, tenure=12, interest_rate=10.0,
+                monthly_repayment=900, emis_paid_on_time=12 if i % 5 == 0 else 3,
+                start_date=date(2023, 1, 1), end_date=date(2024, 1, 1), is_approved=True
+            )
+            for i in range(25)
+        ])
+        self.active_ids = list(
+            Loan.objects.filter(customer=self.customer, emis_paid_on_time__lt=F('tenure')).order_by('id')
+            .values_list('id', flat=True)
+        )
+
+    def test_keyset_pages_cover_every_active_loan_once(self):
+        url = reverse('view-loans', args=[self.customer.id])
+        seen, params = [], {'limit': 7}
+        while True:
+            with self.assertNumQueries(2):
+                response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            seen += [row['id'] for row in response.data]
+            if 'X-Next-Cursor' not in response:
+                break
+            self.assertIn('rel="next"', response['Link'])
+            params['cursor'] = response['X-Next-Cursor']
+        self.assertEqual(seen, self.active_ids)
+
+    def test_sparse_fields(self):
+        response = self.client.get(reverse('view-loans', args=[self.customer.id]), {'fields': 'id,repayments_left'})
+        self.assertEqual(set(response.data[0]), {'id', 'repayments_left'})
+        self.assertEqual(response.data[0]['repayments_left'], 9)
+        response = self.client.get(reverse('view-loan', args=[self.active_ids[0]]), {'fields': 'loan_amount'})
+        self.assertEqual(set(response.data), {'loan_amount'})
+
+    def test_unknown_field_or_bad_cursor_is_rejected(self):
+        url = reverse('view-loans', args=[self.customer.id])
+        self.assertEqual(self.client.get(url, {'fields': 'id,secret'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'cursor': 'abc'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'limit': 0}).status_code, 400)
+
+    def test_loan_detail_is_single_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('view-loan', args=[self.active_ids[0]]))
+        self.assertEqual(response.data['customer']['id'], self.customer.id)
+
+    def test_fast_path_matches_drf_serializers_byte_for_byte(self):
+        Customer.objects.filter(id=self.customer.id).update(first_name="Zoë\u2028", last_name="O\"Brien")
+        Loan.objects.filter(id=self.active_ids[0]).update(loan_amount=1e16, interest_rate=1.5e-7)
+        Loan.objects.filter(id=self.active_ids[1]).update(emis_paid_on_time=F('tenure') - 1, monthly_repayment=0.1 + 0.2)
+        loans = Loan.objects.filter(id__in=self.active_ids).order_by('id')
+        for serializer in (LoanListItemSerializer, LoanDetailSerializer):
+            for fields in (None, ['repayments_left', 'id'], ['customer'], ['loan_amount']):
+                if fields and not set(fields) <= set(serializer.Meta.fields):
+                    continue
+                with self.subTest(serializer=serializer.__name__, fields=fields):
+                    expected = JSONRenderer().render(serializer(loans, many=True, fields=fields).data)
+                    rows = serializer.values_queryset(loans, fields)
+                    self.assertEqual(FastJSONRenderer().render(serializer.values_data(rows, fields)), expected)
+
+        response = self.client.get(reverse('view-loans', args=[self.customer.id]), {'limit': 5})
+        expected = JSONRenderer().render(LoanListItemSerializer(loans[:5], many=True).data)
+        self.assertEqual(response.content, expected)
+
+    def test_fast_renderer_falls_back_where_orjson_differs(self):
+        renderer = FastJSONRenderer()
+        for data in (
+            {"amount": 1e16, "rate": 1.5e-7}, {"name": "a\u2028b\u2029"}, {"when": date(2024, 1, 2)},
+            {1: "int key"}, {"big": 2 ** 70}, [{"nested": [0.5, None, True]}],
+            {"interest_rate": 1e-05, "rates": [3.2e-05, -9.99e-05, 1e-4, 10.00001]},
+        ):
+            with self.subTest(data=data):
+                self.assertEqual(renderer.render(data), JSONRenderer().render(data))
+        self.assertEqual(renderer.render(None), b'')
+        for data in ({"rate": float('nan')}, [None, {"limit": [float('inf')]}]):
+            with self.subTest(data=data):
+                with self.assertRaises(ValueError):
+                    JSONRenderer().render(data)
+                with self.assertRaises(ValueError):
+                    renderer.render(data)
+
+    def test_bench_serialization_reports_identical_output(self):
+        out = io.StringIO()
+        call_command('bench_serialization', sizes=[3], repeat=1, stdout=out)
+        self.assertEqual(out.getvalue().count('identical'), 2)
+        self.assertFalse(Customer.objects.filter(phone_number='bench-ser-3').exists())
+
+
+class ReplicaRouterTestCase(SimpleTestCase):
+    @override_settings(DATABASE_REPLICAS=['replica1', 'replica2'])
+    def test_reads_go_to_replica_only_when_allowed(self):
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(Loan), 'default')
+        with db_router.replica_reads():
+            self.assertIn(router.db_for_read(Loan), {'replica1', 'replica2'})
+            self.assertEqual(router.db_for_write(Loan), 'default')
+            with db_router.use_primary():
+                self.assertEqual(router.db_for_read(Loan), 'default')
+        self.assertFalse(router.allow_migrate('replica1', 'credit'))
+        self.assertTrue(router.allow_migrate('default', 'credit'))
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas_means_primary(self):
+        with db_router.replica_reads():
+            self.assertEqual(ReplicaRouter().db_for_read(Loan), 'default')
+
+    @override_settings(DATABASE_REPLICAS=['replica1'])
+    def test_middleware_pins_client_after_write(self):
+        class ReadView:
+            replica_reads = True
+
+        class WriteView:
+            pass
+
+        factory = RequestFactory()
+
+        def run(request, view):
+            seen = []
+
+            def get_response(request):
+                middleware.process_view(request, view, (), {})
+                seen.append(db_router.reading_from_replica())
+                return HttpResponse(status=201 if request.method == 'POST' else 200)
+
+            middleware = ReplicaRoutingMiddleware(get_response)
+            response = middleware(request)
+            self.assertFalse(db_router.reading_from_replica())
+            return seen[0], response
+
+        on_replica, response = run(factory.get('/view-loans/1'), ReadView)
+        self.assertTrue(on_replica)
+        self.assertNotIn(PRIMARY_COOKIE, response.cookies)
+
+        on_replica, response = run(factory.post('/check-eligibility'), ReadView)
+        self.assertTrue(on_replica)
+        self.assertNotIn(PRIMARY_COOKIE, response.cookies)
+
+        on_replica, response = run(factory.post('/create-loan'), WriteView)
+        self.assertFalse(on_replica)
+        self.assertIn(PRIMARY_COOKIE, response.cookies)
+
+        request = factory.get('/view-loans/1')
+        request.COOKIES[PRIMARY_COOKIE] = '1'
+        on_replica, _ = run(request, ReadView)
+        self.assertFalse(on_replica)
+
+
+@skipUnless(settings.DATABASE_REPLICAS, 'no read replica configured (set DB_REPLICA_HOSTS)')
+class ReplicaRoutingIntegrationTestCase(TransactionTestCase):
+    databases = '__all__'
+
+    def replica_queries(self, func):
+        contexts = [CaptureQueriesContext(connections[alias]) for alias in settings.DATABASE_REPLICAS]
+        for context in contexts:
+            context.__enter__()
+        try:
+            func()
+        finally:
+            for context in contexts:
+                context.__exit__(None, None, None)
+        return sum(len(context) for context in contexts)
+
+    def test_reads_follow_writes(self):
+        writer, reader = APIClient(), APIClient()
+        response = writer.post(reverse('customer-register'), {
+            "first_name": "Replica", "last_name": "User", "age": 30, "monthly_income": 50000,
+            "phone_number": "8888888888"
+        }, format='json')
+        self.assertIn(PRIMARY_COOKIE, response.cookies)
+        url = reverse('view-loans', args=[response.data['id']])
+        self.assertGreater(self.replica_queries(lambda: reader.get(url)), 0)
+        self.assertEqual(self.replica_queries(lambda: writer.get(url)), 0)
+
+
+class AsyncViewsTestCase(TestCase):
+    def setUp(self):
+        caches['eligibility'].clear()
+        self.factory = AsyncRequestFactory()
+        self.customer = Customer.objects.create(
+            first_name="Async", last_name="User", age=30, monthly_salary=80000,
+            approved_limit=2900000, phone_number="9999999999"
+        )
+        self.loans = Loan.objects.bulk_create([
+            Loan(
+                customer=self.customer, loan_amount=50000 + i, tenure=12, interest_rate=12.0, monthly_repayment=4500,
+                emis_paid_on_time=i, start_date=date(2023, 1, 1), end_date=date(2024, 1, 1), is_approved=True
+            )
+            for i in range(5)
+        ])
+
+    def call(self, view, request, *args):
+        return async_to_sync(view)(request, *args)
+
+    def test_check_eligibility_matches_sync_view(self):
+        payload = {"customer_id": self.customer.id, "loan_amount": 100000, "interest_rate": 14.0, "tenure": 12}
+        expected = APIClient().post(reverse('check-eligibility'), payload, format='json').json()
+        caches['eligibility'].clear()
+        CustomerCreditProfile.objects.all().delete()
+        request = self.factory.post('/check-eligibility', payload, content_type='application/json')
+        response = self.call(async_views.check_eligibility, request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), expected)
+        self.assertTrue(CustomerCreditProfile.objects.filter(customer=self.customer).exists())
+
+    def test_check_eligibility_errors(self):
+        request = self.factory.post('/check-eligibility', {"customer_id": 9999, "loan_amount": 1, "interest_rate": 14.0,
+                                                            "tenure": 12}, content_type='application/json')
+        self.assertEqual(self.call(async_views.check_eligibility, request).status_code, 404)
+        request = self.factory.post('/check-eligibility', {"customer_id": 1}, content_type='application/json')
+        self.assertEqual(self.call(async_views.check_eligibility, request).status_code, 400)
+        self.assertEqual(self.call(async_views.check_eligibility, self.factory.get('/check-eligibility')).status_code, 405)
+
+    def test_loan_views_match_sync_views(self):
+        loan_id = self.loans[0].id
+        expected = APIClient().get(reverse('view-loan', args=[loan_id]), {'fields': 'id,customer'}).json()
+        response = self.call(async_views.view_loan, self.factory.get('/view-loan', {'fields': 'id,customer'}), loan_id)
+        self.assertEqual(json.loads(response.content), expected)
+        self.assertEqual(self.call(async_views.view_loan, self.factory.get('/view-loan'), 9999).status_code, 404)
+
+        url = reverse('view-loans', args=[self.customer.id])
+        expected = APIClient().get(url, {'limit': 2})
+        response = self.call(async_views.view_customer_loans, self.factory.get(url, {'limit': 2}), self.customer.id)
+        self.assertEqual(json.loads(response.content), expected.json())
+        self.assertEqual(response['X-Next-Cursor'], expected['X-Next-Cursor'])
+        bad = self.factory.get(url, {'fields': 'nope'})
+        self.assertEqual(self.call(async_views.view_customer_loans, bad, self.customer.id).status_code, 400)
+
+
+class LoadTestHttpTestCase(LiveServerTestCase):
+    def test_reports_every_target_and_endpoint(self):
+        customer = Customer.objects.create(
+            first_name="Http", last_name="Load", age=30, monthly_salary=80000,
+            approved_limit=2900000, phone_number="1212121212"
+        )
+        Loan.objects.create(
+            customer=customer, loan_amount=50000, tenure=12, interest_rate=12.0, monthly_repayment=4500,
+            emis_paid_on_time=1, start_date=date(2023, 1, 1), end_date=date(2024, 1, 1), is_approved=True
+        )
+        out = io.StringIO()
+        call_command('loadtest_http', target=[f'sync={self.live_server_url}'], requests=6, concurrency=2,
+                     json=True, stdout=out)
+        results = json.loads(out.getvalue())
+        self.assertEqual([row['endpoint'] for row in results], ['check-eligibility', 'view-loan', 'view-loans'])
+        for row in results:
+            self.assertEqual(row['requests'], 6)
+            self.assertEqual(row['errors'], 0)
+
+
+class BenchCommandTestCase(TransactionTestCase):
+    def test_report_and_baseline_compare(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            report_path = os.path.join(tmp, 'baseline.json')
+            call_command('bench', in_place=True, customers=20, loans_per_customer=2, requests=5, concurrency=1,
+                         ingest_rows=50, output=report_path, stdout=io.StringIO())
+            with open(report_path) as handle:
+                report = json.load(handle)
+        self.assertEqual(set(report['endpoints']), {'register', 'check-eligibility', 'create-loan', 'view-loan', 'view-loans'})
+        for summary in report['endpoints'].values():
+            self.assertEqual(summary['requests'], 5)
+            self.assertEqual(summary['errors'], 0, report)
+            self.assertGreater(summary['queries_per_request'], 0)
+        self.assertEqual(report['ingestion']['loans'], 50)
+        self.assertGreaterEqual(Loan.objects.filter(customer__first_name='Bench').count(), 40)
+
+        self.assertEqual(compare_to_baseline(report, report, 0.2), [])
+        slower = json.loads(json.dumps(report))
+        slower['endpoints']['view-loans']['p95_ms'] *= 2
+        slower['endpoints']['view-loan']['queries_per_request'] += 1
+        regressions = compare_to_baseline(slower, report, 0.2)
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(any('view-loan queries/request' in regression for regression in regressions))
+
+    def test_threads_keep_connections_across_jobs(self):
+        with mock.patch('credit.benchmarking.connections.close_all') as close_all:
+            results, latencies, _ = run_concurrently(lambda job: job * 2, range(10), 3)
+        self.assertEqual(results, [job * 2 for job in range(10)])
+        self.assertEqual(len(latencies), 10)
+        # Once per worker thread, not once per job
+        self.assertEqual(close_all.call_count, 3)
+
+
+class InstrumentationTestCase(TestCase):
+    def setUp(self):
+        instrumentation.reset_metrics()
+        self.client = APIClient()
+        customer = Customer.objects.create(
+            first_name="Metric", last_name="Customer", age=30, monthly_salary=60000,
+            approved_limit=2200000, phone_number="6666666666"
+        )
+        self.loan = Loan.objects.create(
+            customer=customer, loan_amount=100000, tenure=12, interest_rate=10.0, monthly_repayment=8792,
+            emis_paid_on_time=1, start_date=date(2023, 1, 1), end_date=date(2024, 1, 1), is_approved=True
+        )
+
+    def metrics(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        return response.content.decode()
+
+    def test_metrics_per_route(self):
+        self.client.get(reverse('view-loan', args=[self.loan.id]))
+        self.client.get(reverse('view-loan', args=[self.loan.id + 1]))
+        body = self.metrics()
+        self.assertIn('credit_requests_total{route="view-loan",method="GET",status="200"} 1', body)
+        self.assertIn('credit_requests_total{route="view-loan",method="GET",status="404"} 1', body)
+        self.assertIn('credit_request_duration_seconds_count{route="view-loan"} 2', body)
+        # The 404 also looked in the loan history
+        self.assertIn('credit_request_db_queries_sum{route="view-loan"} 3', body)
+        self.assertIn('credit_request_phase_seconds_total{route="view-loan",phase="serialize"}', body)
+        self.assertIn('credit_request_phase_seconds_total{route="view-loan",phase="render"}', body)
+        self.assertIn('credit_request_duration_seconds_bucket{route="view-loan",le="+Inf"} 2', body)
+        self.assertIn('# TYPE credit_eligibility_cache_hits_total counter', body)
+
+    def test_task_metrics(self):
+        with instrumentation.track_task('example'):
+            with instrumentation.timed('work'):
+                Customer.objects.count()
+        body = self.metrics()
+        self.assertIn('credit_tasks_total{task="example",outcome="success"} 1', body)
+        self.assertIn('credit_task_db_queries_total{task="example"} 1', body)
+        self.assertIn('credit_task_phase_seconds_total{task="example",phase="work"}', body)
+
+    def test_profile_header(self):
+        url = reverse('view-loan', args=[self.loan.id])
+        response = self.client.get(url, HTTP_X_PROFILE='cprofile')
+        self.assertEqual(response['Content-Type'], 'application/json')
+        with override_settings(CREDIT_PROFILING_ENABLED=True):
+            response = self.client.get(url, HTTP_X_PROFILE='cprofile')
+        self.assertEqual(response['X-Profile-Status'], '200')
+        self.assertIn('function calls', response.content.decode())
+
+
+class CreditPolicyTestCase(TestCase):
+    def setUp(self):
+        caches['eligibility'].clear()
+        self.client = APIClient()
+        self.addCleanup(policy.reset_policy)
+        with open(settings.CREDIT_POLICY_PATH) as handle:
+            self.shipped = handle.read()
+        self.workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.workdir.cleanup)
+        self.path = os.path.join(self.workdir.name, 'policy.yaml')
+        self.customer = Customer.objects.create(
+            first_name="Policy", last_name="Customer", age=35, monthly_salary=100000,
+            approved_limit=3600000, phone_number="5555555555"
+        )
+
+    def write_policy(self, version, middle_rate=12.0, path=None):
+        text = self.shipped.replace('version: 1', f'version: {version}').replace('min_rate: 12.0', f'min_rate: {middle_rate}')
+        with open(path or self.path, 'w') as handle:
+            handle.write(text)
+        # Make sure the change is visible even within the filesystem's timestamp resolution.
+        os.utime(path or self.path, ns=(version * 10 ** 9, version * 10 ** 9))
+
+    def test_shipped_policy_bands(self):
+        rules = policy.active_policy()
+        self.assertEqual(rules.version, 1)
+        strong = CreditInputs(customer_id=1, monthly_salary=100000, approved_limit=3600000)
+        middle = CreditInputs(customer_id=2, monthly_salary=100000, approved_limit=3600000, num_loans=12, loans_paid_on_time=1)
+        weak = CreditInputs(customer_id=3, monthly_salary=100000, approved_limit=3600000, current_loans_sum=4000000)
+        self.assertTrue(evaluate_eligibility(strong, 100000, 8.0, 12).approval)
+        decision = evaluate_eligibility(middle, 100000, 10.0, 12)
+        self.assertEqual((decision.credit_score, decision.approval, decision.corrected_interest_rate), (50, False, 12.0))
+        decision = evaluate_eligibility(weak, 100000, 10.0, 12)
+        self.assertEqual((decision.approval, decision.corrected_interest_rate, decision.policy_version), (False, 16.0, 1))
+        decision = evaluate_eligibility(strong, 700000, 10.0, 12)
+        self.assertEqual(decision.message, 'Loan not approved: EMI exceeds 50% of monthly salary.')
+
+    def test_batch_matches_single(self):
+        rng = np.random.default_rng(3)
+        inputs = [
+            CreditInputs(
+                customer_id=i, monthly_salary=int(rng.integers(20000, 200000)), approved_limit=3000000,
+                num_loans=int(rng.integers(0, 15)), current_loans_sum=float(rng.integers(0, 4000000)),
+                total_current_emi=float(rng.integers(0, 50000)), loans_paid_on_time=int(rng.integers(0, 5)),
+                loan_activity_this_year=int(rng.integers(0, 4)), loan_approved_volume=float(rng.integers(0, 5000000)),
+            )
+            for i in range(200)
+        ]
+        amounts = rng.integers(1, 50, 200) * 10000.0
+        rates = rng.choice([8.0, 12.0, 14.0, 16.0, 18.0], 200)
+        tenures = rng.choice([6, 12, 36], 200)
+        batch = evaluate_eligibility_batch(inputs, amounts, rates, tenures)
+        for i, item in enumerate(inputs):
+            single = evaluate_eligibility(item, amounts[i], rates[i], tenures[i])
+            self.assertEqual(bool(batch['approval'][i]), single.approval)
+            self.assertAlmostEqual(float(batch['corrected_interest_rate'][i]), single.corrected_interest_rate)
+            self.assertAlmostEqual(float(batch['credit_score'][i]), single.credit_score)
+
+    def test_hot_reload_on_version_change(self):
+        self.write_policy(1)
+        with override_settings(CREDIT_POLICY_PATH=self.path, CREDIT_POLICY_CHECK_SECONDS=0):
+            policy.reset_policy()
+            data = {'customer_id': self.customer.id, 'loan_amount': 100000, 'interest_rate': 10.0, 'tenure': 12}
+            self.assertEqual(self.client.post(reverse('check-eligibility'), data, format='json').data['policy_version'], 1)
+
+            self.write_policy(2, middle_rate=9.0)
+            self.assertEqual(policy.active_policy().min_rates[1], 9.0)
+            response = self.client.post(reverse('check-eligibility'), data, format='json')
+            self.assertEqual(response.data['policy_version'], 2)
+
+            # Same version with other contents, or a broken file: keep serving v2.
+            self.write_policy(2, middle_rate=20.0)
+            with self.assertLogs('credit.policy', 'WARNING'):
+                self.assertEqual(policy.active_policy().min_rates[1], 9.0)
+            with open(self.path, 'w') as handle:
+                handle.write('version: [')
+            os.utime(self.path, ns=(3 * 10 ** 9, 3 * 10 ** 9))
+            with self.assertLogs('credit.policy', 'ERROR'):
+                self.assertEqual(policy.active_policy().version, 2)
+
+    def test_create_loan_records_policy_version(self):
+        data = {'customer_id': self.customer.id, 'loan_amount': 100000, 'interest_rate': 10.0, 'tenure': 12}
+        response = self.client.post(reverse('create-loan'), data, format='json')
+        self.assertEqual(response.data['policy_version'], 1)
+        self.assertEqual(Loan.objects.get(id=response.data['loan_id']).policy_version, 1)
+
+    def test_invalid_definitions(self):
+        definition = {'version': 1, 'score': {'base': 100}, 'bands': [], 'emi_salary_cap': 0.5, 'rejection_floor_rate': 16}
+        with self.assertRaisesMessage(ImproperlyConfigured, 'score is missing'):
+            policy.CreditPolicy.compile(definition)
+        with self.assertRaisesMessage(ImproperlyConfigured, 'version must be a positive integer'):
+            policy.CreditPolicy.compile({'version': 'two'})
+
+    def test_rescore_book(self):
+        for rate in (11.0, 13.0):
+            Loan.objects.create(
+                customer=self.customer, loan_amount=100000, tenure=12, interest_rate=rate, monthly_repayment=8800,
+                emis_paid_on_time=0, start_date=date.today(), end_date=date.today() + timedelta(days=365), is_approved=True
+            )
+        # 14 loans, none repaid, put the customer in the 30-50 band.
+        Loan.objects.bulk_create([
+            Loan(
+                customer=self.customer, loan_amount=1000, tenure=12, interest_rate=20.0, monthly_repayment=90,
+                emis_paid_on_time=0, start_date=date(2015, 1, 1), end_date=date(2016, 1, 1), is_approved=True
+            )
+            for _ in range(12)
+        ])
+        self.write_policy(2, middle_rate=10.0)
+        flips_path = os.path.join(self.workdir.name, 'flips.csv')
+        out = io.StringIO()
+        call_command('rescore_book', policy=self.path, output=flips_path, stdout=out)
+        summary = json.loads(out.getvalue())
+        self.assertEqual(summary['loans'], 14)
+        self.assertEqual((summary['current_version'], summary['candidate_version']), (1, 2))
+        self.assertEqual(summary['newly_approved'], 1)
+        self.assertEqual(summary['candidate_approved'] - summary['current_approved'], 1)
+        with open(flips_path) as handle:
+            self.assertEqual(len(handle.readlines()), 2)
+
+        with self.assertRaises(CommandError):
+            call_command('rescore_book', policy=os.path.join(self.workdir.name, 'missing.yaml'), stdout=io.StringIO())
+
+
+class PortfolioScoringTestCase(TestCase):
+    def setUp(self):
+        today = date.today()
+        self.customers = []
+        for i in range(5):
+            customer = Customer.objects.create(
+                first_name="Portfolio", last_name=str(i), age=30 + i, monthly_salary=50000 + i * 10000,
+                approved_limit=300000 * (i + 1), phone_number=f"40000000{i:02d}"
+            )
+            for j in range(i * 2):
+                Loan.objects.create(
+                    customer=customer, loan_amount=120000 * (j + 1), tenure=12, interest_rate=11.0,
+                    monthly_repayment=4000 + j * 500, emis_paid_on_time=12 if j % 2 else 3,
+                    start_date=today - timedelta(days=250 * j), end_date=today + timedelta(days=300 - 200 * j),
+                    is_approved=True
+                )
+            self.customers.append(customer)
+
+    def test_snapshots_match_per_customer_scoring(self):
+        run = score_portfolio(chunk_size=2)
+        self.assertEqual(run.status, PortfolioScoringRun.STATUS_COMPLETED)
+        self.assertEqual((run.customers_scored, run.loans_scored), (5, 20))
+        self.assertGreater(run.loans_per_second, 0)
+        self.assertEqual(run.policy_version, policy.active_policy().version)
+        snapshots = {snapshot.customer_id: snapshot for snapshot in run.snapshots.all()}
+        self.assertEqual(set(snapshots), {customer.id for customer in self.customers})
+        for customer in self.customers:
+            _, inputs = load_credit_inputs(customer.id)
+            snapshot = snapshots[customer.id]
+            self.assertAlmostEqual(snapshot.credit_score, credit_score(inputs), msg=customer.id)
+            self.assertEqual(snapshot.num_loans, inputs.num_loans)
+            self.assertAlmostEqual(snapshot.current_loans_sum, inputs.current_loans_sum)
+            self.assertAlmostEqual(snapshot.emi_burden, inputs.total_current_emi / customer.monthly_salary)
+            self.assertEqual(snapshot.scored_at, run.started_at)
+
+    def test_loans_are_aggregated_in_batches(self):
+        whole = score_portfolio(chunk_size=5)
+        batched = score_portfolio(chunk_size=5, loan_batch_size=3)
+        self.assertEqual(batched.loans_scored, 20)
+        fields = ('customer_id', 'credit_score', 'num_loans', 'current_loans_sum', 'total_current_emi')
+        for expected, snapshot in zip(whole.snapshots.order_by('customer_id').values_list(*fields),
+                                      batched.snapshots.order_by('customer_id').values_list(*fields)):
+            for a, b in zip(expected, snapshot):
+                self.assertAlmostEqual(a, b)
+
+    def test_query_count_grows_with_chunks_not_customers(self):
+        # Run insert and update, the ID scan, and per chunk: savepoint, customers, loans, snapshot insert, release.
+        with self.assertNumQueries(8):
+            score_portfolio(chunk_size=5)
+        with self.assertNumQueries(13):
+            score_portfolio(chunk_size=3)
+
+    def test_task_prunes_old_runs(self):
+        old = score_portfolio()
+        PortfolioScoringRun.objects.filter(id=old.id).update(started_at=old.started_at - timedelta(days=40))
+        result = tasks.rescore_portfolio()
+        self.assertEqual(result['customers'], 5)
+        self.assertEqual(result['pruned_runs'], 1)
+        self.assertFalse(PortfolioScoringRun.objects.filter(id=old.id).exists())
+        self.assertEqual(CreditScoreSnapshot.objects.count(), 5)
+
+    def test_command_reports_throughput(self):
+        out = io.StringIO()
+        call_command('rescore_portfolio', chunk_size=3, verbosity=2, stdout=out)
+        self.assertIn('loans/s', out.getvalue())
+        self.assertEqual(CreditScoreSnapshot.objects.count(), 5)
+
+
+class BulkRegistrationTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        Customer.objects.create(
+            first_name="Existing", last_name="Customer", age=40, monthly_salary=70000, approved_limit=2500000,
+            phone_number="7000000000"
+        )
+
+    def rows(self, count, prefix="71"):
+        return [
+            {"first_name": "Bulk", "last_name": str(i), "age": 25 + i % 30, "monthly_income": 40000 + i * 1375,
+             "phone_number": f"{prefix}{i:08d}"}
+            for i in range(count)
+        ]
+
+    def test_per_row_results_without_failing_the_batch(self):
+        rows = self.rows(3) + [
+            {"first_name": "Bulk", "last_name": "Missing age", "monthly_income": 50000, "phone_number": "7200000000"},
+            dict(self.rows(1)[0], last_name="Duplicate"),
+            dict(self.rows(1, prefix="73")[0], phone_number="7000000000"),
+        ]
+        response = self.client.post(reverse('customer-register-bulk'), rows, format='json')
+        self.assertEqual(response.status_code, 200)
+        results = response.json()
+        self.assertEqual([result['row'] for result in results], list(range(6)))
+        self.assertEqual([result['status'] for result in results], [201, 201, 201, 400, 400, 400])
+        self.assertIn('age', results[3]['errors'])
+        self.assertEqual(results[4]['errors']['phone_number'], ["Duplicate of row 0 in this batch."])
+        self.assertEqual(results[5]['errors']['phone_number'], ["customer with this phone number already exists."])
+        self.assertEqual(Customer.objects.filter(first_name="Bulk").count(), 3)
+        self.assertEqual(Customer.objects.get(phone_number="7100000000").last_name, "0")
+        self.assertEqual(results[1]['id'], Customer.objects.get(phone_number="7100000001").id)
+
+    def test_approved_limit_matches_single_registration(self):
+        incomes = [0, 1, 13888, 41666, 41667, 60000, 123457]
+        rows = [
+            {"first_name": "Bulk", "last_name": "Limit", "age": 30, "monthly_income": income,
+             "phone_number": f"74{i:08d}"}
+            for i, income in enumerate(incomes)
+        ]
+        bulk = self.client.post(reverse('customer-register-bulk'), rows, format='json').json()
+        for i, row in enumerate(rows):
+            single = self.client.post(reverse('customer-register'), dict(row, phone_number=f"75{i:08d}"), format='json')
+            self.assertEqual(bulk[i]['approved_limit'], single.data['approved_limit'], msg=row['monthly_income'])
+
+    def test_csv_body_and_upload(self):
+        body = "first_name,last_name,age,monthly_income,phone_number\nCsv,One,31,52000,7600000001\nCsv,Two,,48000,7600000002\n"
+        response = self.client.post(reverse('customer-register-bulk'), body.encode(), content_type='text/csv')
+        self.assertEqual([result['status'] for result in response.json()], [201, 400])
+        self.assertIn('age', response.json()[1]['errors'])
+
+        upload = io.BytesIO(("﻿" + body.replace("760", "770").replace(",,", ",29,")).encode())
+        upload.name = "customers.csv"
+        response = self.client.post(reverse('customer-register-bulk'), {"file": upload}, format='multipart')
+        self.assertEqual([result['status'] for result in response.json()], [201, 201])
+        self.assertEqual(Customer.objects.get(phone_number="7700000001").monthly_salary, 52000)
+
+    def test_rejects_non_list_and_oversized_batches(self):
+        response = self.client.post(reverse('customer-register-bulk'), self.rows(1)[0], format='json')
+        self.assertEqual(response.status_code, 400)
+        with mock.patch('credit.views.RegisterCustomersBulkView.max_rows', 2):
+            response = self.client.post(reverse('customer-register-bulk'), self.rows(3), format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Customer.objects.filter(first_name="Bulk").exists())
+
+    def test_query_count_does_not_grow_with_rows(self):
+        # Phone lookup, then per chunk: savepoint, bulk insert, release.
+        with mock.patch('credit.views.RegisterCustomersBulkView.chunk_size', 100):
+            with self.assertNumQueries(4):
+                self.client.post(reverse('customer-register-bulk'), self.rows(5), format='json')
+            with self.assertNumQueries(4):
+                # 60 rows stay within one SQLite bulk insert (999 parameters)
+                self.client.post(reverse('customer-register-bulk'), self.rows(60, prefix="72"), format='json')
+
+
+class ConditionalRequestTestCase(TestCase):
+    def setUp(self):
+        caches['eligibility'].clear()
+        self.client = APIClient()
+        self.customer = Customer.objects.create(
+            first_name="Polling", last_name="Portal", age=40, monthly_salary=200000,
+            approved_limit=7200000, phone_number="5555555555"
+        )
+        self.loan = Loan.objects.create(
+            customer=self.customer, loan_amount=50000, tenure=12, interest_rate=12.0, monthly_repayment=4442.44,
+            emis_paid_on_time=2, start_date=date(2024, 1, 1), end_date=date(2025, 1, 1), is_approved=True
+        )
+
+    def test_loan_detail_revalidates_from_version_stamps(self):
+        url = reverse('view-loan', args=[self.loan.id])
+        with self.assertNumQueries(1):
+            first = self.client.get(url)
+        self.assertEqual(first['Cache-Control'], 'private, no-cache')
+        self.assertIn('Accept', first['Vary'])
+        self.assertTrue(first['ETag'].startswith('"1.1-'))
+
+        with self.assertNumQueries(1):
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.content, b'')
+        self.assertEqual(cached['ETag'], first['ETag'])
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified']).status_code, 304)
+        # Sparse fields are a different representation of the same loan
+        self.assertEqual(self.client.get(url, {'fields': 'id'}, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+        post_repayments([{"reference": "EMI-3", "loan_id": self.loan.id, "amount": 4442.44, "paid_on": "2024-03-25"}])
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.json()['id'], self.loan.id)
+        self.assertTrue(changed['ETag'].startswith('"2.2-'))
+        self.assertEqual(self.client.get(reverse('view-loan', args=[9999]), HTTP_IF_NONE_MATCH='"1.1-x"').status_code, 404)
+
+    def test_customer_loans_revalidate_until_a_loan_is_booked(self):
+        url = reverse('view-loans', args=[self.customer.id])
+        first = self.client.get(url, {'limit': 10})
+        with self.assertNumQueries(1):
+            cached = self.client.get(url, {'limit': 10}, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(self.client.get(url, {'limit': 5}, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+        payload = {"customer_id": self.customer.id, "loan_amount": 10000, "interest_rate": 20.0, "tenure": 6}
+        self.assertTrue(self.client.post(reverse('create-loan'), payload, format='json').json()['loan_approved'])
+        changed = self.client.get(url, {'limit': 10}, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(len(changed.json()), 2)
+        self.assertNotEqual(changed['ETag'], first['ETag'])
+
+    def test_ingested_changes_bump_the_stamps(self):
+        customers = pd.DataFrame([{
+            'Customer ID': self.customer.id, 'First Name': "Renamed", 'Last Name': "Portal", 'Age': 41,
+            'Phone Number': 5555555555, 'Monthly Salary': 200000, 'Approved Limit': 7200000,
+        }])
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'customers.csv')
+            customers.to_csv(path, index=False)
+            ingest_customers(path, reset=False)
+        self.customer.refresh_from_db()
+        self.assertEqual((self.customer.first_name, self.customer.version), ("Renamed", 2))
+
+    @override_settings(CREDIT_LOAN_CACHE_CONTROL='public, max-age=5')
+    def test_async_views_send_the_same_validators(self):
+        factory = AsyncRequestFactory()
+        url = reverse('view-loan', args=[self.loan.id])
+        expected = self.client.get(url)
+        self.assertEqual(expected['Cache-Control'], 'public, max-age=5')
+        response = async_to_sync(async_views.view_loan)(factory.get(url), self.loan.id)
+        self.assertEqual(response['ETag'], expected['ETag'])
+        revalidated = async_to_sync(async_views.view_loan)(factory.get(url, headers={'If-None-Match': response['ETag']}), self.loan.id)
+        self.assertEqual(revalidated.status_code, 304)
+
+        url = reverse('view-loans', args=[self.customer.id])
+        response = async_to_sync(async_views.view_customer_loans)(factory.get(url), self.customer.id)
+        self.assertEqual(response['ETag'], self.client.get(url)['ETag'])
+        revalidated = async_to_sync(async_views.view_customer_loans)(
+            factory.get(url, headers={'If-None-Match': response['ETag']}), self.customer.id
+        )
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated['Cache-Control'], 'public, max-age=5')
+
+
+class LoanArchivalTestCase(TestCase):
+    def setUp(self):
+        caches['eligibility'].clear()
+        self.client = APIClient()
+        self.today = date(2026, 6, 15)
+        self.customer = Customer.objects.create(
+            first_name="Long", last_name="Standing", age=50, monthly_salary=150000,
+            approved_limit=5400000, phone_number="4444444444"
+        )
+
+        def loan(amount, start, end, paid, tenure=12):
+            return Loan.objects.create(
+                customer=self.customer, loan_amount=amount, tenure=tenure, interest_rate=11.0, monthly_repayment=amount / 10,
+                emis_paid_on_time=paid, start_date=start, end_date=end, is_approved=True
+            )
+
+        self.closed = [loan(10000, date(2020, 1, 1), date(2021, 1, 1), 12), loan(20000, date(2024, 3, 1), date(2025, 3, 1), 12)]
+        self.open = [
+            loan(30000, date(2024, 1, 1), date(2025, 1, 1), 7),   # ended, not fully repaid
+            loan(40000, date(2026, 1, 10), date(2026, 4, 10), 3, tenure=3),   # repaid, but this year's activity
+            loan(50000, date(2026, 1, 1), date(2027, 1, 1), 5),   # current
+        ]
+
+    def test_archiving_keeps_scoring_inputs_and_views(self):
+        _, before = load_credit_inputs(self.customer.id, self.today)
+        listing = self.client.get(reverse('view-loans', args=[self.customer.id])).content
+        detail = self.client.get(reverse('view-loan', args=[self.closed[0].id]))
+        request = LoanRequest.objects.create(
+            idempotency_key="archived-loan", customer=self.customer, loan_amount=10000, interest_rate=11.0, tenure=12,
+            status=LoanRequest.STATUS_APPROVED, loan=self.closed[0]
+        )
+
+        self.assertEqual(archive_closed_loans(self.today, batch_size=1), 2)
+
+        self.assertEqual(set(LoanHistory.objects.values_list('id', flat=True)), {loan.id for loan in self.closed})
+        self.assertEqual(set(Loan.objects.values_list('id', flat=True)), {loan.id for loan in self.open})
+        self.customer.refresh_from_db()
+        self.assertEqual((self.customer.archived_loans, self.customer.archived_loan_volume), (2, 30000))
+        self.assertEqual(load_credit_inputs(self.customer.id, self.today)[1], before)
+        profile = CustomerCreditProfile.objects.get(customer=self.customer)
+        self.assertEqual({field: getattr(profile, field) for field in PROFILE_FIELDS},
+                         {field: getattr(before, field) for field in PROFILE_FIELDS})
+        run = score_portfolio(today=self.today)
+        snapshot = run.snapshots.get()
+        self.assertEqual((snapshot.num_loans, snapshot.credit_score), (5, credit_score(before)))
+
+        self.assertEqual(self.client.get(reverse('view-loans', args=[self.customer.id])).content, listing)
+        archived = self.client.get(reverse('view-loan', args=[self.closed[0].id]))
+        self.assertEqual((archived.content, archived['ETag']), (detail.content, detail['ETag']))
+        revalidated = self.client.get(reverse('view-loan', args=[self.closed[0].id]), HTTP_IF_NONE_MATCH=detail['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(self.client.get(reverse('view-loan-schedule', args=[self.closed[0].id])).status_code, 200)
+        self.assertEqual(self.client.get(reverse('loan-request-status', args=[request.id])).json()['loan_id'],
+                         self.closed[0].id)
+        self.assertEqual(archive_closed_loans(self.today), 0)
+
+    def test_ingestion_does_not_bring_archived_loans_back(self):
+        archive_closed_loans(self.today)
+        frame = pd.DataFrame([{
+            'Loan ID': self.closed[0].id, 'Customer ID': self.customer.id, 'Loan Amount': 10000, 'Tenure': 12,
+            'Interest Rate': 11.0, 'Monthly payment': 1000, 'EMIs paid on Time': 12,
+            'Date of Approval': "2020-01-01", 'End Date': "2021-01-01",
+        }])
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'loans.csv')
+            frame.to_csv(path, index=False)
+            self.assertEqual(ingest_loans(path, reset=False), 0)
+        self.assertFalse(Loan.objects.filter(id=self.closed[0].id).exists())
+
+    def test_archive_loans_command(self):
+        out = io.StringIO()
+        call_command('archive_loans', '--dry-run', stdout=out)
+        self.assertIn('2 closed loans would be archived', out.getvalue())
+        call_command('archive_loans', stdout=out)
+        self.assertIn('Archived 2 closed loans.', out.getvalue())
+        self.assertEqual(LoanHistory.objects.count(), 2)
+
+
+class RepaymentLedgerTestCase(TestCase):
+    def setUp(self):
+        caches['eligibility'].clear()
+        self.client = APIClient()
+        self.customer = Customer.objects.create(
+            first_name="Monthly", last_name="Payer", age=33, monthly_salary=90000,
+            approved_limit=3200000, phone_number="3333333333"
+        )
+        self.loan = Loan.objects.create(
+            customer=self.customer, loan_amount=3000, tenure=3, interest_rate=12.0, monthly_repayment=1000.004,
+            start_date=date(2026, 1, 1), end_date=date(2026, 4, 1), is_approved=True
+        )
+
+    def post(self, payments):
+        return self.client.post(reverse('repayments-batch'), payments, format='json').json()
+
+    def payment(self, reference, paid_on, amount=1000, loan_id=None):
+        return {"reference": reference, "loan_id": loan_id or self.loan.id, "amount": amount, "paid_on": paid_on}
+
+    def test_payments_settle_installments_in_date_order(self):
+        payments = [
+            self.payment("BANK-2", "2026-03-10"),                 # installment 2, due 2026-03-01: late
+            self.payment("BANK-1", "2026-01-25"),                 # installment 1, due 2026-02-01: on time
+            self.payment("BANK-3", "2026-03-20", amount=500),     # installment 3, short: late
+            self.payment("BANK-4", "2026-03-25"),                 # nothing left to settle
+            self.payment("BANK-5", "2026-03-25", loan_id=9999),
+            self.payment("BANK-1", "2026-01-25"),
+            {"reference": "BANK-6", "loan_id": self.loan.id, "amount": -5, "paid_on": "2026-03-01"},
+        ]
+        body = self.post(payments)
+        results = body['results']
+        self.assertEqual([result['status'] for result in results], [201, 201, 201, 409, 404, 400, 400])
+        self.assertEqual([(result['installment'], result['on_time']) for result in results[:3]],
+                         [(2, False), (1, True), (3, False)])
+        self.assertEqual(results[5]['errors'], {'reference': ["Duplicate of row 1 in this batch."]})
+        self.assertEqual(
+            {name: body['summary'][name] for name in ('payments', 'posted', 'on_time', 'late', 'already_posted', 'failed')},
+            {'payments': 7, 'posted': 3, 'on_time': 1, 'late': 2, 'already_posted': 0, 'failed': 4},
+        )
+        self.assertGreater(body['summary']['payments_per_second'], 0)
+
+        self.loan.refresh_from_db()
+        self.assertEqual((self.loan.emis_paid_on_time, self.loan.emis_paid_late, self.loan.version), (1, 2, 2))
+        self.assertEqual(Repayment.objects.filter(loan=self.loan).count(), 3)
+        # Settled with late payments: no longer listed, and not a loan paid on time
+        self.assertEqual(self.client.get(reverse('view-loans', args=[self.customer.id])).json(), [])
+        self.assertEqual(load_credit_inputs(self.customer.id)[1].loans_paid_on_time, 0)
+
+    def test_reposting_is_idempotent(self):
+        payments = [self.payment("BANK-1", "2026-01-25"), self.payment("BANK-2", "2026-02-20")]
+        first = self.post(payments)
+        again = self.post(payments + [self.payment("BANK-1", "2026-01-25", amount=999)])
+        self.assertEqual([result['status'] for result in again['results']], [200, 200, 400])
+        self.assertEqual(
+            [{key: result[key] for key in ('installment', 'on_time')} for result in again['results'][:2]],
+            [{key: result[key] for key in ('installment', 'on_time')} for result in first['results']],
+        )
+        reused = self.post([self.payment("BANK-2", "2026-02-21")])
+        self.assertEqual(reused['results'][0]['status'], 422)
+        self.loan.refresh_from_db()
+        self.assertEqual((self.loan.emis_paid_on_time, self.loan.emis_paid_late), (2, 0))
+
+    def test_last_on_time_emi_updates_the_profile(self):
+        refresh_profiles([self.customer.id])
+        self.post([self.payment(f"BANK-{month}", f"2026-0{month}-01") for month in (2, 3, 4)])
+        self.assertEqual(CustomerCreditProfile.objects.get(customer=self.customer).loans_paid_on_time, 1)
+        self.assertEqual(load_credit_inputs(self.customer.id)[1].loans_paid_on_time, 1)
+
+    def test_query_count_does_not_grow_with_payments(self):
+        loans = Loan.objects.bulk_create([
+            Loan(
+                customer=self.customer, loan_amount=12000, tenure=12, interest_rate=12.0, monthly_repayment=1000,
+                start_date=date(2026, 1, 1), end_date=date(2027, 1, 1), is_approved=True
+            )
+            for _ in range(40)
+        ])
+
+        def queries(count, prefix):
+            payments = [self.payment(f"{prefix}-{i}", "2026-01-20", loan_id=loans[i % 40].id) for i in range(count)]
+            with CaptureQueriesContext(connections['default']) as context:
+                self.assertEqual(self.post(payments)['summary']['posted'], count)
+            return len(context.captured_queries)
+
+        self.assertEqual(queries(4, "SMALL"), queries(80, "LARGE"))
+        self.assertEqual(sum(Loan.objects.filter(id__in=[loan.id for loan in loans]).values_list('emis_paid_late', flat=True)), 0)
+
+    def test_ingestion_keeps_ledger_counters(self):
+        self.post([self.payment("BANK-1", "2026-01-25")])
+        other = Loan.objects.create(
+            customer=self.customer, loan_amount=2000, tenure=2, interest_rate=12.0, monthly_repayment=1000,
+            emis_paid_on_time=0, start_date=date(2026, 1, 1), end_date=date(2026, 3, 1), is_approved=True
+        )
+        source = pd.DataFrame([
+            {"Loan ID": loan.id, "Customer ID": self.customer.id, "Loan Amount": loan.loan_amount, "Tenure": loan.tenure,
+             "Interest Rate": 13.0, "Monthly payment": loan.monthly_repayment, "EMIs paid on Time": 0,
+             "Date of Approval": loan.start_date, "End Date": loan.end_date}
+            for loan in (self.loan, other)
+        ])
+        source.loc[1, "EMIs paid on Time"] = 2
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'loans.csv')
+            source.to_csv(path, index=False)
+            self.assertEqual(ingest_loans(path), 2)
+        self.loan.refresh_from_db()
+        # The file's other columns apply, but its on-time count would collide with the ledger's installment 1
+        self.assertEqual((self.loan.interest_rate, self.loan.emis_paid_on_time), (13.0, 1))
+        self.assertEqual(Loan.objects.get(id=other.id).emis_paid_on_time, 2)
+        results = self.post([self.payment("BANK-2", "2026-02-25")])['results']
+        self.assertEqual((results[0]['status'], results[0]['installment']), (201, 2))
+
+    def test_post_repayments_command(self):
+        frame = pd.DataFrame([
+            {"reference": "FILE-1", "loan_id": self.loan.id, "amount": 1000, "paid_on": "2026-02-01"},
+            {"reference": "FILE-2", "loan_id": self.loan.id, "amount": 1000, "paid_on": "2026-03-01"},
+            {"reference": "FILE-3", "loan_id": 9999, "amount": 1000, "paid_on": "2026-03-01"},
+        ])
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'bank.csv')
+            frame.to_csv(path, index=False)
+            out = io.StringIO()
+            call_command('post_repayments', path, block_size=2, stdout=out)
+            self.assertIn("Line 4: 404", out.getvalue())
+            self.assertIn("Posted 2 payments (2 on time, 0 late), 0 already posted, 1 failed", out.getvalue())
+            out = io.StringIO()
+            call_command('post_repayments', path, stdout=out)
+            self.assertIn("Posted 0 payments (0 on time, 0 late), 2 already posted, 1 failed", out.getvalue())
+        self.loan.refresh_from_db()
+        self.assertEqual(self.loan.emis_paid_on_time, 2)
+
+
+class LoanOffersTestCase(TestCase):
+    def setUp(self):
+        caches['eligibility'].clear()
+        self.client = APIClient()
+        self.today = date.today()
+        # Five current loans started this year: score 100 - 25 + 15 + 2.5 = 92.5, any rate approvable
+        self.customer = Customer.objects.create(
+            first_name="What", last_name="If", age=40, monthly_salary=100000,
+            approved_limit=3600000, phone_number="4444444444"
+        )
+        for i in range(5):
+            Loan.objects.create(
+                customer=self.customer, loan_amount=50000, tenure=24, interest_rate=14.0, monthly_repayment=6000,
+                emis_paid_on_time=3, start_date=self.today - timedelta(days=30), end_date=self.today + timedelta(days=700),
+                is_approved=True
+            )
+
+    def offers(self, **data):
+        return self.client.post(reverse('loan-offers'), {"customer_id": self.customer.id, **data}, format='json')
+
+    def test_offers_match_single_eligibility_checks(self):
+        tenures, rates = [3, 6, 12, 24, 60], [10.0, 12.0, 12.5, 16.0, 18.0]
+        body = self.offers(loan_amount=600000, tenures=tenures, interest_rates=rates, limit=100).json()
+        approved = set()
+        for tenure in tenures:
+            for rate in rates:
+                single = self.client.post(reverse('check-eligibility'), {
+                    "customer_id": self.customer.id, "loan_amount": 600000, "interest_rate": rate, "tenure": tenure
+                }, format='json').json()
+                if single['approval']:
+                    approved.add((tenure, rate, single['monthly_installment']))
+        self.assertEqual(body['evaluated'], 25)
+        self.assertEqual(body['approvable'], len(approved))
+        self.assertEqual({(o['tenure'], o['interest_rate'], o['monthly_installment']) for o in body['offers']}, approved)
+        # The EMI cap rules out short tenures even though the score allows any rate
+        self.assertNotIn(3, {offer['tenure'] for offer in body['offers']})
+
+    def test_ranking(self):
+        by_emi = self.offers(loan_amount=200000, tenures=[12, 24, 36], interest_rates=[10.0, 20.0]).json()
+        self.assertEqual([(o['tenure'], o['interest_rate']) for o in by_emi['offers']][:2], [(36, 10.0), (36, 20.0)])
+        installments = [offer['monthly_installment'] for offer in by_emi['offers']]
+        self.assertEqual(installments, sorted(installments))
+
+        by_interest = self.offers(
+            loan_amount=200000, tenures=[12, 24, 36], interest_rates=[10.0, 20.0], rank_by='total_interest', limit=2
+        ).json()
+        self.assertEqual([(o['tenure'], o['interest_rate']) for o in by_interest['offers']], [(12, 10.0), (24, 10.0)])
+        self.assertEqual(by_interest['approvable'], 6)
+
+    def test_low_score_gets_no_offers(self):
+        Loan.objects.filter(customer=self.customer).update(loan_amount=1000000)
+        refresh_profiles([self.customer.id])
+        body = self.offers(loan_amount=100000).json()
+        self.assertEqual(body['credit_score'], 0.0)
+        self.assertEqual(body['offers'], [])
+        self.assertEqual(body['evaluated'], len(offers.DEFAULT_TENURES) * len(offers.DEFAULT_INTEREST_RATES))
+
+    def test_one_query_for_the_whole_grid(self):
+        refresh_profiles([self.customer.id])
+        with self.assertNumQueries(1):
+            response = self.offers(loan_amount=300000, tenures=list(range(1, 201)), interest_rates=[r / 4 for r in range(200)])
+        self.assertEqual(response.json()['evaluated'], 40000)
+
+    def test_errors(self):
+        self.assertEqual(self.client.post(reverse('loan-offers'), {
+            "customer_id": 9999, "loan_amount": 1000
+        }, format='json').status_code, 404)
+        self.assertEqual(self.offers(loan_amount=1000, tenures=[0]).status_code, 400)
+        self.assertEqual(self.offers(loan_amount=1000, rank_by="credit_score").status_code, 400)
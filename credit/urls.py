@@ -1,10 +1,32 @@
+from django.conf import settings
 from django.urls import path
-from .views import RegisterCustomerView, CheckEligibilityView, CreateLoanView, ViewLoanDetail, ViewCustomerLoans
+from . import async_views
+from .views import RegisterCustomerView, RegisterCustomersBulkView, CheckEligibilityView, CheckEligibilityBatchView, CreateLoanView, LoanOffersView, EligibilityCacheStatsView, LoanRequestStatusView, RepaymentsBatchView, ViewLoanDetail, ViewLoanSchedule, ViewCustomerLoans, metrics
 
 urlpatterns = [
     path('customer/register', RegisterCustomerView.as_view(), name='customer-register'),
+    path('customer/register/bulk', RegisterCustomersBulkView.as_view(), name='customer-register-bulk'),
     path('check-eligibility', CheckEligibilityView.as_view(), name='check-eligibility'),
+    path('check-eligibility/batch', CheckEligibilityBatchView.as_view(), name='check-eligibility-batch'),
+    path('check-eligibility/cache-stats', EligibilityCacheStatsView.as_view(), name='eligibility-cache-stats'),
+    path('loan-offers', LoanOffersView.as_view(), name='loan-offers'),
     path('create-loan', CreateLoanView.as_view(), name='create-loan'),
+    path('loan-requests/<int:request_id>', LoanRequestStatusView.as_view(), name='loan-request-status'),
     path('view-loan/<int:loan_id>', ViewLoanDetail.as_view(), name='view-loan'),
+    path('view-loan/<int:loan_id>/schedule', ViewLoanSchedule.as_view(), name='view-loan-schedule'),
     path('view-loans/<int:customer_id>', ViewCustomerLoans.as_view(), name='view-loans'),
-] 
\ No newline at end of file
+    path('repayments/batch', RepaymentsBatchView.as_view(), name='repayments-batch'),
+    path('metrics', metrics, name='metrics'),
+]
+
+if settings.CREDIT_ASYNC_VIEWS:
+    # Same URLs and names, served by the async-ORM views under an ASGI server.
+    async_routes = {
+        'check-eligibility': async_views.check_eligibility,
+        'view-loan': async_views.view_loan,
+        'view-loans': async_views.view_customer_loans,
+    }
+    urlpatterns = [
+        path(str(pattern.pattern), async_routes[pattern.name], name=pattern.name) if pattern.name in async_routes else pattern
+        for pattern in urlpatterns
+    ]
@@ -1,9 +1,14 @@
+import json
+
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import render
+from django.urls import reverse
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from .serializers import CustomerRegisterSerializer
-from .models import Customer, Loan
+from .models import Customer, Loan, LoanHistory, LoanRequest
 from .serializers import (
     CustomerRegisterSerializer,
     CheckEligibilitySerializer,
@@ -11,11 +16,24 @@ from .serializers import (
     CreateLoanSerializer,
     CreateLoanResponseSerializer,
     CustomerDetailSerializer,
+    LoanOffersSerializer,
+    LoanRequestSerializer,
+    LoanScheduleSerializer,
     LoanDetailSerializer,
     LoanListItemSerializer
 )
-from datetime import datetime
-from django.db import models
+from . import conditional, eligibility_cache, finance, instrumentation
+from .offers import loan_offers
+from .origination import claim_stale_requests, originate_loan
+from .pagination import KeysetPagination
+from .parsers import CSVParser, read_csv_rows
+from .profiles import load_profile_inputs, load_profile_inputs_bulk
+from .registration import register_customers
+from .repayments import post_repayments
+from .renderers import NDJSONRenderer
+from .scoring import evaluate_eligibility, evaluate_eligibility_batch
+from .tasks import decide_loan_request
+from django.db import models, transaction
 
 # Create your views here.
 
@@ -24,11 +42,64 @@ class RegisterCustomerView(APIView):
         serializer = CustomerRegisterSerializer(data=request.data)
         if serializer.is_valid():
             customer = serializer.save()
-            response_data = CustomerRegisterSerializer(customer).data
+            with instrumentation.timed('serialize'):
+                response_data = CustomerRegisterSerializer(customer).data
             return Response(response_data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+class RegisterCustomersBulkView(APIView):
+    parser_classes = api_settings.DEFAULT_PARSER_CLASSES + [CSVParser]
+    # One IN query checks the phone numbers of the whole batch, so keep it bounded.
+    max_rows = 10000
+    chunk_size = 2000
+
+    def post(self, request):
+        upload = request.FILES.get('file')
+        rows = read_csv_rows(upload) if upload is not None else request.data
+        if not isinstance(rows, list):
+            return Response({'detail': 'Expected a list of customers or a CSV file.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > self.max_rows:
+            return Response(
+                {'detail': f'At most {self.max_rows} customers per request.'}, status=status.HTTP_400_BAD_REQUEST
+            )
+        results = register_customers(rows, self.chunk_size)
+        return Response(results, status=status.HTTP_200_OK)
+
+class RepaymentsBatchView(APIView):
+    parser_classes = api_settings.DEFAULT_PARSER_CLASSES + [CSVParser]
+    # Larger bank files go through the post_repayments command.
+    max_rows = 10000
+    chunk_size = 2000
+
+    def post(self, request):
+        upload = request.FILES.get('file')
+        rows = read_csv_rows(upload) if upload is not None else request.data
+        if not isinstance(rows, list):
+            return Response({'detail': 'Expected a list of payments or a CSV file.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > self.max_rows:
+            return Response(
+                {'detail': f'At most {self.max_rows} payments per request.'}, status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(post_repayments(rows, self.chunk_size), status=status.HTTP_200_OK)
+
+def eligibility_response(inputs, loan_amount, interest_rate, tenure):
+    with instrumentation.timed('scoring'):
+        decision = evaluate_eligibility(inputs, loan_amount, interest_rate, tenure)
+    response_data = {
+        'customer_id': inputs.customer_id,
+        'approval': decision.approval,
+        'interest_rate': interest_rate,
+        'corrected_interest_rate': decision.corrected_interest_rate,
+        'tenure': tenure,
+        'monthly_installment': round(decision.monthly_installment, 2),
+        'policy_version': decision.policy_version,
+    }
+    with instrumentation.timed('serialize'):
+        return dict(CheckEligibilityResponseSerializer(response_data).data)
+
 class CheckEligibilityView(APIView):
+    replica_reads = True
+
     def post(self, request):
         serializer = CheckEligibilitySerializer(data=request.data)
         if not serializer.is_valid():
@@ -39,91 +110,108 @@ class CheckEligibilityView(APIView):
         interest_rate = data['interest_rate']
         tenure = data['tenure']
 
+        def decide():
+            _, inputs = load_profile_inputs(customer_id)
+            return eligibility_response(inputs, loan_amount, interest_rate, tenure)
+
         try:
-            customer = Customer.objects.get(id=customer_id)
+            response_data = eligibility_cache.get_or_compute(customer_id, loan_amount, interest_rate, tenure, decide)
         except Customer.DoesNotExist:
             return Response({'detail': 'Customer not found.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(response_data, status=status.HTTP_200_OK)
 
-        # Gather all loans for this customer
-        loans = Loan.objects.filter(customer=customer)
-        now = datetime.now()
-        current_year = now.year
-
-        # Credit score calculation
-        credit_score = 100
-        total_emi = 0
-        current_loans_sum = 0
-        past_loans_paid_on_time = 0
-        num_loans = loans.count()
-        loan_activity_this_year = 0
-        loan_approved_volume = 0
-
-        for loan in loans:
-            # If loan is ongoing, add to current loans sum and EMIs
-            if loan.end_date >= now.date():
-                current_loans_sum += loan.loan_amount
-                total_emi += loan.monthly_repayment
-            # Count loans paid on time
-            if loan.emis_paid_on_time >= loan.tenure:
-                past_loans_paid_on_time += 1
-            # Loan activity in current year
-            if loan.start_date.year == current_year:
-                loan_activity_this_year += 1
-            # Loan approved volume
-            loan_approved_volume += loan.loan_amount
-
-        # If sum of current loans > approved limit, credit score = 0
-        if current_loans_sum > customer.approved_limit:
-            credit_score = 0
-        else:
-            # Example scoring logic (customize as needed):
-            if num_loans > 0:
-                credit_score -= (num_loans * 5)  # Penalty for more loans
-            credit_score += (past_loans_paid_on_time * 10)  # Reward for on-time
-            credit_score += min(loan_activity_this_year * 5, 15)  # Cap activity bonus
-            credit_score += min(loan_approved_volume / 100000, 20)  # Cap volume bonus
-            credit_score = max(0, min(credit_score, 100))
-
-        # If sum of all current EMIs > 50% of monthly salary, don’t approve any loans
-        if total_emi + (loan_amount / tenure) > 0.5 * customer.monthly_salary:
-            approval = False
-            corrected_interest_rate = max(interest_rate, 16.0)
-        else:
-            # Approval logic based on credit score
-            approval = False
-            corrected_interest_rate = interest_rate
-            if credit_score > 50:
-                approval = True
-            elif 50 >= credit_score > 30:
-                if interest_rate > 12.0:
-                    approval = True
-                else:
-                    corrected_interest_rate = 12.0
-            elif 30 >= credit_score > 10:
-                if interest_rate > 16.0:
-                    approval = True
-                else:
-                    corrected_interest_rate = 16.0
-            else:
-                approval = False
-                corrected_interest_rate = max(interest_rate, 16.0)
-
-        # Calculate monthly installment (EMI) using compound interest formula
-        r = corrected_interest_rate / (12 * 100)
-        n = tenure
-        emi = (loan_amount * r * (1 + r) ** n) / ((1 + r) ** n - 1) if r > 0 else loan_amount / n
+class LoanOffersView(APIView):
+    replica_reads = True
 
-        response_data = {
-            'customer_id': customer_id,
-            'approval': approval,
-            'interest_rate': interest_rate,
-            'corrected_interest_rate': corrected_interest_rate,
-            'tenure': tenure,
-            'monthly_installment': round(emi, 2),
-            'credit_score': credit_score  # Add this line for debugging
-        }
-        resp_serializer = CheckEligibilityResponseSerializer(response_data)
-        return Response(resp_serializer.data, status=status.HTTP_200_OK)
+    def post(self, request):
+        serializer = LoanOffersSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+        try:
+            _, inputs = load_profile_inputs(data['customer_id'])
+        except Customer.DoesNotExist:
+            return Response({'detail': 'Customer not found.'}, status=status.HTTP_404_NOT_FOUND)
+        with instrumentation.timed('scoring'):
+            result = loan_offers(
+                inputs, data['loan_amount'], data.get('interest_rates'), data.get('tenures'), data['rank_by'], data['limit']
+            )
+        return Response(
+            {'customer_id': inputs.customer_id, 'loan_amount': data['loan_amount'], 'rank_by': data['rank_by'], **result},
+            status=status.HTTP_200_OK,
+        )
+
+def eligibility_batch_results(rows, chunk_size):
+    # Scores the batch chunk by chunk, yielding one result per row in input order.
+    # An invalid row gets its own 400 instead of failing, or being scored into, the rest.
+    for start in range(0, len(rows), chunk_size):
+        chunk = []
+        for row in rows[start:start + chunk_size]:
+            serializer = CheckEligibilitySerializer(data=row)
+            valid = serializer.is_valid()
+            chunk.append((row, serializer.validated_data if valid else None, None if valid else serializer.errors))
+        items = [item for _, item, _ in chunk if item is not None]
+        inputs = load_profile_inputs_bulk(item['customer_id'] for item in items)
+        found = [item for item in items if item['customer_id'] in inputs]
+        with instrumentation.timed('scoring'):
+            decisions = evaluate_eligibility_batch(
+                [inputs[item['customer_id']] for item in found],
+                [item['loan_amount'] for item in found],
+                [item['interest_rate'] for item in found],
+                [item['tenure'] for item in found],
+            )
+        position = 0
+        for row, item, errors in chunk:
+            if errors is not None:
+                customer_id = row.get('customer_id') if isinstance(row, dict) else None
+                yield {'customer_id': customer_id, 'status': status.HTTP_400_BAD_REQUEST, 'errors': errors}
+                continue
+            if item['customer_id'] not in inputs:
+                yield {'customer_id': item['customer_id'], 'status': status.HTTP_404_NOT_FOUND, 'detail': 'Customer not found.'}
+                continue
+            yield {
+                'customer_id': item['customer_id'],
+                'status': status.HTTP_200_OK,
+                'approval': bool(decisions['approval'][position]),
+                'interest_rate': item['interest_rate'],
+                'corrected_interest_rate': float(decisions['corrected_interest_rate'][position]),
+                'tenure': item['tenure'],
+                'monthly_installment': round(float(decisions['monthly_installment'][position]), 2),
+                'policy_version': decisions['policy_version'],
+            }
+            position += 1
+
+class CheckEligibilityBatchView(APIView):
+    replica_reads = True
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [NDJSONRenderer]
+    chunk_size = 2000
+
+    def post(self, request):
+        if not isinstance(request.data, list):
+            return Response(
+                {'non_field_errors': ['Expected a list of eligibility checks.']}, status=status.HTTP_400_BAD_REQUEST
+            )
+        results = eligibility_batch_results(request.data, self.chunk_size)
+        if isinstance(request.accepted_renderer, NDJSONRenderer):
+            # Stream very large batches instead of building the whole response in memory
+            lines = (json.dumps(result) + '\n' for result in results)
+            return StreamingHttpResponse(lines, content_type=NDJSONRenderer.media_type)
+        return Response(list(results), status=status.HTTP_200_OK)
+
+class EligibilityCacheStatsView(APIView):
+    def get(self, request):
+        return Response(eligibility_cache.cache_stats(), status=status.HTTP_200_OK)
+
+def metrics(request):
+    # Plain Django view: Prometheus wants its text format, not DRF content negotiation.
+    stats = eligibility_cache.cache_stats()
+    cache_counters = {
+        f'credit_eligibility_cache_{name}_total': stats[name]
+        for name in ('hits', 'misses', 'invalidations', 'evictions') if stats[name] is not None
+    }
+    return HttpResponse(
+        instrumentation.render_metrics(cache_counters), content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
 
 class CreateLoanView(APIView):
     def post(self, request):
@@ -136,112 +224,139 @@ class CreateLoanView(APIView):
         interest_rate = data['interest_rate']
         tenure = data['tenure']
 
+        idempotency_key = request.headers.get('Idempotency-Key')
+        if idempotency_key:
+            return self.enqueue(request, idempotency_key, data)
+
         try:
-            customer = Customer.objects.get(id=customer_id)
+            decision, loan = originate_loan(customer_id, loan_amount, interest_rate, tenure)
         except Customer.DoesNotExist:
             return Response({'detail': 'Customer not found.'}, status=status.HTTP_404_NOT_FOUND)
 
-        # Reuse eligibility logic from CheckEligibilityView
-        # (Copy the logic or refactor into a helper function for DRY code)
-        loans = Loan.objects.filter(customer=customer)
-        now = datetime.now()
-        current_year = now.year
-        credit_score = 100
-        total_emi = 0
-        current_loans_sum = 0
-        past_loans_paid_on_time = 0
-        num_loans = loans.count()
-        loan_activity_this_year = 0
-        loan_approved_volume = 0
-        for loan in loans:
-            if loan.end_date >= now.date():
-                current_loans_sum += loan.loan_amount
-                total_emi += loan.monthly_repayment
-            if loan.emis_paid_on_time >= loan.tenure:
-                past_loans_paid_on_time += 1
-            if loan.start_date.year == current_year:
-                loan_activity_this_year += 1
-            loan_approved_volume += loan.loan_amount
-        if current_loans_sum > customer.approved_limit:
-            credit_score = 0
-        else:
-            if num_loans > 0:
-                credit_score -= (num_loans * 5)
-            credit_score += (past_loans_paid_on_time * 10)
-            credit_score += min(loan_activity_this_year * 5, 15)
-            credit_score += min(loan_approved_volume / 100000, 20)
-            credit_score = max(0, min(credit_score, 100))
-        if total_emi + (loan_amount / tenure) > 0.5 * customer.monthly_salary:
-            approval = False
-            corrected_interest_rate = max(interest_rate, 16.0)
-            message = "Loan not approved: EMI exceeds 50% of monthly salary."
-        else:
-            approval = False
-            corrected_interest_rate = interest_rate
-            message = "Loan not approved due to credit score or interest rate."
-            if credit_score > 50:
-                approval = True
-                message = "Loan approved successfully."
-            elif 50 >= credit_score > 30:
-                if interest_rate > 12.0:
-                    approval = True
-                    message = "Loan approved successfully."
-                else:
-                    corrected_interest_rate = 12.0
-                    message = "Loan not approved: interest rate too low for credit score."
-            elif 30 >= credit_score > 10:
-                if interest_rate > 16.0:
-                    approval = True
-                    message = "Loan approved successfully."
-                else:
-                    corrected_interest_rate = 16.0
-                    message = "Loan not approved: interest rate too low for credit score."
-            else:
-                approval = False
-                corrected_interest_rate = max(interest_rate, 16.0)
-                message = "Loan not approved due to low credit score."
-        r = corrected_interest_rate / (12 * 100)
-        n = tenure
-        emi = (loan_amount * r * (1 + r) ** n) / ((1 + r) ** n - 1) if r > 0 else loan_amount / n
-        loan_id = None
-        if approval:
-            loan = Loan.objects.create(
-                customer=customer,
-                loan_amount=loan_amount,
-                tenure=tenure,
-                interest_rate=interest_rate,
-                monthly_repayment=emi,
-                emis_paid_on_time=0,
-                start_date=now.date(),
-                end_date=(now.replace(month=now.month + tenure) if now.month + tenure <= 12 else now.replace(year=now.year + (now.month + tenure - 1) // 12, month=(now.month + tenure - 1) % 12 + 1)).date(),
-                is_approved=True
-            )
-            loan_id = loan.id
         response_data = {
-            'loan_id': loan_id,
+            'loan_id': loan.id if loan else None,
             'customer_id': customer_id,
-            'loan_approved': approval,
-            'message': message,
-            'monthly_installment': round(emi, 2) if approval else None
+            'loan_approved': decision.approval,
+            'message': decision.message,
+            'monthly_installment': round(decision.monthly_installment, 2) if decision.approval else None,
+            'policy_version': decision.policy_version,
         }
-        resp_serializer = CreateLoanResponseSerializer(response_data)
-        return Response(resp_serializer.data, status=status.HTTP_200_OK)
+        with instrumentation.timed('serialize'):
+            response_data = CreateLoanResponseSerializer(response_data).data
+        return Response(response_data, status=status.HTTP_200_OK)
+
+    def enqueue(self, request, idempotency_key, data):
+        # Async mode: accept the request now and decide it on a Celery worker.
+        # Retrying with the same key returns the original request instead of
+        # booking a second loan.
+        if not Customer.objects.filter(id=data['customer_id']).exists():
+            return Response({'detail': 'Customer not found.'}, status=status.HTTP_404_NOT_FOUND)
+        with transaction.atomic():
+            loan_request, created = LoanRequest.objects.get_or_create(idempotency_key=idempotency_key, defaults=data)
+        payload = {field: getattr(loan_request, field) for field in data}
+        if payload != data:
+            return Response(
+                {'detail': 'Idempotency-Key was already used with a different request body.'},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY
+            )
+        # A replay of a request still pending after CREDIT_LOAN_REQUEST_REQUEUE_SECONDS queues it again, in case
+        # the first publish was lost. A failed publish is logged; the periodic sweep retries it.
+        if created or (loan_request.status == LoanRequest.STATUS_PENDING and claim_stale_requests([loan_request.id])):
+            transaction.on_commit(lambda: decide_loan_request.delay(loan_request.id), robust=True)
+        location = reverse('loan-request-status', args=[loan_request.id])
+        return Response(
+            LoanRequestSerializer(loan_request).data, status=status.HTTP_202_ACCEPTED, headers={'Location': location}
+        )
+
+class LoanRequestStatusView(APIView):
+    def get(self, request, request_id):
+        try:
+            loan_request = LoanRequest.objects.get(id=request_id)
+        except LoanRequest.DoesNotExist:
+            return Response({'detail': 'Loan request not found.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(LoanRequestSerializer(loan_request).data, status=status.HTTP_200_OK)
+
+def loan_detail_queryset(fields=None, model=Loan):
+    # values() rows for LoanDetailSerializer.values_data; customer columns and
+    # the ETag stamps come through a join. Archived loans are read from LoanHistory.
+    return LoanDetailSerializer.values_queryset(model.objects.all(), fields, extra=conditional.LOAN_STAMP_FIELDS)
 
 class ViewLoanDetail(APIView):
+    replica_reads = True
+
     def get(self, request, loan_id):
-        try:
-            loan = Loan.objects.get(id=loan_id)
-        except Loan.DoesNotExist:
+        fields = LoanDetailSerializer.requested_fields(request)
+        media_type = request.accepted_media_type
+        if conditional.is_conditional(request):
+            # Revalidation: answer from the version stamps before reading the loan.
+            stamps = conditional.loan_stamps(loan_id).first() or conditional.loan_stamps(loan_id, LoanHistory).first()
+            if stamps is None:
+                return Response({'detail': 'Loan not found.'}, status=status.HTTP_404_NOT_FOUND)
+            response = conditional.not_modified(request, conditional.loan_stamp(stamps), media_type)
+            if response is not None:
+                return response
+        loan = (
+            loan_detail_queryset(fields).filter(id=loan_id).first()
+            or loan_detail_queryset(fields, LoanHistory).filter(id=loan_id).first()
+        )
+        if loan is None:
+            return Response({'detail': 'Loan not found.'}, status=status.HTTP_404_NOT_FOUND)
+        with instrumentation.timed('serialize'):
+            response_data = LoanDetailSerializer.values_data([loan], fields)[0]
+        response = Response(response_data, status=status.HTTP_200_OK)
+        return conditional.add_validators(response, request, conditional.loan_stamp(loan), media_type)
+
+class ViewLoanSchedule(APIView):
+    replica_reads = True
+
+    def get(self, request, loan_id):
+        columns = ('loan_amount', 'interest_rate', 'tenure', 'start_date')
+        loan = (
+            Loan.objects.only(*columns).filter(id=loan_id).first()
+            or LoanHistory.objects.only(*columns).filter(id=loan_id).first()
+        )
+        if loan is None:
             return Response({'detail': 'Loan not found.'}, status=status.HTTP_404_NOT_FOUND)
-        serializer = LoanDetailSerializer(loan)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        schedule = finance.amortization_schedule(loan.loan_amount, loan.interest_rate, loan.tenure, loan.start_date)
+        for row in schedule:
+            for field in ('payment', 'principal', 'interest', 'balance'):
+                row[field] = round(row[field], 2)
+        response_data = {
+            'loan_id': loan.id,
+            'loan_amount': loan.loan_amount,
+            'interest_rate': loan.interest_rate,
+            'tenure': loan.tenure,
+            'monthly_installment': round(finance.emi(loan.loan_amount, loan.interest_rate, loan.tenure), 2),
+            'schedule': schedule,
+        }
+        with instrumentation.timed('serialize'):
+            response_data = LoanScheduleSerializer(response_data).data
+        return Response(response_data, status=status.HTTP_200_OK)
+
+def active_loans(customer_id, fields=None):
+    # Same predicate as the loan_active_by_customer partial index.
+    loans = Loan.objects.filter(
+        customer_id=customer_id, is_approved=True, emis_paid_on_time__lt=models.F('tenure') - models.F('emis_paid_late')
+    )
+    return LoanListItemSerializer.values_queryset(loans, fields)
 
 class ViewCustomerLoans(APIView):
+    replica_reads = True
+
     def get(self, request, customer_id):
-        try:
-            customer = Customer.objects.get(id=customer_id)
-        except Customer.DoesNotExist:
+        fields = LoanListItemSerializer.requested_fields(request)
+        media_type = request.accepted_media_type
+        # The stamp lookup doubles as the existence check.
+        stamps = conditional.customer_stamps(customer_id).first()
+        if stamps is None:
             return Response({'detail': 'Customer not found.'}, status=status.HTTP_404_NOT_FOUND)
-        loans = Loan.objects.filter(customer=customer, is_approved=True).exclude(emis_paid_on_time__gte=models.F('tenure'))
-        serializer = LoanListItemSerializer(loans, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        stamp = conditional.customer_stamp(stamps)
+        response = conditional.not_modified(request, stamp, media_type)
+        if response is not None:
+            return response
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(active_loans(customer_id, fields), request)
+        with instrumentation.timed('serialize'):
+            response_data = LoanListItemSerializer.values_data(page, fields)
+        response = Response(response_data, status=status.HTTP_200_OK, headers=paginator.get_paginated_headers())
+        return conditional.add_validators(response, request, stamp, media_type)
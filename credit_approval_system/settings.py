@@ -10,8 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
+import sys
 from pathlib import Path
 
+from celery.schedules import crontab
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -42,6 +46,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'credit.middleware.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -49,6 +54,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'credit.middleware.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'credit_approval_system.urls'
@@ -81,11 +87,82 @@ DATABASES = {
         'NAME': 'credit_db',
         'USER': 'credit_user',
         'PASSWORD': 'credit_pass',
-        'HOST': 'db',  # Docker service name for PostgreSQL
-        'PORT': '5432',
+        'HOST': os.environ.get('DB_HOST', 'db'),  # Docker service name for PostgreSQL
+        'PORT': os.environ.get('DB_PORT', '5432'),
+        # Keep connections open across requests (seconds; 0 closes after each
+        # request, empty means forever) and ping them before reuse.
+        'CONN_MAX_AGE': int(os.environ['DB_CONN_MAX_AGE']) if os.environ.get('DB_CONN_MAX_AGE') else 60,
+        'CONN_HEALTH_CHECKS': True,
+        # Set when connecting through PgBouncer in transaction pooling mode.
+        'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('DB_DISABLE_SERVER_SIDE_CURSORS') == '1',
     }
 }
 
+# Read replicas, e.g. DB_REPLICA_HOSTS=replica1,replica2. Views with
+# ``replica_reads = True`` read from them (see credit/db_router.py); clients
+# stay on the primary for DATABASE_REPLICA_STICKY_SECONDS after a write.
+DATABASE_REPLICAS = []
+for _index, _host in enumerate(filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(',')), start=1):
+    DATABASES[f'replica{_index}'] = dict(DATABASES['default'], HOST=_host.strip(), TEST={'MIRROR': 'default'})
+    DATABASE_REPLICAS.append(f'replica{_index}')
+DATABASE_ROUTERS = ['credit.db_router.ReplicaRouter']
+DATABASE_REPLICA_STICKY_SECONDS = int(os.environ.get('DB_REPLICA_STICKY_SECONDS', '5'))
+
+
+# Caches
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Eligibility decisions are cached in Redis; tests and deployments without
+# CREDIT_CACHE_URL fall back to a per-process in-memory cache.
+
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
+CREDIT_CACHE_URL = '' if TESTING else os.environ.get('CREDIT_CACHE_URL', 'redis://redis:6379/1')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'eligibility': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CREDIT_CACHE_URL,
+        'TIMEOUT': 300,
+    } if CREDIT_CACHE_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'eligibility',
+        'TIMEOUT': 300,
+    },
+}
+
+# Serve check-eligibility, view-loan and view-loans from the async views in
+# credit/async_views.py; meant for the ASGI (uvicorn worker) deployment. The
+# test suite exercises the sync views and calls the async ones directly.
+CREDIT_ASYNC_VIEWS = not TESTING and os.environ.get('CREDIT_ASYNC_VIEWS') == '1'
+
+# Per-request metrics exported on /metrics; X-Profile request profiling stays off unless enabled.
+CREDIT_METRICS_ENABLED = os.environ.get('CREDIT_METRICS_ENABLED', '1') == '1'
+CREDIT_PROFILING_ENABLED = os.environ.get('CREDIT_PROFILING_ENABLED') == '1'
+
+# Versioned credit policy (score weights, bands, rate floors, EMI cap); each
+# process re-checks the file at most this often and hot-reloads a new version.
+CREDIT_POLICY_PATH = os.environ.get('CREDIT_POLICY_PATH', str(BASE_DIR / 'credit_policy.yaml'))
+CREDIT_POLICY_CHECK_SECONDS = float(os.environ.get('CREDIT_POLICY_CHECK_SECONDS', '5'))
+
+# Async create-loan requests still pending after this long are queued again, by the
+# per-minute sweep or when the client replays the Idempotency-Key.
+CREDIT_LOAN_REQUEST_REQUEUE_SECONDS = float(os.environ.get('CREDIT_LOAN_REQUEST_REQUEUE_SECONDS', '60'))
+
+# Cache-Control of view-loan and view-loans, which carry ETag/Last-Modified validators. The default makes
+# clients revalidate every poll (a cheap 304 when nothing changed); e.g. "public, max-age=5" lets a CDN or
+# reverse proxy absorb repeated reads for five seconds. Empty sends no Cache-Control.
+CREDIT_LOAN_CACHE_CONTROL = os.environ.get('CREDIT_LOAN_CACHE_CONTROL', 'private, no-cache')
+
+# JSON is rendered with orjson when installed; the bytes are the same as DRF's JSONRenderer.
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'credit.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -134,4 +211,22 @@ CELERY_BROKER_URL = 'redis://redis:6379/0'
 CELERY_RESULT_BACKEND = 'redis://redis:6379/0'
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
-CELERY_RESULT_SERIALIZER = 'json'
\ No newline at end of file
+CELERY_RESULT_SERIALIZER = 'json'
+CELERY_BEAT_SCHEDULE = {
+    'roll-over-credit-profiles': {
+        'task': 'credit.tasks.roll_over_credit_profiles',
+        'schedule': crontab(hour=0, minute=5),
+    },
+    'archive-closed-loans': {
+        'task': 'credit.tasks.archive_loans',
+        'schedule': crontab(hour=0, minute=30),
+    },
+    'rescore-portfolio': {
+        'task': 'credit.tasks.rescore_portfolio',
+        'schedule': crontab(hour=1, minute=0),
+    },
+    'requeue-stale-loan-requests': {
+        'task': 'credit.tasks.requeue_stale_loan_requests',
+        'schedule': crontab(minute='*'),
+    },
+}